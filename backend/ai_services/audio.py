@@ -0,0 +1,734 @@
+import io
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import wave
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+
+PCM_SAMPLE_RATE = 16000
+
+# ``encoding`` is the Speech-to-Text AudioEncoding name, or None when the
+# provider cannot take the recording as it is
+AudioFormat = namedtuple('AudioFormat', ['container', 'encoding', 'sample_rate', 'channels'])
+
+# ``offsets`` maps the prepared audio back to the original when silence was removed
+PreparedAudio = namedtuple(
+    'PreparedAudio', ['path', 'format', 'original_format', 'original_bytes', 'bytes', 'temporary', 'offsets']
+)
+
+# Per-frame RMS energy and zero-crossing rate of a recording, and its length in samples
+FrameFeatures = namedtuple('FrameFeatures', ['energy', 'zero_crossings', 'frame_length', 'samples'])
+
+SNIFF_BYTES = 4096
+
+# Recordings are decoded in blocks of this many seconds (320 KB at 16 kHz), so
+# voice activity detection and segmenting use the same memory for any length
+PCM_BLOCK_SECONDS = 10
+
+# Rates Speech-to-Text accepts for Opus
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+# Voice activity detection: 20 ms frames; speech is louder than VAD_ENERGY_RATIO
+# times the noise floor (and than VAD_MIN_RMS, about -55 dBFS), or moderately loud
+# with the high zero-crossing rate of unvoiced consonants
+VAD_FRAME_SECONDS = 0.02
+VAD_ENERGY_RATIO = 3.0
+VAD_MIN_RMS = 60.0
+VAD_UNVOICED_ZCR = 0.25
+
+# Sample rate recordings are decoded at when their duration is not in the headers
+DURATION_PROBE_RATE = 8000
+
+# MPEG audio sample rates by version bits, for MP3 frame headers
+MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def ffmpeg_available():
+    return shutil.which(settings.FFMPEG_BINARY) is not None
+
+
+def _read_wav(audio_file_path):
+    with wave.open(audio_file_path, 'rb') as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError("Only 16-bit PCM WAV files can be decoded without ffmpeg")
+        channels = wav.getnchannels()
+        sample_rate = wav.getframerate()
+        pcm = np.frombuffer(wav.readframes(wav.getnframes()), dtype='<i2')
+    if channels > 1:
+        pcm = pcm.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return pcm, sample_rate
+
+
+def _decimate(pcm, sample_rate, target_rate):
+    """
+    Resample to ``target_rate`` when it divides ``sample_rate`` by a whole factor
+    """
+    factor = sample_rate // target_rate
+    if factor <= 1 or sample_rate % target_rate:
+        return pcm, sample_rate
+    # Averaging each block low-passes the signal before dropping samples
+    usable = len(pcm) - len(pcm) % factor
+    return pcm[:usable].astype(np.int32).reshape(-1, factor).mean(axis=1).astype(np.int16), target_rate
+
+
+def iter_pcm(audio_file_path, sample_rate=PCM_SAMPLE_RATE, block_seconds=PCM_BLOCK_SECONDS):
+    """
+    Decode an audio file to mono 16-bit PCM at ``sample_rate``, yielded in
+    blocks of about ``block_seconds`` so a long recording is never whole in memory.
+
+    16-bit WAV files at the target rate or a whole multiple of it are read
+    directly; everything else is decoded with ffmpeg.
+    """
+    block_samples = max(int(block_seconds * sample_rate), 1)
+    try:
+        wav = wave.open(audio_file_path, 'rb')
+    except (wave.Error, EOFError):
+        wav = None
+    if wav is not None:
+        with wav:
+            channels, file_rate = wav.getnchannels(), wav.getframerate()
+            if wav.getsampwidth() == 2 and file_rate % sample_rate == 0:
+                frame_bytes = 2 * channels
+                # Whole decimation blocks, so averaging never straddles two reads
+                for frames in iter(lambda: wav.readframes(block_samples * (file_rate // sample_rate)), b''):
+                    pcm = np.frombuffer(frames[:len(frames) - len(frames) % frame_bytes], dtype='<i2')
+                    if channels > 1:
+                        pcm = pcm.reshape(-1, channels).mean(axis=1).astype(np.int16)
+                    yield _decimate(pcm, file_rate, sample_rate)[0]
+                return
+
+    if not ffmpeg_available():
+        raise RuntimeError("ffmpeg is required to decode this audio format")
+
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(
+            [
+                settings.FFMPEG_BINARY, '-nostdin', '-loglevel', 'error',
+                '-i', audio_file_path,
+                '-f', 's16le', '-acodec', 'pcm_s16le', '-ac', '1', '-ar', str(sample_rate),
+                '-',
+            ],
+            stdout=subprocess.PIPE,
+            stderr=stderr,
+        )
+        try:
+            for data in iter(lambda: process.stdout.read(2 * block_samples), b''):
+                yield np.frombuffer(data, dtype='<i2')
+        except GeneratorExit:
+            # The caller stopped reading; don't wait for the rest of the file to decode
+            process.kill()
+            raise
+        finally:
+            process.stdout.close()
+            process.wait()
+        if process.returncode != 0:
+            stderr.seek(0)
+            raise RuntimeError(f"ffmpeg failed to decode audio: {stderr.read().decode(errors='replace').strip()}")
+
+
+def _sniff_wav(header):
+    offset = 12
+    while offset + 8 <= len(header):
+        chunk_id = header[offset:offset + 4]
+        size = struct.unpack_from('<I', header, offset + 4)[0]
+        if chunk_id == b'fmt ' and offset + 24 <= len(header):
+            format_tag, channels, sample_rate = struct.unpack_from('<HHI', header, offset + 8)
+            bits = struct.unpack_from('<H', header, offset + 22)[0]
+            if format_tag == 0xFFFE and offset + 34 <= len(header):
+                # WAVE_FORMAT_EXTENSIBLE: the real format leads the SubFormat GUID
+                format_tag = struct.unpack_from('<H', header, offset + 32)[0]
+            if format_tag == 1 and bits == 16:
+                encoding = 'LINEAR16'
+            elif format_tag == 7:
+                encoding = 'MULAW'
+            else:
+                encoding = None
+            return AudioFormat('wav', encoding, sample_rate, channels)
+        offset += 8 + size + (size & 1)
+    return AudioFormat('wav', None, None, None)
+
+
+def _sniff_flac(header):
+    # STREAMINFO: 20 bits of sample rate, then 3 bits of channel count - 1
+    if len(header) < 21:
+        return AudioFormat('flac', 'FLAC', None, None)
+    packed = int.from_bytes(header[18:21], 'big')
+    return AudioFormat('flac', 'FLAC', packed >> 4, ((packed >> 1) & 0x7) + 1)
+
+
+def _sniff_ogg(header):
+    packet = header[27 + header[26]:] if len(header) > 27 else b''
+    if packet.startswith(b'OpusHead') and len(packet) >= 16:
+        input_rate = struct.unpack_from('<I', packet, 12)[0]
+        sample_rate = input_rate if input_rate in OPUS_SAMPLE_RATES else 48000
+        return AudioFormat('ogg', 'OGG_OPUS', sample_rate, packet[9])
+    return AudioFormat('ogg', None, None, None)
+
+
+def _sniff_mp3(audio_file, header):
+    offset = 0
+    if header.startswith(b'ID3') and len(header) >= 10:
+        # Skip the ID3v2 tag; its size is stored as four 7-bit bytes
+        offset = 10 + sum((byte & 0x7F) << shift for byte, shift in zip(header[6:10], (21, 14, 7, 0)))
+        audio_file.seek(offset)
+        header = audio_file.read(4)
+        offset = 0
+    frame = header[offset:offset + 4]
+    if len(frame) < 4 or frame[0] != 0xFF or frame[1] & 0xE0 != 0xE0:
+        return AudioFormat('mp3', 'MP3', None, None)
+    version = (frame[1] >> 3) & 0x3
+    rate_index = (frame[2] >> 2) & 0x3
+    rates = MP3_SAMPLE_RATES.get(version)
+    sample_rate = rates[rate_index] if rates and rate_index < 3 else None
+    return AudioFormat('mp3', 'MP3', sample_rate, 1 if frame[3] >> 6 == 3 else 2)
+
+
+def sniff_audio_format(audio_file_path):
+    """
+    Container, recognition encoding, sample rate and channels read from file headers
+    """
+    with open(audio_file_path, 'rb') as audio_file:
+        header = audio_file.read(SNIFF_BYTES)
+        if header[:4] == b'RIFF' and header[8:12] == b'WAVE':
+            return _sniff_wav(header)
+        if header[:4] == b'fLaC':
+            return _sniff_flac(header)
+        if header[:4] == b'OggS':
+            return _sniff_ogg(header)
+        if header[:4] == b'\x1a\x45\xdf\xa3':
+            if b'A_OPUS' in header:
+                return AudioFormat('webm', 'WEBM_OPUS', 48000, None)
+            return AudioFormat('webm', None, None, None)
+        if header.startswith(b'#!AMR-WB\n'):
+            return AudioFormat('amr', 'AMR_WB', 16000, 1)
+        if header.startswith(b'#!AMR\n'):
+            return AudioFormat('amr', 'AMR', 8000, 1)
+        if header.startswith(b'ID3') or (len(header) > 1 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0):
+            return _sniff_mp3(audio_file, header)
+        if header[4:8] == b'ftyp':
+            return AudioFormat('mp4', None, None, None)
+    return AudioFormat('unknown', None, None, None)
+
+
+def audio_duration(audio_file_path):
+    """
+    Length of a recording in seconds, read from WAV and FLAC headers or else
+    counted by decoding it with ffmpeg; None when neither is possible
+    """
+    with open(audio_file_path, 'rb') as audio_file:
+        header = audio_file.read(SNIFF_BYTES)
+    if header[:4] == b'RIFF' and header[8:12] == b'WAVE':
+        try:
+            with wave.open(audio_file_path, 'rb') as wav:
+                return wav.getnframes() / wav.getframerate()
+        except (wave.Error, EOFError):
+            pass
+    if header[:4] == b'fLaC' and len(header) >= 26:
+        # STREAMINFO: 20 bits of sample rate, 8 bits of channels and depth, 36 bits of total samples
+        packed = int.from_bytes(header[18:26], 'big')
+        sample_rate, total_samples = packed >> 44, packed & ((1 << 36) - 1)
+        if sample_rate and total_samples:
+            return total_samples / sample_rate
+
+    # Browser recordings (WebM/Opus) often carry no duration, so count decoded samples
+    if not ffmpeg_available():
+        return None
+    process = subprocess.Popen(
+        [
+            settings.FFMPEG_BINARY, '-nostdin', '-loglevel', 'error',
+            '-i', audio_file_path,
+            '-f', 's16le', '-acodec', 'pcm_s16le', '-ac', '1', '-ar', str(DURATION_PROBE_RATE),
+            '-',
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    decoded = 0
+    with process.stdout:
+        for chunk in iter(lambda: process.stdout.read(1 << 16), b''):
+            decoded += len(chunk)
+    if process.wait() != 0:
+        return None
+    return decoded / (2 * DURATION_PROBE_RATE)
+
+
+def describe_audio_format(audio_format):
+    parts = [f"{audio_format.container}/{audio_format.encoding or 'unsupported'}"]
+    if audio_format.sample_rate:
+        parts.append(f"{audio_format.sample_rate}Hz")
+    if audio_format.channels:
+        parts.append(f"{audio_format.channels}ch")
+    return ' '.join(parts)
+
+
+def _needs_reencoding(audio_format):
+    """
+    Whether the provider can't take the recording, or it is lossless audio
+    that 16 kHz mono FLAC would shrink
+    """
+    if audio_format.encoding is None:
+        return True
+    if audio_format.encoding == 'LINEAR16':
+        return True
+    if audio_format.encoding == 'FLAC':
+        return (audio_format.sample_rate or 0) > PCM_SAMPLE_RATE or (audio_format.channels or 1) > 1
+    return False
+
+
+def _reencode_with_ffmpeg(audio_file_path, output_path):
+    result = subprocess.run(
+        [
+            settings.FFMPEG_BINARY, '-nostdin', '-loglevel', 'error', '-y',
+            '-i', audio_file_path,
+            '-vn', '-ac', '1', '-ar', str(PCM_SAMPLE_RATE), '-sample_fmt', 's16', '-c:a', 'flac',
+            output_path,
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        check=False,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to re-encode audio: {result.stderr.decode(errors='replace').strip()}")
+    return AudioFormat('flac', 'FLAC', PCM_SAMPLE_RATE, 1)
+
+
+def _downsample_wav(audio_file_path, output_path):
+    """
+    Downmix a 16-bit WAV and decimate it by a whole factor towards 16 kHz, without ffmpeg
+    """
+    pcm, sample_rate = _decimate(*_read_wav(audio_file_path), PCM_SAMPLE_RATE)
+    with open(output_path, 'wb') as output:
+        output.write(pcm_to_wav_bytes(pcm, sample_rate))
+    return AudioFormat('wav', 'LINEAR16', sample_rate, 1)
+
+
+def encode_pcm_file(blocks, output_path, sample_rate=PCM_SAMPLE_RATE):
+    """
+    Like ``encode_pcm`` for PCM arriving in blocks, written to ``output_path``
+    as it is encoded. Returns the format written.
+    """
+    if not ffmpeg_available():
+        with wave.open(output_path, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(sample_rate)
+            for block in blocks:
+                wav.writeframes(np.asarray(block, dtype='<i2').tobytes())
+        return AudioFormat('wav', 'LINEAR16', sample_rate, 1)
+
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(
+            [
+                settings.FFMPEG_BINARY, '-nostdin', '-loglevel', 'error', '-y',
+                '-f', 's16le', '-ar', str(sample_rate), '-ac', '1', '-i', '-',
+                '-c:a', 'libopus', '-b:a', settings.SPEECH_OPUS_BITRATE, '-application', 'voip',
+                '-f', 'ogg', output_path,
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=stderr,
+        )
+        try:
+            for block in blocks:
+                process.stdin.write(np.asarray(block, dtype='<i2').tobytes())
+        except BrokenPipeError:
+            # ffmpeg gave up; its error is reported below
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+            process.wait()
+        if process.returncode != 0:
+            stderr.seek(0)
+            raise RuntimeError(f"ffmpeg failed to encode audio: {stderr.read().decode(errors='replace').strip()}")
+    return AudioFormat('ogg', 'OGG_OPUS', sample_rate, 1)
+
+
+def encode_pcm(pcm, sample_rate=PCM_SAMPLE_RATE):
+    """
+    Compress mono 16-bit PCM for upload: Ogg Opus at SPEECH_OPUS_BITRATE with
+    ffmpeg, or WAV without it. Returns the encoded bytes and their format.
+    """
+    if not ffmpeg_available():
+        return pcm_to_wav_bytes(pcm, sample_rate), AudioFormat('wav', 'LINEAR16', sample_rate, 1)
+    result = subprocess.run(
+        [
+            settings.FFMPEG_BINARY, '-nostdin', '-loglevel', 'error',
+            '-f', 's16le', '-ar', str(sample_rate), '-ac', '1', '-i', '-',
+            '-c:a', 'libopus', '-b:a', settings.SPEECH_OPUS_BITRATE, '-application', 'voip',
+            '-f', 'ogg', '-',
+        ],
+        input=np.asarray(pcm, dtype='<i2').tobytes(),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=False,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to encode audio: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout, AudioFormat('ogg', 'OGG_OPUS', sample_rate, 1)
+
+
+def _prepare_without_silence(audio_file_path, audio_format, original_bytes):
+    """
+    Speech-only version of a recording, or None if it can't be decoded or
+    has too little silence to be worth cutting.
+
+    The recording is decoded twice, once to find the speech and once to
+    encode it, so only a block of samples is ever held in memory.
+    """
+    frame_length = max(int(PCM_SAMPLE_RATE * VAD_FRAME_SECONDS), 1)
+    try:
+        features = frame_features(iter_pcm(audio_file_path), frame_length)
+    except RuntimeError:
+        return None
+    spans = speech_spans(features, settings.SPEECH_VAD_PADDING_SECONDS, settings.SPEECH_VAD_MIN_SILENCE_SECONDS)
+    if not spans:
+        # Nothing sounded like speech; let the provider decide
+        return None
+    offsets = SpeechOffsets(spans, PCM_SAMPLE_RATE, features.samples)
+    if offsets.speech_ratio > 1 - settings.SPEECH_VAD_MIN_SAVING:
+        return None
+
+    fd, output_path = tempfile.mkstemp(suffix='.ogg' if ffmpeg_available() else '.wav')
+    os.close(fd)
+    try:
+        converted_format = encode_pcm_file(_kept_samples(iter_pcm(audio_file_path), spans), output_path)
+    except RuntimeError:
+        os.remove(output_path)
+        return None
+    converted_bytes = os.path.getsize(output_path)
+    # WAV without ffmpeg can be far larger than a compressed upload even after cutting silence
+    if audio_format.encoding is not None and converted_bytes >= original_bytes:
+        os.remove(output_path)
+        return None
+    return PreparedAudio(output_path, converted_format, audio_format, original_bytes, converted_bytes, True, offsets)
+
+
+def prepare_audio(audio_file_path, strip_silence=False):
+    """
+    Detect a recording's format and, where it helps, re-encode it for speech-to-text.
+
+    With ``strip_silence`` the audio is decoded and spans without speech are
+    cut out (see ``detect_speech``) when that removes at least
+    ``SPEECH_VAD_MIN_SAVING`` of it; the speech is re-encoded as Opus (WAV
+    without ffmpeg) and only used if it is smaller than the original.
+    Otherwise, formats the provider cannot read and uncompressed or high-rate lossless audio are converted to 16 kHz
+    mono FLAC with ffmpeg (16-bit WAV is downmixed and decimated in-process
+    when ffmpeg is missing), and compressed formats the provider accepts,
+    like Opus and AMR, are sent as they are. A converted file is only used
+    if it is shorter, smaller or the original cannot be recognized at all;
+    callers delete it when ``temporary`` is set.
+    """
+    audio_format = sniff_audio_format(audio_file_path)
+    original_bytes = os.path.getsize(audio_file_path)
+    unchanged = PreparedAudio(
+        audio_file_path, audio_format, audio_format, original_bytes, original_bytes, False, None
+    )
+    if strip_silence:
+        stripped = _prepare_without_silence(audio_file_path, audio_format, original_bytes)
+        if stripped is not None:
+            return stripped
+    if not _needs_reencoding(audio_format):
+        return unchanged
+
+    if ffmpeg_available():
+        suffix, convert = '.flac', _reencode_with_ffmpeg
+    elif audio_format.encoding == 'LINEAR16' and (
+        audio_format.channels > 1 or audio_format.sample_rate > PCM_SAMPLE_RATE
+    ):
+        suffix, convert = '.wav', _downsample_wav
+    else:
+        return unchanged
+
+    fd, output_path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    try:
+        converted_format = convert(audio_file_path, output_path)
+    except Exception:
+        os.remove(output_path)
+        if audio_format.encoding is None:
+            raise
+        return unchanged
+    converted_bytes = os.path.getsize(output_path)
+    if audio_format.encoding is not None and converted_bytes >= original_bytes:
+        os.remove(output_path)
+        return unchanged
+    return PreparedAudio(output_path, converted_format, audio_format, original_bytes, converted_bytes, True, None)
+
+
+def pcm_to_wav_bytes(pcm, sample_rate=PCM_SAMPLE_RATE):
+    """
+    Wrap mono 16-bit PCM samples in a WAV container
+    """
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(np.asarray(pcm, dtype='<i2').tobytes())
+    return buffer.getvalue()
+
+
+def frame_rms(pcm, frame_length):
+    """
+    Root-mean-square energy of consecutive non-overlapping frames
+    """
+    frame_count = len(pcm) // frame_length
+    if frame_count == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = pcm[:frame_count * frame_length].astype(np.float32).reshape(frame_count, frame_length)
+    return np.sqrt(np.mean(frames * frames, axis=1))
+
+
+def frame_zero_crossings(pcm, frame_length):
+    """
+    Fraction of adjacent sample pairs that change sign, per non-overlapping frame
+    """
+    frame_count = len(pcm) // frame_length
+    if frame_count == 0 or frame_length < 2:
+        return np.zeros(frame_count, dtype=np.float32)
+    signs = np.signbit(pcm[:frame_count * frame_length]).reshape(frame_count, frame_length)
+    return np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+
+def frame_features(blocks, frame_length):
+    """
+    ``FrameFeatures`` of PCM arriving in blocks; samples left over at the end
+    of a block are carried into the next one's first frame
+    """
+    energy, zero_crossings = [], []
+    carry, samples = np.zeros(0, dtype=np.int16), 0
+    for block in blocks:
+        samples += len(block)
+        pcm = np.concatenate((carry, block)) if len(carry) else block
+        usable = len(pcm) - len(pcm) % frame_length
+        energy.append(frame_rms(pcm[:usable], frame_length))
+        zero_crossings.append(frame_zero_crossings(pcm[:usable], frame_length))
+        carry = pcm[usable:]
+    return FrameFeatures(
+        np.concatenate(energy) if energy else np.zeros(0, dtype=np.float32),
+        np.concatenate(zero_crossings) if zero_crossings else np.zeros(0, dtype=np.float32),
+        frame_length, samples
+    )
+
+
+def detect_speech(pcm, sample_rate, padding_seconds=0.3, min_silence_seconds=1.0):
+    """
+    Sample ranges of ``pcm`` that contain speech; see ``speech_spans``
+    """
+    frame_length = max(int(sample_rate * VAD_FRAME_SECONDS), 1)
+    return speech_spans(frame_features([pcm], frame_length), padding_seconds, min_silence_seconds)
+
+
+def speech_spans(features, padding_seconds=0.3, min_silence_seconds=1.0):
+    """
+    Sample ranges that contain speech, from ``FrameFeatures`` of VAD_FRAME_SECONDS frames.
+
+    Frames are classified by RMS energy against a threshold derived from the
+    recording's noise floor, and by zero-crossing rate to keep quieter
+    unvoiced consonants. Speech is widened by ``padding_seconds`` on each
+    side, and only silences of at least ``min_silence_seconds`` separate
+    ranges, so ordinary pauses between words are kept.
+    """
+    energy, zcr, frame_length = features.energy, features.zero_crossings, features.frame_length
+    if len(energy) == 0:
+        return []
+
+    floor = np.percentile(energy, 10)
+    loud = np.percentile(energy, 90)
+    # Never demand more than a quarter of the loud level, so a recording without pauses keeps its quiet speech
+    threshold = min(max(floor * VAD_ENERGY_RATIO, VAD_MIN_RMS), max(loud / 4, VAD_MIN_RMS))
+    speech = (energy > threshold) | ((energy > (floor + threshold) / 2) & (zcr > VAD_UNVOICED_ZCR))
+
+    pad_frames = int(round(padding_seconds / VAD_FRAME_SECONDS))
+    if pad_frames:
+        speech = np.convolve(speech, np.ones(2 * pad_frames + 1), mode='same') > 0
+
+    # Silent runs, found as edges of the speech mask
+    edges = np.flatnonzero(np.diff(np.concatenate(([1], speech.astype(np.int8), [1]))))
+    silences = edges.reshape(-1, 2)
+    min_frames = max(int(round(min_silence_seconds / VAD_FRAME_SECONDS)), 1)
+    silences = silences[silences[:, 1] - silences[:, 0] >= min_frames]
+
+    spans, cursor = [], 0
+    for start, end in silences:
+        if start > cursor:
+            spans.append((cursor * frame_length, start * frame_length))
+        cursor = end
+    if cursor < len(energy):
+        # The last range includes any samples after the final whole frame
+        spans.append((cursor * frame_length, features.samples))
+    return spans
+
+
+def _kept_samples(blocks, spans):
+    """
+    The parts of PCM arriving in blocks that fall inside the sorted, non-overlapping ``spans``
+    """
+    position, index = 0, 0
+    for block in blocks:
+        block_end = position + len(block)
+        while index < len(spans) and spans[index][0] < block_end:
+            start, end = spans[index]
+            piece = block[max(start - position, 0):min(end, block_end) - position]
+            if len(piece):
+                yield piece
+            if end > block_end:
+                break
+            index += 1
+        position = block_end
+
+
+class SpeechOffsets:
+    """
+    Maps times in audio with silence removed back to the original recording
+    """
+
+    def __init__(self, spans, sample_rate, total_samples):
+        self.sample_rate = sample_rate
+        self.total_samples = total_samples
+        self.original_starts = np.array([start for start, _ in spans], dtype=np.int64)
+        lengths = np.array([end - start for start, end in spans], dtype=np.int64)
+        self.kept_starts = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+        self.kept_samples = int(lengths.sum())
+
+    @property
+    def original_seconds(self):
+        return self.total_samples / self.sample_rate
+
+    @property
+    def speech_seconds(self):
+        return self.kept_samples / self.sample_rate
+
+    @property
+    def speech_ratio(self):
+        return self.kept_samples / self.total_samples if self.total_samples else 1.0
+
+    def to_original(self, seconds):
+        """
+        Position in the original recording of ``seconds`` into the speech-only audio
+        """
+        sample = seconds * self.sample_rate
+        index = max(int(np.searchsorted(self.kept_starts, sample, side='right')) - 1, 0)
+        return (self.original_starts[index] + sample - self.kept_starts[index]) / self.sample_rate
+
+    def as_list(self):
+        """
+        ``[kept_start, original_start]`` pairs in seconds, one per speech range
+        """
+        return [
+            [round(kept / self.sample_rate, 3), round(original / self.sample_rate, 3)]
+            for kept, original in zip(self.kept_starts.tolist(), self.original_starts.tolist())
+        ]
+
+
+def find_split_points(pcm, sample_rate, target_seconds, search_seconds, frame_seconds=0.02):
+    """
+    Sample offsets near every ``target_seconds`` where ``pcm`` is quietest; see ``quiet_points``
+    """
+    frame_length = max(int(sample_rate * frame_seconds), 1)
+    return quiet_points(frame_features([pcm], frame_length), sample_rate, target_seconds, search_seconds)
+
+
+def quiet_points(features, sample_rate, target_seconds, search_seconds):
+    """
+    Sample offsets near every ``target_seconds`` where the audio is quietest.
+
+    Each cut is placed at the lowest-energy frame within ``search_seconds``
+    before the target, so segments end in pauses rather than mid-word and
+    never exceed the target length.
+    """
+    energy, frame_length = features.energy, features.frame_length
+    frame_seconds = frame_length / sample_rate
+    target_frames = max(int(target_seconds / frame_seconds), 1)
+    search_frames = max(int(search_seconds / frame_seconds), 1)
+
+    points = []
+    start = 0
+    while len(energy) - start > target_frames:
+        window_end = start + target_frames
+        window_start = max(window_end - search_frames, start + 1)
+        quietest = window_start + int(np.argmin(energy[window_start:window_end]))
+        points.append(quietest * frame_length)
+        start = quietest
+    return points
+
+
+def segment_ranges(points, total_samples, overlap_samples=0):
+    """
+    ``(start, end)`` sample ranges between the given cut points, extending
+    each segment into the next by ``overlap_samples`` so words at the
+    boundary are not lost
+    """
+    bounds = [0] + list(points) + [total_samples]
+    return [
+        (start, min(end + overlap_samples, total_samples))
+        for start, end in zip(bounds[:-1], bounds[1:])
+        if end > start
+    ]
+
+
+def split_segments(pcm, points, overlap_samples=0):
+    """
+    Cut PCM at the given points; see ``segment_ranges``
+    """
+    return [pcm[start:end] for start, end in segment_ranges(points, len(pcm), overlap_samples)]
+
+
+def pcm_ranges(blocks, ranges):
+    """
+    Samples of each ``(start, end)`` range, in order, from PCM arriving in
+    blocks. Ranges must be sorted and may overlap; only samples from the
+    current range's start on are kept, so memory is bounded by the longest
+    range plus a block.
+    """
+    buffer, offset, index = np.zeros(0, dtype=np.int16), 0, 0
+    for block in blocks:
+        if index == len(ranges):
+            return
+        buffer = np.concatenate((buffer, block))
+        while True:
+            drop = min(ranges[index][0] - offset, len(buffer))
+            buffer, offset = buffer[drop:], offset + drop
+            start, end = ranges[index]
+            if offset + len(buffer) < end:
+                break
+            yield buffer[start - offset:end - offset]
+            index += 1
+            if index == len(ranges):
+                return
+    # The recording ended early
+    for start, end in ranges[index:]:
+        yield buffer[max(start - offset, 0):max(end - offset, 0)]
+
+
+def _normalize_word(word):
+    return ''.join(ch for ch in word.lower() if ch.isalnum())
+
+
+def stitch_transcripts(parts, max_overlap_words=12):
+    """
+    Join ordered segment transcripts, dropping words repeated across a boundary
+    """
+    words = []
+    for part in parts:
+        part_words = part.split()
+        if not part_words:
+            continue
+        overlap = 0
+        limit = min(max_overlap_words, len(words), len(part_words))
+        for size in range(limit, 0, -1):
+            tail = [_normalize_word(word) for word in words[-size:]]
+            head = [_normalize_word(word) for word in part_words[:size]]
+            if tail == head:
+                overlap = size
+                break
+        words.extend(part_words[overlap:])
+    return ' '.join(words)
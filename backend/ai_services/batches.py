@@ -0,0 +1,153 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .events import publish_notes
+from .models import AIJob, ReprocessBatch
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_JOB_STATUSES = ('queued', 'running')
+
+
+def _notes_in_pipeline():
+    """
+    Ids of notes with a pipeline job queued or running
+    """
+    return AIJob.objects.filter(
+        status__in=ACTIVE_JOB_STATUSES, job_type__in=AIJob.PIPELINE_JOB_TYPES
+    ).values('note_id')
+
+
+def eligible_notes(course):
+    """
+    Notes of a course that have content to process and no job already pending
+    """
+    return course.notes.exclude(raw_content='').exclude(id__in=_notes_in_pipeline())
+
+
+def _enqueue_notes(batch, note_ids):
+    """
+    Queue one job per note for a batch with a single insert and status update
+    """
+    from notes.models import Note
+
+    if not note_ids:
+        return 0
+    now = timezone.now()
+    AIJob.objects.bulk_create([
+        AIJob(
+            note_id=note_id,
+            batch=batch,
+            job_type='process_note',
+            priority='batch',
+            max_attempts=settings.AI_JOB_MAX_ATTEMPTS,
+        )
+        for note_id in note_ids
+    ])
+    Note.objects.filter(id__in=note_ids).update(processing_status='queued', updated_at=now)
+    publish_notes(note_ids)
+    return len(note_ids)
+
+
+def active_batch(course):
+    """
+    Running batch for a course, if any
+    """
+    return course.reprocess_batches.filter(status='running').first()
+
+
+def start_batch(course, user, max_concurrency=None):
+    """
+    Create a batch and queue every eligible note of the course.
+
+    At most ``max_concurrency`` of its jobs run at once (default
+    ``settings.AI_REPROCESS_CONCURRENCY``) so a bulk run leaves workers free
+    for interactive requests.
+    """
+    with transaction.atomic():
+        batch = ReprocessBatch.objects.create(
+            user=user,
+            course=course,
+            max_concurrency=max_concurrency or settings.AI_REPROCESS_CONCURRENCY,
+        )
+        note_ids = list(eligible_notes(course).values_list('id', flat=True))
+        _enqueue_notes(batch, note_ids)
+    logger.info("Reprocess batch %s queued %s notes of course %s", batch.id, len(note_ids), course.id)
+    return batch
+
+
+def resume_batch(batch):
+    """
+    Pick an interrupted or partly failed batch back up.
+
+    Failed jobs are queued again with fresh attempts, and eligible notes of
+    the course without a job in this batch (e.g. added since, or busy when it
+    started) are added. Work that already succeeded is not repeated.
+    """
+    from notes.models import Note
+
+    now = timezone.now()
+    with transaction.atomic():
+        failed = batch.jobs.filter(status='failed').exclude(note_id__in=_notes_in_pipeline())
+        failed_note_ids = list(failed.values_list('note_id', flat=True))
+        retried = failed.update(
+            status='queued',
+            attempts=0,
+            run_after=now,
+            last_error='',
+            finished_at=None,
+            updated_at=now,
+        )
+        Note.objects.filter(id__in=failed_note_ids).update(processing_status='queued', updated_at=now)
+
+        missing = eligible_notes(batch.course).exclude(ai_jobs__batch=batch)
+        added = _enqueue_notes(batch, list(missing.values_list('id', flat=True)))
+
+        ReprocessBatch.objects.filter(id=batch.id).update(status='running', finished_at=None, updated_at=now)
+    publish_notes(failed_note_ids)
+    batch.refresh_from_db()
+    logger.info("Reprocess batch %s resumed: %s retried, %s added", batch.id, retried, added)
+    return batch
+
+
+def saturated_batches(now):
+    """
+    Ids of running batches that already have their maximum of jobs in progress
+    """
+    return ReprocessBatch.objects.filter(status='running').annotate(
+        in_progress=Count('jobs', filter=Q(jobs__status='running', jobs__locked_until__gte=now))
+    ).filter(in_progress__gte=F('max_concurrency')).values('id')
+
+
+def batch_progress(batch):
+    """
+    Aggregate job counts for a batch, marking it completed once nothing is left to run
+    """
+    counts = dict(batch.jobs.order_by().values_list('status').annotate(count=Count('id')))
+    progress = {status: counts.get(status, 0) for status, _ in AIJob.STATUS_CHOICES}
+    total = sum(progress.values())
+    done = progress['succeeded'] + progress['failed']
+
+    if batch.status == 'running' and progress['queued'] == 0 and progress['running'] == 0:
+        now = timezone.now()
+        ReprocessBatch.objects.filter(id=batch.id, status='running').update(
+            status='completed', finished_at=now, updated_at=now
+        )
+        batch.status, batch.finished_at = 'completed', now
+
+    return {
+        'batch_id': batch.id,
+        'course_id': batch.course_id,
+        'status': batch.status,
+        'max_concurrency': batch.max_concurrency,
+        'total': total,
+        'done': done,
+        'percent': round(100 * done / total, 1) if total else 100.0,
+        **progress,
+        'created_at': batch.created_at,
+        'finished_at': batch.finished_at,
+    }
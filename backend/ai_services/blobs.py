@@ -0,0 +1,131 @@
+import logging
+import os
+
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .audio import describe_audio_format
+from .models import AudioBlob
+
+logger = logging.getLogger(__name__)
+
+
+def blob_storage_name(content_hash, file_name):
+    """
+    Content-addressed storage name, keeping the original extension
+    """
+    extension = os.path.splitext(file_name)[1].lower()
+    return f"audio/{content_hash}{extension}"
+
+
+def attach_audio(note, content_hash, size, file_name, save_file):
+    """
+    Point a note at the recording with ``content_hash``, storing it only if new.
+
+    ``save_file(name)`` saves the upload under a storage name and returns the
+    name actually used; it is not called when an identical recording is
+    already stored. Returns the blob.
+    """
+    if note.audio_blob_id:
+        current = AudioBlob.objects.filter(id=note.audio_blob_id).first()
+        if current and current.content_hash == content_hash:
+            return current
+
+    previous_blob_id = note.audio_blob_id
+    for _ in range(3):
+        blob = _stored_blob(content_hash, size, file_name, save_file)
+        with transaction.atomic():
+            # Lock the row so release_blob cannot drop it to zero and delete it
+            # between the lookup above and the increment
+            blob = AudioBlob.objects.select_for_update().filter(id=blob.id).first()
+            if blob is None:
+                # Released and deleted meanwhile; store the recording again
+                continue
+            AudioBlob.objects.filter(id=blob.id).update(ref_count=F('ref_count') + 1)
+            note.audio_blob = blob
+            note.audio_file_path = default_storage.path(blob.file_path)
+            note.save(update_fields=['audio_blob', 'audio_file_path', 'updated_at'])
+            break
+    else:
+        raise RuntimeError(f"Could not store audio blob {content_hash}")
+
+    if previous_blob_id:
+        release_blob(previous_blob_id)
+    return blob
+
+
+def _stored_blob(content_hash, size, file_name, save_file):
+    """
+    Blob for ``content_hash`` with its file in storage, creating either if missing
+    """
+    for _ in range(2):
+        blob = AudioBlob.objects.filter(content_hash=content_hash).first()
+        if blob is not None and default_storage.exists(blob.file_path):
+            return blob
+        if blob is not None:
+            # Stored file went missing; store the upload again under the same blob
+            blob.file_path = save_file(blob.file_path)
+            blob.save(update_fields=['file_path', 'updated_at'])
+            return blob
+
+        file_path = save_file(blob_storage_name(content_hash, file_name))
+        try:
+            with transaction.atomic():
+                return AudioBlob.objects.create(
+                    content_hash=content_hash, file_path=file_path, size=size
+                )
+        except IntegrityError:
+            # Another request stored the same recording first
+            default_storage.delete(file_path)
+    raise RuntimeError(f"Could not store audio blob {content_hash}")
+
+
+def release_blob(blob_id):
+    """
+    Drop one reference to a blob, deleting the file when nothing uses it
+    """
+    with transaction.atomic():
+        AudioBlob.objects.filter(id=blob_id, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+        blob = AudioBlob.objects.select_for_update().filter(id=blob_id, ref_count=0).first()
+        if blob is None:
+            return
+        file_path = blob.file_path
+        blob.delete()
+    try:
+        default_storage.delete(file_path)
+    except OSError as e:
+        logger.warning("Could not delete audio file %s: %s", file_path, e)
+
+
+def cached_transcript(note):
+    """
+    Transcript already produced for the note's recording, if any
+    """
+    if not note.audio_blob_id:
+        return ''
+    return AudioBlob.objects.filter(id=note.audio_blob_id).values_list('transcript', flat=True).first() or ''
+
+
+def record_audio_preparation(note, prepared):
+    """
+    Remember the detected format of the note's recording, the bytes
+    re-encoding saved and, if silence was cut, where the speech came from
+    """
+    if not note.audio_blob_id:
+        return
+    offsets = prepared.offsets
+    AudioBlob.objects.filter(id=note.audio_blob_id).update(
+        audio_format=describe_audio_format(prepared.original_format),
+        stt_bytes_saved=prepared.original_bytes - prepared.bytes,
+        speech_ratio=round(offsets.speech_ratio, 4) if offsets else None,
+        silence_seconds_removed=round(offsets.original_seconds - offsets.speech_seconds, 3) if offsets else None,
+        speech_offsets=offsets.as_list() if offsets else [],
+    )
+
+
+def store_transcript(note, transcript, timings=None):
+    if note.audio_blob_id and transcript:
+        AudioBlob.objects.filter(id=note.audio_blob_id).update(
+            transcript=transcript, transcript_timings=timings or []
+        )
@@ -0,0 +1,120 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+from .metrics import AI_CACHE, LLM_TOKENS_CACHED
+from .models import AIResultCache
+
+
+def content_hash(raw_content):
+    return hashlib.sha256(raw_content.encode('utf-8')).hexdigest()
+
+
+def generation_key(prompt_version, model, temperature):
+    """
+    Identify the settings a result is generated with: prompts, model and temperature
+    """
+    parts = [prompt_version, model, repr(float(temperature))]
+    return hashlib.sha256(':'.join(parts).encode('utf-8')).hexdigest()
+
+
+def make_cache_key(raw_content, prompt_version, model, temperature):
+    """
+    Key a result by what determines it: the content, prompts, model and temperature
+    """
+    parts = [content_hash(raw_content), prompt_version, model, repr(float(temperature))]
+    return hashlib.sha256(':'.join(parts).encode('utf-8')).hexdigest()
+
+
+def get_cached_result(raw_content, prompt_version, model, temperature):
+    """
+    Return cached ``{'key_points', 'detailed_notes', 'prompt_tokens',
+    'completion_tokens'}`` for the content, or None. The tokens are those the
+    result took to generate.
+    """
+    if not settings.AI_CACHE_ENABLED:
+        return None
+
+    key = make_cache_key(raw_content, prompt_version, model, temperature)
+    entry = AIResultCache.objects.filter(cache_key=key).first()
+    if entry is None:
+        AI_CACHE.inc(event='miss')
+        return None
+
+    now = timezone.now()
+    if entry.created_at < now - timedelta(seconds=settings.AI_CACHE_TTL_SECONDS):
+        entry.delete()
+        AI_CACHE.inc(event='miss')
+        AI_CACHE.inc(event='eviction')
+        return None
+
+    AIResultCache.objects.filter(id=entry.id).update(
+        hit_count=F('hit_count') + 1, last_accessed_at=now
+    )
+    AI_CACHE.inc(event='hit')
+    LLM_TOKENS_CACHED.inc(entry.prompt_tokens, kind='prompt')
+    LLM_TOKENS_CACHED.inc(entry.completion_tokens, kind='completion')
+    return {
+        'key_points': entry.key_points,
+        'detailed_notes': entry.detailed_notes,
+        'prompt_tokens': entry.prompt_tokens,
+        'completion_tokens': entry.completion_tokens,
+    }
+
+
+def store_result(raw_content, prompt_version, model, temperature, result):
+    """
+    Cache a generated result, with the tokens it took when ``result`` has
+    them, and evict entries beyond the TTL and size bound
+    """
+    if not settings.AI_CACHE_ENABLED:
+        return
+
+    size = len(json.dumps(result['key_points']).encode('utf-8')) + \
+        len(result['detailed_notes'].encode('utf-8'))
+    try:
+        AIResultCache.objects.update_or_create(
+            cache_key=make_cache_key(raw_content, prompt_version, model, temperature),
+            defaults={
+                'content_hash': content_hash(raw_content),
+                'prompt_version': prompt_version,
+                'model': model,
+                'temperature': temperature,
+                'key_points': result['key_points'],
+                'detailed_notes': result['detailed_notes'],
+                'size_bytes': size,
+                'prompt_tokens': result.get('prompt_tokens', 0),
+                'completion_tokens': result.get('completion_tokens', 0),
+                'last_accessed_at': timezone.now(),
+            }
+        )
+    except IntegrityError:
+        # Another worker stored the same result concurrently
+        return
+    AI_CACHE.inc(event='store')
+    evict()
+
+
+def evict():
+    """
+    Drop expired entries, then least recently used entries above the size bound
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.AI_CACHE_TTL_SECONDS)
+    expired, _ = AIResultCache.objects.filter(created_at__lt=cutoff).delete()
+
+    overflow = AIResultCache.objects.count() - settings.AI_CACHE_MAX_ENTRIES
+    evicted = 0
+    if overflow > 0:
+        stale_ids = list(
+            AIResultCache.objects.order_by('last_accessed_at', 'id')
+            .values_list('id', flat=True)[:overflow]
+        )
+        evicted, _ = AIResultCache.objects.filter(id__in=stale_ids).delete()
+
+    if expired or evicted:
+        AI_CACHE.inc(expired + evicted, event='eviction')
@@ -0,0 +1,202 @@
+import hashlib
+import logging
+import re
+from functools import lru_cache
+
+from django.conf import settings
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Rough average for English text with OpenAI tokenizers, used without tiktoken
+CHARS_PER_TOKEN = 4
+
+_PARAGRAPH_RE = re.compile(r'\n\s*\n')
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+_SPACES_RE = re.compile(r'[ \t\f\v]+')
+_BLANK_LINES_RE = re.compile(r'\n\s*\n\s*(\n\s*)+')
+
+
+@lru_cache(maxsize=None)
+def _encoding(model):
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding('cl100k_base')
+    except Exception as e:
+        # Encoding files could not be loaded (e.g. no network on first use)
+        logger.warning("tiktoken unavailable, estimating token counts: %s", e)
+        return None
+
+
+def estimate_tokens(text):
+    """
+    Count the tokens in a piece of text locally.
+
+    Uses the model's tiktoken encoding when available and a
+    characters-per-token estimate otherwise.
+    """
+    encoding = _encoding(settings.OPENAI_MODEL)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """
+    Shorten text to at most ``max_tokens``, keeping its beginning and end
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    marker = '\n[...]\n'
+    keep = max_tokens - estimate_tokens(marker)
+    if keep <= 0:
+        return ''
+    head_size, tail_size = keep - keep // 2, keep // 2
+
+    encoding = _encoding(settings.OPENAI_MODEL)
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        head, tail = tokens[:head_size], tokens[len(tokens) - tail_size:]
+        return encoding.decode(head) + marker + encoding.decode(tail)
+    head_chars, tail_chars = head_size * CHARS_PER_TOKEN, tail_size * CHARS_PER_TOKEN
+    return text[:head_chars] + marker + text[len(text) - tail_chars:]
+
+
+def compact_text(text):
+    """
+    Collapse runs of spaces and blank lines that cost tokens but carry no content
+    """
+    lines = [_SPACES_RE.sub(' ', line).strip() for line in text.strip().splitlines()]
+    return _BLANK_LINES_RE.sub('\n\n', '\n'.join(lines))
+
+
+def _split_sentences(paragraph):
+    return [sentence for sentence in _SENTENCE_RE.split(paragraph.strip()) if sentence]
+
+
+def _split_words(sentence, max_tokens):
+    """
+    Break a single over-long sentence into word runs that fit the budget
+    """
+    pieces, current, current_tokens = [], [], 0
+    for word in sentence.split():
+        word_tokens = estimate_tokens(' ' + word)
+        if current and current_tokens + word_tokens > max_tokens:
+            pieces.append(' '.join(current))
+            current, current_tokens = [], 0
+        current.append(word)
+        current_tokens += word_tokens
+    if current:
+        pieces.append(' '.join(current))
+    return pieces
+
+
+def split_into_chunks(text, max_tokens):
+    """
+    Split text into chunks of at most ``max_tokens``, breaking on paragraph
+    boundaries first, then sentences, and only splitting words as a last resort
+    """
+    chunks, current, current_tokens = [], [], 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            chunks.append('\n\n'.join(current))
+        current, current_tokens = [], 0
+
+    for paragraph in _PARAGRAPH_RE.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        paragraph_tokens = estimate_tokens(paragraph)
+        if current_tokens + paragraph_tokens <= max_tokens:
+            current.append(paragraph)
+            current_tokens += paragraph_tokens
+            continue
+        flush()
+        if paragraph_tokens <= max_tokens:
+            current.append(paragraph)
+            current_tokens = paragraph_tokens
+            continue
+
+        # Paragraph alone is too large: pack its sentences instead
+        sentences = []
+        for sentence in _split_sentences(paragraph):
+            if estimate_tokens(sentence) > max_tokens:
+                sentences.extend(_split_words(sentence, max_tokens))
+            else:
+                sentences.append(sentence)
+        run, run_tokens = [], 0
+        for sentence in sentences:
+            sentence_tokens = estimate_tokens(sentence) + 1
+            if run and run_tokens + sentence_tokens > max_tokens:
+                chunks.append(' '.join(run))
+                run, run_tokens = [], 0
+            run.append(sentence)
+            run_tokens += sentence_tokens
+        if run:
+            current.append(' '.join(run))
+            current_tokens = run_tokens
+
+    flush()
+    return chunks
+
+
+# Expected sentence length used to pick how often content-defined boundaries occur
+_AVERAGE_SENTENCE_TOKENS = 25
+
+
+def _sentence_units(text, max_tokens):
+    units = []
+    for paragraph in _PARAGRAPH_RE.split(text):
+        for sentence in _split_sentences(paragraph):
+            if estimate_tokens(sentence) > max_tokens:
+                units.extend(_split_words(sentence, max_tokens))
+            else:
+                units.append(sentence)
+    return units
+
+
+def _is_boundary(unit, every):
+    digest = hashlib.sha1(unit.encode('utf-8')).digest()
+    return int.from_bytes(digest[:4], 'big') % every == 0
+
+
+def split_into_segments(text, target_tokens, max_tokens=None):
+    """
+    Split text into segments whose boundaries depend only on nearby content.
+
+    A segment may end after a sentence whose hash selects it as a boundary,
+    once the segment holds at least half of ``target_tokens``; it is forced
+    to end before exceeding ``max_tokens`` (default twice the target). Because the decision mostly
+    depends on the sentence itself rather than on its offset in the text,
+    editing one sentence usually changes only the segment containing it (and
+    occasionally the next one); the other segments keep the same text and
+    hash.
+    """
+    min_tokens = target_tokens // 2
+    max_tokens = max_tokens or target_tokens * 2
+    every = max(target_tokens // (2 * _AVERAGE_SENTENCE_TOKENS), 1)
+
+    segments, current, current_tokens = [], [], 0
+    for unit in _sentence_units(text, max_tokens):
+        unit_tokens = estimate_tokens(unit)
+        if current and current_tokens + unit_tokens > max_tokens:
+            segments.append(' '.join(current))
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += unit_tokens
+        if current_tokens >= min_tokens and _is_boundary(unit, every):
+            segments.append(' '.join(current))
+            current, current_tokens = [], 0
+    if current:
+        segments.append(' '.join(current))
+    return segments
@@ -0,0 +1,105 @@
+import os
+import threading
+
+import httpx
+import openai
+from django.conf import settings
+from django.utils.module_loading import import_string
+from google.cloud import speech
+from google.oauth2 import service_account
+
+_lock = threading.Lock()
+_clients = {}
+
+
+def _reset_after_fork():
+    """
+    Drop clients inherited from the parent; their sockets and gRPC channels
+    must not be shared across processes
+    """
+    global _lock
+    _lock = threading.Lock()
+    _clients.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _get_or_create(name, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = factory()
+                _clients[name] = client
+    return client
+
+
+def build_openai_client(**kwargs):
+    """
+    Create an OpenAI client with a bounded keep-alive connection pool
+    """
+    http_client = openai.DefaultHttpxClient(
+        limits=httpx.Limits(
+            max_connections=settings.OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY,
+        ),
+        timeout=settings.OPENAI_TIMEOUT,
+    )
+    kwargs.setdefault('api_key', settings.OPENAI_API_KEY)
+    # Retries are handled by the provider governor
+    kwargs.setdefault('max_retries', 0)
+    return openai.OpenAI(http_client=http_client, **kwargs)
+
+
+def build_speech_client():
+    """
+    Create a Speech client on a single keep-alive gRPC channel
+    """
+    credentials = service_account.Credentials.from_service_account_file(
+        settings.GOOGLE_CLOUD_SPEECH_CREDENTIALS_PATH
+    ) if settings.GOOGLE_CLOUD_SPEECH_CREDENTIALS_PATH else None
+
+    transport_class = speech.SpeechClient.get_transport_class('grpc')
+    channel = transport_class.create_channel(
+        credentials=credentials,
+        options=[
+            ('grpc.keepalive_time_ms', settings.SPEECH_GRPC_KEEPALIVE_MS),
+            ('grpc.keepalive_timeout_ms', 20000),
+            ('grpc.keepalive_permit_without_calls', 1),
+            ('grpc.max_send_message_length', -1),
+            ('grpc.max_receive_message_length', -1),
+        ],
+    )
+    return speech.SpeechClient(transport=transport_class(channel=channel))
+
+
+def get_openai_client():
+    """
+    Shared LLM client for this process, built by ``settings.AI_LLM_BACKEND``
+    """
+    return _get_or_create('openai', import_string(settings.AI_LLM_BACKEND))
+
+
+def get_speech_client():
+    """
+    Shared speech-to-text client for this process, built by ``settings.AI_SPEECH_BACKEND``
+    """
+    return _get_or_create('speech', import_string(settings.AI_SPEECH_BACKEND))
+
+
+def close_clients():
+    """
+    Close and forget all shared clients
+    """
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        if isinstance(client, speech.SpeechClient):
+            client.transport.close()
+        else:
+            client.close()
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models.functions import Length
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = ('completed', 'failed')
+
+# Notes whose last published state is remembered for deduplication
+MAX_TRACKED_NOTES = 10000
+
+# Pipeline stage reported for each in-progress status
+PROCESSING_STAGES = {
+    'transcribing': 'transcription',
+    'processing': 'generation',
+}
+
+
+def note_event(note, **extra):
+    """
+    Event payload describing a note's processing state.
+
+    Progress is read from the note row itself, so events republished by the
+    database watcher carry the same stage, transcript length and error as
+    those published by the worker that saved it.
+    """
+    deferred = note.get_deferred_fields()
+    event = {
+        'note_id': note.id,
+        'processing_status': note.processing_status,
+        'updated_at': note.updated_at.isoformat() if note.updated_at else None,
+    }
+    if note.processing_status in PROCESSING_STAGES:
+        event['stage'] = PROCESSING_STAGES[note.processing_status]
+    if note.processing_status == 'transcribing':
+        if 'transcript_chars' in note.__dict__:
+            event['transcript_chars'] = note.transcript_chars
+        elif 'raw_content' not in deferred:
+            event['transcript_chars'] = len(note.raw_content or '')
+    if note.processing_status == 'processing' and 'detailed_notes' not in deferred:
+        # Detailed notes streamed in so far
+        event['detailed_notes'] = note.detailed_notes
+    if note.processing_status == 'failed' and 'processing_error' not in deferred and note.processing_error:
+        event['error'] = note.processing_error
+    event.update(extra)
+    return event
+
+
+def with_event_fields(notes):
+    """
+    Load only what ``note_event`` reads, counting the transcript in the database
+    """
+    return notes.only(
+        'id', 'user_id', 'processing_status', 'detailed_notes', 'processing_error', 'updated_at'
+    ).annotate(transcript_chars=Length('raw_content'))
+
+
+class EventBroker:
+    """
+    In-process pub/sub of note events, fanned out to per-connection queues by user.
+
+    Publishing is thread-safe and non-blocking, so pipeline threads can call
+    it directly; subscribers consume from asyncio queues on their own loop.
+    A subscriber that falls behind loses events rather than slowing others.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._last_seen = {}
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+        subscription = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, user_id, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(user_id)
+            if subscriptions is None:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[user_id]
+
+    def subscribed_users(self):
+        with self._lock:
+            return list(self._subscribers)
+
+    def publish(self, user_id, event):
+        """
+        Deliver an event to the user's subscribers.
+
+        The same save may be published in-process and again by the database
+        watcher; events are deduplicated on status and ``updated_at``.
+        """
+        key = (event['processing_status'], event['updated_at'])
+        with self._lock:
+            if self._last_seen.get(event['note_id']) == key:
+                return
+            self._last_seen[event['note_id']] = key
+            if len(self._last_seen) > MAX_TRACKED_NOTES:
+                self._last_seen.clear()
+            subscriptions = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscriptions:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                # The subscriber's loop has closed
+                self.unsubscribe(user_id, (loop, queue))
+
+    @staticmethod
+    def _offer(queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning("Dropping note event for a slow subscriber")
+
+
+broker = EventBroker()
+
+
+def publish_note_status(note, **extra):
+    """
+    Publish a note's current processing state to its owner's event streams
+    """
+    broker.publish(note.user_id, note_event(note, **extra))
+
+
+def publish_notes(note_ids):
+    """
+    Publish the current state of notes changed with a queryset update
+    """
+    from notes.models import Note
+
+    for note in with_event_fields(Note.objects.filter(id__in=note_ids)):
+        publish_note_status(note)
+
+
+class DatabaseWatcher:
+    """
+    Picks up note changes made by other processes, such as AI workers.
+
+    One watcher per serving process polls for notes of subscribed users
+    updated since its last pass and republishes them through the broker,
+    so the database sees one query per interval however many streams are open.
+    """
+
+    def __init__(self):
+        self._task = None
+        self._since = None
+
+    def ensure_running(self):
+        if self._task is None or self._task.done():
+            self._since = timezone.now()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while broker.subscribed_users():
+            await asyncio.sleep(settings.EVENTS_POLL_INTERVAL)
+            try:
+                await sync_to_async(self._poll)()
+            except Exception:
+                logger.exception("Note event watcher failed")
+
+    def _poll(self):
+        from notes.models import Note
+
+        users = broker.subscribed_users()
+        if not users:
+            return
+        since, self._since = self._since, timezone.now()
+        for note in with_event_fields(Note.objects.filter(user_id__in=users, updated_at__gte=since)):
+            publish_note_status(note)
+
+
+watcher = DatabaseWatcher()
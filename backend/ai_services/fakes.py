@@ -0,0 +1,230 @@
+import json
+import math
+import random
+import threading
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+
+import httpx
+import openai
+from django.conf import settings
+from google.api_core import exceptions as google_exceptions
+from google.cloud import speech
+
+from .chunking import estimate_tokens
+
+# Offline stand-ins for the OpenAI and Speech-to-Text clients. They implement
+# the part of each SDK client that ai_services.services calls, so they can be
+# selected with AI_LLM_BACKEND / AI_SPEECH_BACKEND without code changes.
+
+_WORDS = (
+    'cell membrane protein energy transport gradient enzyme pathway signal '
+    'receptor molecule structure function process cycle reaction binding '
+    'synthesis division nucleus lecture example result'
+).split()
+
+# Bytes per second of compressed audio, roughly 24 kbit/s Opus
+_COMPRESSED_BYTES_PER_SECOND = 3000
+
+
+class LatencyModel:
+    """
+    Log-normal latency around ``median`` seconds, plus ``per_unit`` seconds
+    per unit of output
+    """
+
+    def __init__(self, median, sigma=0.0, per_unit=0.0):
+        self.median = median
+        self.sigma = sigma
+        self.per_unit = per_unit
+
+    def sample(self, rng, units=0):
+        base = self.median * math.exp(rng.gauss(0, self.sigma)) if self.sigma else self.median
+        return base + units * self.per_unit
+
+
+class _FakeProvider:
+    """
+    Seeded randomness, simulated latency and injected failures shared by the fakes
+    """
+
+    def __init__(self, latency, error_rate, seed):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+        self.latencies = []
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self, units):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency.sample(self._rng, units)
+            self.latencies.append(delay)
+            return delay, self._rng.random() < self.error_rate
+
+    def _sentence(self, word_count=12):
+        with self._lock:
+            words = [self._rng.choice(_WORDS) for _ in range(word_count)]
+        return ' '.join(words).capitalize() + '.'
+
+    def _sentences(self, word_count):
+        return ' '.join(self._sentence(min(12, word_count - i)) for i in range(0, word_count, 12))
+
+    def _sentences_for_tokens(self, max_tokens):
+        """
+        Sentences totalling at most ``max_tokens`` tokens (at least one sentence)
+        """
+        sentences, total = [], 0
+        while True:
+            sentence = self._sentence()
+            tokens = estimate_tokens(sentence) + 1
+            if sentences and total + tokens > max_tokens:
+                return sentences
+            sentences.append(sentence)
+            total += tokens
+
+    def close(self):
+        pass
+
+
+class FakeLLMClient(_FakeProvider):
+    """
+    Answers chat completions with text of ``output_tokens`` tokens (capped by max_tokens)
+    """
+
+    def __init__(self, latency=None, error_rate=0.0, output_tokens=400, seed=0):
+        super().__init__(latency or LatencyModel(0.5, 0.3, 0.002), error_rate, seed)
+        self.output_tokens = output_tokens
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _error(self):
+        request = httpx.Request('POST', 'https://fake.local/v1/chat/completions')
+        return openai.InternalServerError(
+            'Simulated provider error', response=httpx.Response(503, request=request), body=None
+        )
+
+    def _create(self, model, messages, max_tokens, temperature=None, response_format=None,
+                stream=False, **kwargs):
+        completion_tokens = min(self.output_tokens, max_tokens)
+        delay, failed = self._draw(completion_tokens)
+        per_token = self.latency.per_unit
+        # A stream delivers its first token after the fixed part of the latency
+        time.sleep(delay - completion_tokens * per_token if stream else delay)
+        if failed:
+            raise self._error()
+
+        # Leave room for the markdown heading and JSON punctuation
+        budget = completion_tokens * 4 // 5
+        if response_format:
+            content = json.dumps({
+                'key_points': self._sentences_for_tokens(budget // 5),
+                'detailed_notes': '# Notes\n\n' + ' '.join(self._sentences_for_tokens(budget * 4 // 5)),
+            })
+        elif 'JSON array' in messages[0]['content']:
+            content = json.dumps(self._sentences_for_tokens(budget))
+        else:
+            content = '# Notes\n\n' + ' '.join(self._sentences_for_tokens(budget))
+
+        prompt_tokens = sum(estimate_tokens(message['content']) for message in messages)
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=estimate_tokens(content))
+        if stream:
+            return self._stream(content, per_token, usage)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=usage,
+        )
+
+    def _stream(self, content, per_token, usage):
+        """
+        Chunks shaped like the OpenAI stream: a few words each, then a usage chunk
+        """
+        words = content.split(' ')
+        for start in range(0, len(words), 4):
+            piece = ' '.join(words[start:start + 4]) + (' ' if start + 4 < len(words) else '')
+            time.sleep(estimate_tokens(piece) * per_token)
+            yield SimpleNamespace(
+                choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))], usage=None
+            )
+        yield SimpleNamespace(choices=[], usage=usage)
+
+
+class FakeSpeechClient(_FakeProvider):
+    """
+    Transcribes any audio as ``words_per_second`` words per second of audio,
+    in one result per ``result_seconds`` (carrying its start as the first
+    word's time offset); the duration is estimated from the
+    byte count (exact for LINEAR16, about 24 kbit/s for compressed formats)
+    """
+
+    def __init__(self, latency=None, error_rate=0.0, words_per_second=2.5, result_seconds=15, seed=0):
+        super().__init__(latency or LatencyModel(0.3, 0.3, 0.01), error_rate, seed)
+        self.words_per_second = words_per_second
+        self.result_seconds = result_seconds
+
+    @staticmethod
+    def _bytes_per_second(config):
+        if config.encoding == speech.RecognitionConfig.AudioEncoding.LINEAR16:
+            return 2 * (config.sample_rate_hertz or 16000) * (config.audio_channel_count or 1)
+        return _COMPRESSED_BYTES_PER_SECOND
+
+    def _results(self, audio_bytes, config):
+        seconds = max(audio_bytes / self._bytes_per_second(config), 1)
+        delay, failed = self._draw(seconds)
+        time.sleep(delay)
+        if failed:
+            raise google_exceptions.ServiceUnavailable('Simulated provider error')
+        results = []
+        for start in range(0, math.ceil(seconds), self.result_seconds):
+            words = max(int(min(self.result_seconds, seconds - start) * self.words_per_second), 1)
+            results.append(SimpleNamespace(
+                alternatives=[SimpleNamespace(
+                    transcript=self._sentences(words),
+                    words=[SimpleNamespace(start_time=timedelta(seconds=start))],
+                )],
+                is_final=True,
+            ))
+        return results
+
+    def recognize(self, config, audio):
+        return SimpleNamespace(results=self._results(len(audio.content), config))
+
+    def streaming_recognize(self, config, requests):
+        audio_bytes = sum(len(request.audio_content) for request in requests)
+        for result in self._results(audio_bytes, config.config):
+            yield SimpleNamespace(results=[result])
+
+    def long_running_recognize(self, config, audio):
+        response = SimpleNamespace(results=self._results(len(audio.content), config))
+        return SimpleNamespace(result=lambda timeout=None: response)
+
+
+def build_fake_llm_client():
+    """
+    FakeLLMClient configured from the FAKE_PROVIDER_* / FAKE_LLM_* settings
+    """
+    return FakeLLMClient(
+        latency=LatencyModel(
+            settings.FAKE_LLM_LATENCY_SECONDS, settings.FAKE_PROVIDER_LATENCY_SIGMA,
+            settings.FAKE_LLM_SECONDS_PER_TOKEN
+        ),
+        error_rate=settings.FAKE_PROVIDER_ERROR_RATE,
+        output_tokens=settings.FAKE_LLM_OUTPUT_TOKENS,
+        seed=settings.FAKE_PROVIDER_SEED,
+    )
+
+
+def build_fake_speech_client():
+    """
+    FakeSpeechClient configured from the FAKE_PROVIDER_* / FAKE_SPEECH_* settings
+    """
+    return FakeSpeechClient(
+        latency=LatencyModel(
+            settings.FAKE_SPEECH_LATENCY_SECONDS, settings.FAKE_PROVIDER_LATENCY_SIGMA,
+            settings.FAKE_SPEECH_SECONDS_PER_AUDIO_SECOND
+        ),
+        error_rate=settings.FAKE_PROVIDER_ERROR_RATE,
+        words_per_second=settings.FAKE_SPEECH_WORDS_PER_SECOND,
+        seed=settings.FAKE_PROVIDER_SEED,
+    )
@@ -0,0 +1,347 @@
+import logging
+import os
+import random
+import threading
+import time
+
+import openai
+from django.conf import settings
+from google.api_core import exceptions as google_exceptions
+
+from .metrics import PROVIDER_CALL_DURATION, PROVIDER_CALLS, PROVIDER_THROTTLED
+
+logger = logging.getLogger(__name__)
+
+# Provider errors worth retrying; everything else fails immediately
+RATE_LIMIT_ERRORS = (
+    openai.RateLimitError,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+)
+TRANSIENT_ERRORS = (
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.BadGateway,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.DeadlineExceeded,
+)
+
+
+class ProviderUnavailable(Exception):
+    """
+    Raised without calling the provider while its circuit breaker is open
+    """
+
+    def __init__(self, provider, retry_after):
+        super().__init__(f"{provider} is unavailable, retry in {retry_after:.0f}s")
+        self.provider = provider
+        self.retry_after = retry_after
+
+    def __reduce__(self):
+        # Keep it picklable so it survives transcription worker processes
+        return (self.__class__, (self.provider, self.retry_after))
+
+
+def classify_error(error):
+    """
+    Return ``'rate_limit'``, ``'transient'`` or None for a non-retryable error
+    """
+    if isinstance(error, RATE_LIMIT_ERRORS):
+        return 'rate_limit'
+    if isinstance(error, TRANSIENT_ERRORS):
+        return 'transient'
+    if isinstance(error, openai.APIStatusError) and error.status_code >= 500:
+        return 'transient'
+    return None
+
+
+def _retry_after(error):
+    """
+    Seconds the provider asked us to wait, if it said so
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Requests-per-second limit that allows bursts of up to ``capacity``
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self):
+        """
+        Block until a token is available, returning the time spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit adjusted by AIMD: it grows by one slot per window of
+    successful calls and halves when the provider rate-limits us
+    """
+
+    def __init__(self, initial, maximum, minimum=1):
+        self.limit = float(initial)
+        self.maximum = maximum
+        self.minimum = minimum
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def on_success(self):
+        with self._condition:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+    def on_rate_limited(self, cooldown):
+        with self._condition:
+            # One burst of 429s should only halve the limit once
+            now = time.monotonic()
+            if now - self._last_decrease >= cooldown:
+                self.limit = max(self.minimum, self.limit / 2)
+                self._last_decrease = now
+
+
+class CircuitBreaker:
+    """
+    Opens after ``threshold`` consecutive failures, fails fast for
+    ``reset_seconds``, then lets a single probe call through
+    """
+
+    def __init__(self, threshold, reset_seconds):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def remaining(self):
+        return max(self.reset_seconds - (time.monotonic() - self.opened_at), 0.0)
+
+    def before_call(self):
+        """
+        Return seconds until the circuit may close, or None if the call may proceed
+        """
+        with self._lock:
+            if self.state == 'closed':
+                return None
+            if self.state == 'open':
+                if self.remaining() > 0:
+                    return self.remaining()
+                self.state = 'half_open'
+            if self._probing:
+                return self.reset_seconds
+            self._probing = True
+            return None
+
+    def on_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._probing = False
+
+    def on_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == 'half_open' or self.failures >= self.threshold:
+                if self.state != 'open':
+                    logger.warning("Circuit opened after %s consecutive failures", self.failures)
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+
+class ProviderGovernor:
+    """
+    Paces, limits, retries and circuit-breaks calls to one provider.
+
+    State is per process; each worker process governs its own share of traffic.
+    """
+
+    def __init__(self, name, rate, burst, max_concurrency):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.limiter = AdaptiveLimiter(max(max_concurrency // 2, 1), max_concurrency)
+        self.breaker = CircuitBreaker(
+            settings.PROVIDER_BREAKER_THRESHOLD, settings.PROVIDER_BREAKER_RESET_SECONDS
+        )
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'succeeded': 0, 'retries': 0, 'rate_limited': 0,
+                      'failed': 0, 'rejected': 0, 'throttled_seconds': 0.0}
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+        if key == 'throttled_seconds':
+            if amount:
+                PROVIDER_THROTTLED.inc(amount, provider=self.name)
+        elif key != 'calls':
+            PROVIDER_CALLS.inc(amount, provider=self.name, outcome=key)
+
+    def _backoff(self, attempt, error):
+        base = settings.PROVIDER_RETRY_BASE_SECONDS * (2 ** attempt)
+        delay = random.uniform(0, min(settings.PROVIDER_RETRY_MAX_SECONDS, base))
+        requested = _retry_after(error)
+        return max(delay, requested) if requested is not None else delay
+
+    def call(self, func, *args, **kwargs):
+        """
+        Call ``func`` under this provider's limits, retrying transient errors
+        with jittered exponential backoff
+        """
+        attempt = 0
+        while True:
+            retry_after = self.breaker.before_call()
+            if retry_after is not None:
+                self._count('rejected')
+                raise ProviderUnavailable(self.name, retry_after)
+
+            self._count('throttled_seconds', self.bucket.acquire())
+            self.limiter.acquire()
+            self._count('calls')
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                kind = classify_error(e)
+                if kind is None:
+                    # The provider answered; the request itself was bad
+                    self.breaker.on_success()
+                    self._count('failed')
+                    raise
+                self.breaker.on_failure()
+                if kind == 'rate_limit':
+                    self._count('rate_limited')
+                    self.limiter.on_rate_limited(settings.PROVIDER_RETRY_BASE_SECONDS)
+                if attempt >= settings.PROVIDER_RETRY_ATTEMPTS:
+                    self._count('failed')
+                    raise
+                delay = self._backoff(attempt, e)
+                logger.warning("%s call failed (%s), retry %s in %.2fs: %s",
+                               self.name, kind, attempt + 1, delay, e)
+                self._count('retries')
+                attempt += 1
+            else:
+                self.breaker.on_success()
+                self.limiter.on_success()
+                self._count('succeeded')
+                return result
+            finally:
+                self.limiter.release()
+                PROVIDER_CALL_DURATION.observe(time.perf_counter() - started, provider=self.name)
+            time.sleep(delay)
+
+    def snapshot(self):
+        """
+        Current limits and counters for monitoring
+        """
+        with self._lock:
+            stats = dict(self.stats)
+        return {
+            'provider': self.name,
+            'circuit': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            'concurrency_limit': round(self.limiter.limit, 2),
+            'in_flight': self.limiter.in_flight,
+            'tokens_available': round(self.bucket.tokens, 2),
+            **stats,
+        }
+
+
+_lock = threading.Lock()
+_governors = {}
+
+
+def _reset_after_fork():
+    global _lock
+    _lock = threading.Lock()
+    _governors.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _build_governor(name):
+    if name == 'openai':
+        return ProviderGovernor(
+            name, settings.OPENAI_RATE_LIMIT_RPS, settings.OPENAI_RATE_LIMIT_BURST,
+            settings.OPENAI_MAX_CONCURRENCY
+        )
+    if name == 'speech':
+        return ProviderGovernor(
+            name, settings.SPEECH_RATE_LIMIT_RPS, settings.SPEECH_RATE_LIMIT_BURST,
+            settings.SPEECH_MAX_CONCURRENCY
+        )
+    raise ValueError(f"Unknown provider: {name}")
+
+
+def get_governor(name):
+    """
+    Shared governor for ``openai`` or ``speech`` in this process
+    """
+    governor = _governors.get(name)
+    if governor is None:
+        with _lock:
+            governor = _governors.get(name)
+            if governor is None:
+                governor = _build_governor(name)
+                _governors[name] = governor
+    return governor
+
+
+def reset_governors():
+    """
+    Forget all governors so the next calls start from fresh limits
+    """
+    with _lock:
+        _governors.clear()
+
+
+def governor_snapshots():
+    """
+    Snapshots of every governor created in this process
+    """
+    return [governor.snapshot() for governor in list(_governors.values())]
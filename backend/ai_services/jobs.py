@@ -0,0 +1,359 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .events import publish_note_status, publish_notes
+from .governor import ProviderUnavailable
+from .metrics import JOBS, QUEUE_WAIT, stage_timer
+from .models import AIJob
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_job(note, job_type, payload=None, priority='interactive'):
+    """
+    Queue a pipeline run for a note and mark the note as queued
+    """
+    job = AIJob.objects.create(
+        note=note,
+        job_type=job_type,
+        priority=priority,
+        payload=payload or {},
+        max_attempts=settings.AI_JOB_MAX_ATTEMPTS,
+    )
+    note.processing_status = 'queued'
+    note.processing_error = ''
+    note.save(update_fields=['processing_status', 'processing_error', 'updated_at'])
+    publish_note_status(note)
+    return job
+
+
+def enqueue_note_processing(note, priority='interactive'):
+    """
+    Queue AI processing of a note's raw content
+    """
+    return enqueue_job(note, 'process_note', priority=priority)
+
+
+def enqueue_audio_processing(note, audio_file_path):
+    """
+    Queue transcription and AI processing of an uploaded recording
+    """
+    return enqueue_job(note, 'process_audio', {'audio_file_path': audio_file_path})
+
+
+def enqueue_note_indexing(note):
+    """
+    Queue a refresh of a note's semantic search vectors after a hand edit.
+
+    The note's processing status is left alone, and a job still waiting for
+    the note is reused since it reads the note's text when it runs.
+    """
+    pending = AIJob.objects.filter(note=note, job_type='index_note', status='queued').first()
+    if pending is not None:
+        return pending
+    return AIJob.objects.create(
+        note=note,
+        job_type='index_note',
+        max_attempts=settings.AI_JOB_MAX_ATTEMPTS,
+    )
+
+
+def _priority_weights():
+    return {
+        'interactive': settings.AI_PRIORITY_WEIGHT_INTERACTIVE,
+        'reprocess': settings.AI_PRIORITY_WEIGHT_REPROCESS,
+        'batch': settings.AI_PRIORITY_WEIGHT_BATCH,
+    }
+
+
+def _users_at_capacity(now):
+    """
+    Ids of users who already have their maximum of jobs in progress.
+
+    Read without locks, so it only narrows the candidates; ``_has_capacity``
+    makes the binding check once a job is picked.
+    """
+    return AIJob.objects.filter(status='running', locked_until__gte=now).order_by().values(
+        'note__user_id'
+    ).annotate(in_progress=Count('id')).filter(
+        in_progress__gte=settings.AI_USER_MAX_CONCURRENCY
+    ).values('note__user_id')
+
+
+def _claimable_jobs(now):
+    """
+    Jobs that are due, plus running jobs whose lease has expired, leaving out
+    jobs of reprocess batches and users already at their concurrency limit
+    """
+    from .batches import saturated_batches
+
+    return AIJob.objects.filter(
+        Q(status='queued', run_after__lte=now) |
+        Q(status='running', locked_until__lt=now)
+    ).filter(attempts__lt=F('max_attempts')).exclude(
+        batch__in=saturated_batches(now)
+    ).exclude(note__user_id__in=_users_at_capacity(now))
+
+
+def _has_capacity(user_id, now):
+    """
+    Whether a user may start another job, checked while holding a lock on
+    their user row so concurrent claims for one user are counted one at a time.
+
+    Databases without row locks (SQLite) skip the lock; there the cap can be
+    exceeded by claims racing each other and is a soft limit.
+    """
+    list(get_user_model().objects.select_for_update().filter(id=user_id).values_list('id', flat=True))
+    running = AIJob.objects.filter(status='running', locked_until__gte=now, note__user_id=user_id).count()
+    return running < settings.AI_USER_MAX_CONCURRENCY
+
+
+def _class_order(now, priorities):
+    """
+    Priority classes with waiting jobs, the one furthest below its weighted share first.
+
+    Shares are measured over the claims of the last
+    ``AI_PRIORITY_WINDOW_SECONDS``, so a class with a weight of 1 still gets
+    one claim in every (sum of weights) while others are busy and never starves.
+    """
+    since = now - timedelta(seconds=settings.AI_PRIORITY_WINDOW_SECONDS)
+    served = dict(
+        AIJob.objects.filter(started_at__gte=since).order_by()
+        .values_list('priority').annotate(count=Count('id'))
+    )
+    weights = _priority_weights()
+    return sorted(
+        priorities,
+        key=lambda priority: ((served.get(priority, 0) + 1) / max(weights[priority], 1), -weights[priority])
+    )
+
+
+def claim_job(worker_id, lease_seconds=None):
+    """
+    Claim the next due job for a worker, or return None if the queue is empty.
+
+    The priority class is chosen by weighted-fair share (interactive work
+    ahead of user reprocessing ahead of bulk batches, without starving any),
+    then jobs within a class are taken oldest first. Job rows (not the joined
+    note rows) are locked with SKIP LOCKED where the database supports it; the
+    conditional update below keeps the claim atomic on SQLite as well. The
+    per-user concurrency cap is enforced under a lock on the owner's row.
+    """
+    lease_seconds = lease_seconds or settings.AI_JOB_LEASE_SECONDS
+
+    for _ in range(5):
+        now = timezone.now()
+        with transaction.atomic():
+            claimable = _claimable_jobs(now)
+            waiting = set(claimable.order_by().values_list('priority', flat=True).distinct())
+            job = None
+            for priority in _class_order(now, waiting):
+                job = (
+                    claimable.filter(priority=priority)
+                    .annotate(owner_id=F('note__user_id'))
+                    .select_for_update(skip_locked=True, of=('self',))
+                    .order_by('run_after', 'id')
+                    .first()
+                )
+                if job is not None:
+                    break
+            if job is None:
+                return None
+            if not _has_capacity(job.owner_id, now):
+                # Another claim filled the user's last slot; look again without them
+                continue
+
+            claimed = AIJob.objects.filter(
+                id=job.id,
+                status=job.status,
+                attempts=job.attempts,
+            ).update(
+                status='running',
+                locked_by=worker_id,
+                locked_until=now + timedelta(seconds=lease_seconds),
+                attempts=F('attempts') + 1,
+                started_at=now,
+                updated_at=now,
+            )
+        if claimed:
+            # An expired lease made the job claimable again when it ran out
+            available_at = job.locked_until if job.status == 'running' else job.run_after
+            QUEUE_WAIT.observe(max((now - available_at).total_seconds(), 0), priority=job.priority)
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def extend_lease(job, lease_seconds=None):
+    """
+    Push back the lease of a running job so it is not handed to another worker
+    """
+    lease_seconds = lease_seconds or settings.AI_JOB_LEASE_SECONDS
+    return AIJob.objects.filter(
+        id=job.id, status='running', locked_by=job.locked_by
+    ).update(locked_until=timezone.now() + timedelta(seconds=lease_seconds))
+
+
+def _held(job):
+    """
+    The job's row while this worker still holds its lease
+    """
+    return AIJob.objects.filter(id=job.id, status='running', locked_by=job.locked_by)
+
+
+def complete_job(job):
+    """
+    Mark a job as finished successfully, unless its lease was lost to another worker
+    """
+    finished = _held(job).update(
+        status='succeeded',
+        locked_by='',
+        locked_until=None,
+        last_error='',
+        finished_at=timezone.now(),
+        updated_at=timezone.now(),
+    )
+    if not finished:
+        logger.warning("AI job %s finished after %s lost its lease", job.id, job.locked_by)
+        return False
+    JOBS.inc(job_type=job.job_type, outcome='succeeded')
+    return True
+
+
+def defer_job(job, delay, reason):
+    """
+    Put a claimed job back in the queue without spending one of its attempts
+    """
+    from notes.models import Note
+
+    now = timezone.now()
+    deferred = _held(job).update(
+        status='queued',
+        locked_by='',
+        locked_until=None,
+        attempts=F('attempts') - 1,
+        run_after=now + timedelta(seconds=delay),
+        last_error=str(reason),
+        updated_at=now,
+    )
+    if not deferred:
+        logger.warning("AI job %s deferred after %s lost its lease", job.id, job.locked_by)
+        return False
+    if job.job_type in AIJob.PIPELINE_JOB_TYPES:
+        Note.objects.filter(id=job.note_id).update(processing_status='queued', updated_at=now)
+        publish_notes([job.note_id])
+    JOBS.inc(job_type=job.job_type, outcome='deferred')
+    logger.info("AI job %s deferred for %ss: %s", job.id, delay, reason)
+    return True
+
+
+def fail_job(job, error):
+    """
+    Record a failed attempt, re-queueing the job with backoff while attempts remain.
+
+    A job rejected by an open circuit breaker never reached the provider, so
+    it is deferred until the breaker may close instead of failing. Nothing is
+    recorded if the worker's lease was lost to another worker.
+    """
+    from notes.models import Note
+
+    if isinstance(error, ProviderUnavailable):
+        return defer_job(job, max(int(error.retry_after), 1), error)
+
+    now = timezone.now()
+    retry = job.attempts < job.max_attempts
+    if retry:
+        delay = settings.AI_JOB_RETRY_BACKOFF_SECONDS * (2 ** max(job.attempts - 1, 0))
+        outcome = dict(status='queued', run_after=now + timedelta(seconds=delay))
+    else:
+        outcome = dict(status='failed', finished_at=now)
+    recorded = _held(job).update(
+        locked_by='',
+        locked_until=None,
+        last_error=str(error),
+        updated_at=now,
+        **outcome
+    )
+    if not recorded:
+        logger.warning("AI job %s failed after %s lost its lease: %s", job.id, job.locked_by, error)
+        return False
+
+    pipeline = job.job_type in AIJob.PIPELINE_JOB_TYPES
+    if retry:
+        if pipeline:
+            Note.objects.filter(id=job.note_id).update(processing_status='queued', updated_at=now)
+            publish_notes([job.note_id])
+        JOBS.inc(job_type=job.job_type, outcome='retried')
+        logger.warning("AI job %s failed (attempt %s/%s), retrying in %ss: %s",
+                       job.id, job.attempts, job.max_attempts, delay, error)
+    else:
+        if pipeline:
+            Note.objects.filter(id=job.note_id).update(
+                processing_status='failed', processing_error=str(error), updated_at=now
+            )
+            publish_notes([job.note_id])
+        JOBS.inc(job_type=job.job_type, outcome='failed')
+        logger.error("AI job %s failed permanently: %s", job.id, error)
+    return True
+
+
+def fail_expired_jobs():
+    """
+    Fail running jobs whose lease expired after their last allowed attempt
+    """
+    from notes.models import Note
+
+    now = timezone.now()
+    expired = AIJob.objects.filter(
+        status='running',
+        locked_until__lt=now,
+        attempts__gte=F('max_attempts'),
+    )
+    note_ids = list(expired.filter(job_type__in=AIJob.PIPELINE_JOB_TYPES).values_list('note_id', flat=True))
+    count = expired.update(
+        status='failed',
+        locked_by='',
+        locked_until=None,
+        last_error='Lease expired before the job finished',
+        finished_at=now,
+        updated_at=now,
+    )
+    if note_ids:
+        Note.objects.filter(id__in=note_ids).update(
+            processing_status='failed', processing_error='Lease expired before the job finished', updated_at=now
+        )
+        publish_notes(note_ids)
+    return count
+
+
+def run_job(job):
+    """
+    Execute the pipeline for a claimed job
+    """
+    from notes import semantic
+    from notes.models import Note
+    from .services import process_note_with_ai, process_audio_to_note
+
+    if job.job_type == 'process_note':
+        with stage_timer('process_note'):
+            return process_note_with_ai(job.note_id)
+    if job.job_type == 'process_audio':
+        with stage_timer('process_audio'):
+            return process_audio_to_note(job.payload['audio_file_path'], job.note_id)
+    if job.job_type == 'index_note':
+        with stage_timer('embedding'):
+            return semantic.index_note(Note.objects.get(id=job.note_id))
+    raise ValueError(f"Unknown job type: {job.job_type}")
+
+
+def latest_job_for_note(note):
+    """
+    Most recently created pipeline job for a note, if any
+    """
+    return AIJob.objects.filter(note=note, job_type__in=AIJob.PIPELINE_JOB_TYPES).order_by('-created_at', '-id').first()
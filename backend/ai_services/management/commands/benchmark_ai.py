@@ -0,0 +1,324 @@
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import numpy as np
+import openai
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from ai_services import services
+from ai_services.audio import PCM_SAMPLE_RATE, pcm_to_wav_bytes
+from ai_services.clients import build_openai_client, close_clients, get_openai_client, get_speech_client
+from ai_services.fakes import FakeLLMClient, LatencyModel
+from ai_services.governor import governor_snapshots, reset_governors
+from ai_services.services import GENERATION_MODES, generate_ai_content
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a non-empty list
+    """
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    """
+    Minimal keep-alive HTTP endpoint that answers every chat completion request
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    body = json.dumps({
+        'id': 'chatcmpl-benchmark',
+        'object': 'chat.completion',
+        'created': 0,
+        'model': 'benchmark',
+        'choices': [{
+            'index': 0,
+            'finish_reason': 'stop',
+            'message': {'role': 'assistant', 'content': '[]'}
+        }],
+    }).encode('utf-8')
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark AI pipeline stages against offline provider stand-ins'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stage',
+            choices=['generation', 'clients', 'pipeline'],
+            default='generation',
+            help='Pipeline stage to benchmark'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=3,
+            help='Runs per configuration'
+        )
+        parser.add_argument(
+            '--base-latency',
+            type=float,
+            default=0.2,
+            help='Fixed latency of each simulated provider call, in seconds'
+        )
+        parser.add_argument(
+            '--per-token-latency',
+            type=float,
+            default=0.002,
+            help='Simulated latency per requested completion token, in seconds'
+        )
+        parser.add_argument(
+            '--notes',
+            type=int,
+            default=20,
+            help='Notes driven through the pipeline stage'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=4,
+            help='Notes processed at the same time in the pipeline stage'
+        )
+        parser.add_argument(
+            '--audio-ratio',
+            type=float,
+            default=0.5,
+            help='Share of pipeline notes that start from an audio recording'
+        )
+        parser.add_argument(
+            '--audio-seconds',
+            type=int,
+            default=60,
+            help='Length of each simulated recording, in seconds'
+        )
+        parser.add_argument(
+            '--error-rate',
+            type=float,
+            default=None,
+            help='Injected provider error rate (default FAKE_PROVIDER_ERROR_RATE)'
+        )
+
+    def handle(self, *args, **options):
+        getattr(self, f"_benchmark_{options['stage']}")(options)
+
+    def _benchmark_generation(self, options):
+        # Unbounded output size, so latency grows with the requested max_tokens
+        client = FakeLLMClient(
+            LatencyModel(options['base_latency'], per_unit=options['per_token_latency']),
+            output_tokens=10 ** 6
+        )
+        content = 'Lecture transcript. ' * 200
+
+        self.stdout.write(f"{'mode':<12}{'mean (s)':>10}{'min (s)':>10}")
+        for mode in GENERATION_MODES:
+            durations = []
+            for _ in range(options['iterations']):
+                started = time.perf_counter()
+                generate_ai_content(content, client=client, mode=mode)
+                durations.append(time.perf_counter() - started)
+            self.stdout.write(
+                f"{mode:<12}{sum(durations) / len(durations):>10.3f}{min(durations):>10.3f}"
+            )
+
+    def _benchmark_clients(self, options):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), CompletionHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}/v1"
+        calls = max(options['iterations'], 50)
+
+        def complete(client):
+            client.chat.completions.create(
+                model='benchmark',
+                messages=[{'role': 'user', 'content': 'ping'}],
+                max_tokens=1,
+            )
+
+        def per_call_client():
+            client = openai.OpenAI(api_key='benchmark', base_url=base_url)
+            try:
+                complete(client)
+            finally:
+                client.close()
+
+        pooled = build_openai_client(api_key='benchmark', base_url=base_url)
+
+        try:
+            self.stdout.write(f"{'client':<12}{'per call (ms)':>15}")
+            for label, call in (
+                ('per-call', per_call_client),
+                ('pooled', lambda: complete(pooled)),
+            ):
+                call()
+                started = time.perf_counter()
+                for _ in range(calls):
+                    call()
+                elapsed = (time.perf_counter() - started) / calls
+                self.stdout.write(f"{label:<12}{elapsed * 1000:>15.2f}")
+        finally:
+            pooled.close()
+            server.shutdown()
+
+    def _benchmark_pipeline(self, options):
+        overrides = {
+            'AI_LLM_BACKEND': 'ai_services.fakes.build_fake_llm_client',
+            'AI_SPEECH_BACKEND': 'ai_services.fakes.build_fake_speech_client',
+            'AI_CACHE_ENABLED': False,
+            'SPEECH_PARALLEL_WORKERS': 1,
+        }
+        if options['error_rate'] is not None:
+            overrides['FAKE_PROVIDER_ERROR_RATE'] = options['error_rate']
+
+        with override_settings(**overrides), tempfile.TemporaryDirectory() as workdir:
+            old_name = self._create_test_database(workdir)
+            close_clients()
+            reset_governors()
+            try:
+                self._run_pipeline(options, workdir)
+            finally:
+                close_clients()
+                reset_governors()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _create_test_database(self, workdir):
+        """
+        Switch to a freshly migrated test database so the benchmark's rows
+        never reach the configured one; returns the name to switch back to
+        """
+        if connection.vendor == 'sqlite':
+            # A file, not the shared in-memory database, so worker threads can write concurrently
+            connection.settings_dict['TEST']['NAME'] = os.path.join(workdir, 'benchmark.sqlite3')
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        return old_name
+
+    def _run_pipeline(self, options, workdir):
+        from courses.models import Course
+        from notes.models import Note
+
+        timings = defaultdict(list)
+        timings_lock = threading.Lock()
+
+        def timed(stage, func):
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    with timings_lock:
+                        timings[stage].append(time.perf_counter() - started)
+            return wrapper
+
+        # Simulated recording: quiet noise, as 16 kHz LINEAR16 WAV
+        rng = np.random.default_rng(0)
+        samples = rng.normal(0, 500, options['audio_seconds'] * PCM_SAMPLE_RATE).astype(np.int16)
+        audio_path = os.path.join(workdir, 'recording.wav')
+        with open(audio_path, 'wb') as audio_file:
+            audio_file.write(pcm_to_wav_bytes(samples, PCM_SAMPLE_RATE))
+
+        user = get_user_model().objects.create(
+            username=f"benchmark-{uuid.uuid4().hex[:12]}",
+            email=f"benchmark-{uuid.uuid4().hex[:12]}@example.com",
+        )
+        course = Course.objects.create(title='Pipeline benchmark', user=user)
+        audio_notes = round(options['notes'] * options['audio_ratio'])
+        notes = [
+            Note.objects.create(
+                title=f"Benchmark note {index}",
+                course=course,
+                user=user,
+                raw_content='' if index < audio_notes else ' '.join(
+                    f"Note {index} sentence {sentence} covers part {sentence % 7} of the lecture."
+                    for sentence in range(300)
+                ),
+            )
+            for index in range(options['notes'])
+        ]
+
+        failures = []
+
+        def run(note, is_audio):
+            try:
+                if is_audio:
+                    timed('audio note', services.process_audio_to_note)(audio_path, note.id)
+                else:
+                    timed('text note', services.process_note_with_ai)(note.id)
+            except Exception as e:
+                failures.append(str(e))
+            finally:
+                connection.close()
+
+        def first_content(make_checkpoint):
+            # Time from the start of streaming to the first partial detailed notes
+            def wrapper(note):
+                checkpoint, started, seen = make_checkpoint(note), time.perf_counter(), []
+
+                def timed_checkpoint(text):
+                    if not seen:
+                        seen.append(True)
+                        with timings_lock:
+                            timings['first content'].append(time.perf_counter() - started)
+                    checkpoint(text)
+                return timed_checkpoint
+            return wrapper
+
+        with mock.patch.object(services, '_checkpoint_detailed_notes',
+                               first_content(services._checkpoint_detailed_notes)), \
+             mock.patch.object(services, 'transcribe_audio_google',
+                               timed('transcription', services.transcribe_audio_google)), \
+             mock.patch.object(services, 'process_note_with_ai',
+                               timed('generation', services.process_note_with_ai)):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                list(executor.map(
+                    lambda item: run(item[1], item[0] < audio_notes), enumerate(notes)
+                ))
+            elapsed = time.perf_counter() - started
+
+        timings['llm call'] = get_openai_client().latencies
+        timings['speech call'] = get_speech_client().latencies
+
+        self.stdout.write(
+            f"{options['notes']} notes ({audio_notes} audio) in {elapsed:.2f}s: "
+            f"{options['notes'] / elapsed:.2f} notes/s, {len(failures)} failed"
+        )
+        self.stdout.write(f"{'stage':<14}{'count':>7}{'p50 (ms)':>11}{'p95 (ms)':>11}{'p99 (ms)':>11}")
+        for stage in ('transcription', 'generation', 'first content', 'audio note', 'text note',
+                      'speech call', 'llm call'):
+            values = timings[stage]
+            if not values:
+                continue
+            self.stdout.write(
+                f"{stage:<14}{len(values):>7}" +
+                ''.join(f"{percentile(values, pct) * 1000:>11.1f}" for pct in (50, 95, 99))
+            )
+        for snapshot in governor_snapshots():
+            self.stdout.write(
+                f"{snapshot['provider']}: {snapshot['retries']} retries, "
+                f"{snapshot['failed']} failed calls, circuit {snapshot['circuit']}"
+            )
+        for error in sorted(set(failures)):
+            self.stderr.write(error)
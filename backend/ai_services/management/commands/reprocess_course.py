@@ -0,0 +1,84 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ai_services.batches import active_batch, batch_progress, resume_batch, start_batch
+from ai_services.models import ReprocessBatch
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = 'Queue AI reprocessing of every eligible note in one or more courses'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'course_ids',
+            nargs='*',
+            type=int,
+            help='Courses to reprocess'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=None,
+            help='Jobs per course that may run at once (default AI_REPROCESS_CONCURRENCY)'
+        )
+        parser.add_argument(
+            '--resume',
+            type=int,
+            metavar='BATCH_ID',
+            help='Resume an existing batch instead of starting new ones'
+        )
+        parser.add_argument(
+            '--wait',
+            action='store_true',
+            help='Report progress until every batch has finished'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Seconds between progress reports with --wait'
+        )
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            try:
+                batch = ReprocessBatch.objects.get(id=options['resume'])
+            except ReprocessBatch.DoesNotExist:
+                raise CommandError(f"Batch {options['resume']} does not exist")
+            batches = [resume_batch(batch)]
+        elif options['course_ids']:
+            batches = [self._start(course_id, options['concurrency']) for course_id in options['course_ids']]
+        else:
+            raise CommandError('Give at least one course id, or --resume BATCH_ID')
+
+        for batch in batches:
+            self._report(batch_progress(batch))
+
+        while options['wait']:
+            time.sleep(options['interval'])
+            reports = [batch_progress(batch) for batch in batches]
+            for report in reports:
+                self._report(report)
+            if all(report['status'] == 'completed' for report in reports):
+                break
+
+    def _start(self, course_id, concurrency):
+        try:
+            course = Course.objects.get(id=course_id)
+        except Course.DoesNotExist:
+            raise CommandError(f"Course {course_id} does not exist")
+        running = active_batch(course)
+        if running is not None and batch_progress(running)['status'] == 'running':
+            self.stdout.write(f"Course {course_id} already has running batch {running.id}; following it")
+            return running
+        return start_batch(course, course.user, concurrency)
+
+    def _report(self, report):
+        self.stdout.write(
+            f"Batch {report['batch_id']} (course {report['course_id']}): "
+            f"{report['done']}/{report['total']} done ({report['percent']}%), "
+            f"{report['running']} running, {report['queued']} queued, "
+            f"{report['failed']} failed - {report['status']}"
+        )
@@ -0,0 +1,112 @@
+import os
+import signal
+import socket
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from ai_services.jobs import (
+    claim_job,
+    complete_job,
+    extend_lease,
+    fail_expired_jobs,
+    fail_job,
+    run_job,
+)
+
+
+class Command(BaseCommand):
+    help = 'Run a pool of workers that process queued AI jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.AI_WORKER_CONCURRENCY,
+            help='Number of worker threads'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=settings.AI_WORKER_POLL_INTERVAL,
+            help='Seconds to wait before polling an empty queue again'
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Exit once the queue is empty instead of polling forever'
+        )
+
+    def handle(self, *args, **options):
+        self.stop_event = threading.Event()
+        self.poll_interval = options['poll_interval']
+        self.burst = options['burst']
+
+        signal.signal(signal.SIGINT, self._request_stop)
+        signal.signal(signal.SIGTERM, self._request_stop)
+
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        threads = [
+            threading.Thread(
+                target=self._worker_loop,
+                args=(f"{prefix}:{index}",),
+                name=f"ai-worker-{index}",
+                daemon=True,
+            )
+            for index in range(options['workers'])
+        ]
+
+        self.stdout.write(f"Starting {len(threads)} AI worker(s)")
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=1)
+        self.stdout.write(self.style.SUCCESS('AI workers stopped'))
+
+    def _request_stop(self, signum, frame):
+        self.stdout.write('Shutdown requested, finishing running jobs...')
+        self.stop_event.set()
+
+    def _worker_loop(self, worker_id):
+        try:
+            while not self.stop_event.is_set():
+                close_old_connections()
+                fail_expired_jobs()
+                job = claim_job(worker_id)
+                if job is None:
+                    if self.burst:
+                        return
+                    self.stop_event.wait(self.poll_interval)
+                    continue
+                self._run(job)
+        finally:
+            connection.close()
+
+    def _run(self, job):
+        heartbeat_stop = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat, args=(job, heartbeat_stop), daemon=True
+        )
+        heartbeat.start()
+        try:
+            run_job(job)
+        except Exception as e:
+            fail_job(job, e)
+            self.stderr.write(f"Job {job.id} for note {job.note_id} failed: {str(e)}")
+        else:
+            complete_job(job)
+            self.stdout.write(f"Job {job.id} for note {job.note_id} completed")
+        finally:
+            heartbeat_stop.set()
+            heartbeat.join()
+
+    def _heartbeat(self, job, stop):
+        interval = max(settings.AI_JOB_LEASE_SECONDS / 3, 1)
+        try:
+            while not stop.wait(interval):
+                extend_lease(job)
+        finally:
+            connection.close()
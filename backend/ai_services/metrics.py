@@ -0,0 +1,405 @@
+import bisect
+import glob
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from multiprocessing.util import Finalize
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def dump(self):
+        """
+        JSON-serializable copy of the current values
+        """
+        with self._lock:
+            return [[list(key), self._copy(value)] for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    """
+    Monotonic total per label set
+    """
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        _touch()
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    @staticmethod
+    def merge(total, value):
+        return (total or 0) + value
+
+    def samples(self, values):
+        for key, value in values.items():
+            yield self.name, key, (), value
+
+
+class Histogram(_Metric):
+    """
+    Bucketed observations per label set, with their sum and count
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            state['buckets'][index] += 1
+            state['sum'] += value
+            state['count'] += 1
+        _touch()
+
+    @staticmethod
+    def _copy(value):
+        return {'buckets': list(value['buckets']), 'sum': value['sum'], 'count': value['count']}
+
+    @staticmethod
+    def merge(total, value):
+        if total is None:
+            return Histogram._copy(value)
+        total['buckets'] = [a + b for a, b in zip(total['buckets'], value['buckets'])]
+        total['sum'] += value['sum']
+        total['count'] += value['count']
+        return total
+
+    def samples(self, values):
+        for key, value in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), value['buckets']):
+                cumulative += count
+                yield f"{self.name}_bucket", key, (('le', _format_bound(bound)),), cumulative
+            yield f"{self.name}_sum", key, (), value['sum']
+            yield f"{self.name}_count", key, (), value['count']
+
+
+REGISTRY = []
+_changed = threading.Event()
+
+STAGE_DURATION = Histogram(
+    'sapphire_stage_duration_seconds', 'Duration of AI pipeline stages', ['stage']
+)
+STAGE_ERRORS = Counter(
+    'sapphire_stage_errors_total', 'AI pipeline stage failures by exception type', ['stage', 'error']
+)
+STAGE_BYTES = Counter(
+    'sapphire_stage_bytes_total',
+    'Data into and out of AI pipeline stages (bytes for audio, characters for text)',
+    ['stage', 'direction']
+)
+AUDIO_SECONDS = Counter(
+    'sapphire_audio_seconds_total', 'Recorded audio, and the speech left of it after silence removal',
+    ['kind']
+)
+LLM_TOKENS = Counter(
+    'sapphire_llm_tokens_total', 'LLM tokens used, by prompt or completion', ['kind']
+)
+LLM_TOKENS_CACHED = Counter(
+    'sapphire_llm_tokens_cached_total', 'LLM tokens of results served from the cache instead', ['kind']
+)
+AI_CACHE = Counter(
+    'sapphire_ai_cache_total', 'AI result cache lookups, stores and evictions', ['event']
+)
+PROVIDER_CALLS = Counter(
+    'sapphire_provider_calls_total', 'Provider calls made through the governors, by outcome',
+    ['provider', 'outcome']
+)
+PROVIDER_THROTTLED = Counter(
+    'sapphire_provider_throttled_seconds_total', 'Time calls waited for the provider rate limit',
+    ['provider']
+)
+PROVIDER_CALL_DURATION = Histogram(
+    'sapphire_provider_call_seconds', 'Duration of individual provider calls', ['provider']
+)
+QUEUE_WAIT = Histogram(
+    'sapphire_ai_queue_wait_seconds', 'Time AI jobs waited in the queue before a worker claimed them',
+    ['priority'], buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200, 21600)
+)
+JOBS = Counter(
+    'sapphire_ai_jobs_total', 'AI jobs finished by workers, by outcome', ['job_type', 'outcome']
+)
+
+
+@contextmanager
+def stage_timer(stage):
+    """
+    Time a pipeline stage, counting the exception type if it fails
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        STAGE_ERRORS.inc(stage=stage, error=type(e).__name__)
+        raise
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - started, stage=stage)
+
+
+def record_bytes(stage, bytes_in=0, bytes_out=0):
+    if bytes_in:
+        STAGE_BYTES.inc(bytes_in, stage=stage, direction='in')
+    if bytes_out:
+        STAGE_BYTES.inc(bytes_out, stage=stage, direction='out')
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == math.inf else repr(float(bound))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+# Multi-process aggregation: each process periodically writes its values to
+# METRICS_DIR/<pid>-<id>.json and the endpoint sums every file. When rendering,
+# files of processes that have exited are folded into AGGREGATE_FILE and
+# deleted, so counters never go backwards and the directory stays small.
+# METRICS_DIR must not be shared between hosts, since liveness is checked by pid.
+
+AGGREGATE_FILE = 'aggregate.json'
+LOCK_FILE = '.lock'
+
+
+def _snapshot():
+    return {metric.name: metric.dump() for metric in REGISTRY}
+
+
+def _write_json(path, data):
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as handle:
+        json.dump(data, handle)
+    os.replace(temp_path, path)
+
+
+def _write_snapshot(path):
+    _write_json(path, _snapshot())
+
+
+def _read_json(path):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+class _Flusher:
+    """
+    Background thread writing this process's snapshot at most every METRICS_FLUSH_SECONDS
+    """
+
+    def __init__(self):
+        self.started = False
+        self._lock = threading.Lock()
+        # Unique per process lifetime, so a reused pid never overwrites a dead process's totals
+        self.file_name = f"{os.getpid()}-{uuid.uuid4().hex[:8]}.json"
+
+    def ensure_running(self):
+        with self._lock:
+            if self.started:
+                return
+            self.started = True
+            if settings.METRICS_DIR:
+                threading.Thread(target=self._run, name='metrics-flusher', daemon=True).start()
+                # Runs at interpreter exit and also when a multiprocessing worker exits
+                Finalize(None, self.flush, exitpriority=10)
+
+    def _run(self):
+        while True:
+            _changed.wait()
+            time.sleep(settings.METRICS_FLUSH_SECONDS)
+            _changed.clear()
+            self.flush()
+
+    def flush(self):
+        if not settings.METRICS_DIR:
+            return
+        try:
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            _write_snapshot(os.path.join(settings.METRICS_DIR, self.file_name))
+        except OSError as e:
+            logger.warning("Could not write metrics snapshot: %s", e)
+
+
+_flusher = _Flusher()
+
+
+def _touch():
+    _changed.set()
+    if not _flusher.started:
+        _flusher.ensure_running()
+
+
+def _reset_after_fork():
+    # A forked child starts from zero; the parent's values stay in the parent's file
+    global _changed, _flusher
+    for metric in REGISTRY:
+        metric._lock = threading.Lock()
+        metric.reset()
+    _changed = threading.Event()
+    _flusher = _Flusher()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _merge_snapshot(totals, snapshot):
+    by_name = {metric.name: metric for metric in REGISTRY}
+    for name, entries in snapshot.items():
+        metric = by_name.get(name)
+        if metric is None:
+            continue
+        values = totals.setdefault(name, {})
+        for key, value in entries:
+            key = tuple(key)
+            values[key] = metric.merge(values.get(key), value)
+    return totals
+
+
+def _process_alive(name):
+    try:
+        os.kill(int(name.split('-', 1)[0]), 0)
+    except ValueError:
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _directory_lock(directory):
+    """
+    Exclusive lock serializing compaction and reads of METRICS_DIR
+    """
+    if fcntl is None:
+        return nullcontext()
+
+    @contextmanager
+    def locked():
+        with open(os.path.join(directory, LOCK_FILE), 'a') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    return locked()
+
+
+def _compact(directory, names):
+    """
+    Fold the snapshots of exited processes into AGGREGATE_FILE and delete
+    them; returns the aggregate and the names of the files it covers.
+
+    Folded names are stored with the totals, so a crash between writing the
+    aggregate and deleting the files cannot count them twice.
+    """
+    aggregate = _read_json(os.path.join(directory, AGGREGATE_FILE)) or {'metrics': {}, 'folded': []}
+    folded = set(aggregate['folded'])
+    dead = [name for name in names if name not in folded and not _process_alive(name)]
+    if dead:
+        totals = _merge_snapshot({}, aggregate['metrics'])
+        for name in dead:
+            _merge_snapshot(totals, _read_json(os.path.join(directory, name)) or {})
+        folded = (folded | set(dead)) & set(names)
+        aggregate = {
+            'metrics': {
+                name: [[list(key), value] for key, value in values.items()] for name, values in totals.items()
+            },
+            'folded': sorted(folded),
+        }
+        _write_json(os.path.join(directory, AGGREGATE_FILE), aggregate)
+    for name in folded:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+    return aggregate['metrics'], folded
+
+
+def _collect():
+    """
+    Values of every metric, summed across processes
+    """
+    if not settings.METRICS_DIR:
+        return {metric.name: {tuple(key): value for key, value in metric.dump()} for metric in REGISTRY}
+
+    _flusher.flush()
+    directory = settings.METRICS_DIR
+    totals = {metric.name: {} for metric in REGISTRY}
+    with _directory_lock(directory):
+        names = [
+            os.path.basename(path) for path in glob.glob(os.path.join(directory, '*.json'))
+            if os.path.basename(path) != AGGREGATE_FILE
+        ]
+        # Without file locks concurrent renders could fold a file twice, so nothing is folded
+        aggregate, folded = _compact(directory, names) if fcntl is not None else ({}, set())
+        _merge_snapshot(totals, aggregate)
+        for name in names:
+            if name not in folded:
+                _merge_snapshot(totals, _read_json(os.path.join(directory, name)) or {})
+    return totals
+
+
+def render_metrics():
+    """
+    All metrics in the Prometheus text exposition format
+    """
+    totals = _collect()
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for sample_name, key, extra, value in metric.samples(totals[metric.name]):
+            labels = list(zip(metric.labelnames, key)) + list(extra)
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in labels)
+            lines.append(f"{sample_name}{{{label_text}}} {value}" if label_text else f"{sample_name} {value}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('notes', '0002_alter_note_processing_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_type', models.CharField(choices=[('process_note', 'Process Note'), ('process_audio', 'Process Audio')], help_text='Pipeline to run for the note', max_length=20)),
+                ('payload', models.JSONField(blank=True, default=dict, help_text='Extra arguments for the pipeline (e.g. audio file path)')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', help_text='Current job status', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0, help_text='Number of times the job has been claimed')),
+                ('max_attempts', models.PositiveIntegerField(default=3, help_text='Attempts allowed before the job is marked failed')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, help_text='Earliest time the job may be claimed')),
+                ('locked_by', models.CharField(blank=True, help_text='Identifier of the worker holding the lease', max_length=100)),
+                ('locked_until', models.DateTimeField(blank=True, help_text='Lease expiry; after this the job is visible to other workers again', null=True)),
+                ('last_error', models.TextField(blank=True, help_text='Error message from the most recent failed attempt')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('note', models.ForeignKey(help_text='Note being processed', on_delete=django.db.models.deletion.CASCADE, related_name='ai_jobs', to='notes.note')),
+            ],
+            options={
+                'db_table': 'ai_jobs',
+                'ordering': ['run_after', 'id'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='ai_jobs_status_fd2b9b_idx')],
+            },
+        ),
+    ]
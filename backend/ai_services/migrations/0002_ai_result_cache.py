@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIResultCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cache_key', models.CharField(help_text='SHA-256 of content hash, prompt version, model and temperature', max_length=64, unique=True)),
+                ('content_hash', models.CharField(db_index=True, help_text='SHA-256 of the raw content', max_length=64)),
+                ('prompt_version', models.CharField(max_length=50)),
+                ('model', models.CharField(max_length=100)),
+                ('temperature', models.FloatField()),
+                ('key_points', models.JSONField(default=list)),
+                ('detailed_notes', models.TextField(blank=True)),
+                ('size_bytes', models.PositiveIntegerField(default=0, help_text='Approximate size of the cached output')),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_accessed_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'ai_result_cache',
+                'ordering': ['-last_accessed_at'],
+            },
+        ),
+    ]
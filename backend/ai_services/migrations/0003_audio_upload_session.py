@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:18
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0002_ai_result_cache'),
+        ('notes', '0002_alter_note_processing_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AudioUploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('file_name', models.CharField(max_length=255)),
+                ('total_size', models.BigIntegerField(help_text='Expected size of the complete file in bytes')),
+                ('received_bytes', models.BigIntegerField(default=0, help_text='Length of the contiguous prefix received so far')),
+                ('spool_path', models.CharField(help_text='Local file the chunks are appended to', max_length=500)),
+                ('status', models.CharField(choices=[('uploading', 'Uploading'), ('completed', 'Completed')], default='uploading', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('note', models.ForeignKey(help_text='Note the recording belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='audio_upload_sessions', to='notes.note')),
+                ('user', models.ForeignKey(help_text='Uploading user', on_delete=django.db.models.deletion.CASCADE, related_name='audio_upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'audio_upload_sessions',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0003_audio_upload_session'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AudioBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(help_text='SHA-256 of the file contents', max_length=64, unique=True)),
+                ('file_path', models.CharField(help_text='Storage name of the file', max_length=500)),
+                ('size', models.BigIntegerField(help_text='File size in bytes')),
+                ('transcript', models.TextField(blank=True, help_text='Cached speech-to-text result for this recording')),
+                ('ref_count', models.PositiveIntegerField(default=0, help_text='Number of notes using this recording')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'audio_blobs',
+            },
+        ),
+    ]
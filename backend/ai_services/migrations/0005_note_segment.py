@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0004_audio_blob'),
+        ('notes', '0003_note_audio_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(help_text='Order of the segment within the note')),
+                ('content_hash', models.CharField(help_text='SHA-256 of the segment text', max_length=64)),
+                ('prompt_version', models.CharField(help_text='Prompt version and generation mode the summary was made with', max_length=50)),
+                ('key_points', models.JSONField(default=list)),
+                ('detailed_notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('note', models.ForeignKey(help_text='Note the segment belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='segments', to='notes.note')),
+            ],
+            options={
+                'db_table': 'note_segments',
+                'ordering': ['note', 'position'],
+                'unique_together': {('note', 'position')},
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0005_note_segment'),
+        ('courses', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReprocessBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('max_concurrency', models.PositiveIntegerField(default=4, help_text='Jobs of this batch that may run at the same time')),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed')], default='running', help_text='Whether the batch still has queued or running jobs', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('course', models.ForeignKey(help_text='Course whose notes are reprocessed', on_delete=django.db.models.deletion.CASCADE, related_name='reprocess_batches', to='courses.course')),
+                ('user', models.ForeignKey(help_text='User who started the run', on_delete=django.db.models.deletion.CASCADE, related_name='reprocess_batches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'ai_reprocess_batches',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='aijob',
+            name='batch',
+            field=models.ForeignKey(blank=True, help_text='Bulk reprocess run this job belongs to', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='ai_services.reprocessbatch'),
+        ),
+    ]
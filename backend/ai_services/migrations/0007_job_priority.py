@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:40
+
+from django.db import migrations, models
+
+
+def mark_batch_jobs(apps, schema_editor):
+    AIJob = apps.get_model('ai_services', 'AIJob')
+    AIJob.objects.filter(batch__isnull=False).update(priority='batch')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0006_reprocess_batch'),
+        ('notes', '0004_note_token_usage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aijob',
+            name='priority',
+            field=models.CharField(choices=[('interactive', 'Interactive'), ('reprocess', 'Reprocess'), ('batch', 'Batch')], default='interactive', help_text='Scheduling class: user uploads and edits, user-triggered reprocessing, or bulk runs', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='aijob',
+            name='started_at',
+            field=models.DateTimeField(blank=True, help_text='When the job was last claimed by a worker', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='aijob',
+            index=models.Index(fields=['status', 'priority', 'run_after'], name='ai_jobs_status_1fd791_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='aijob',
+            index=models.Index(fields=['started_at'], name='ai_jobs_started_e64615_idx'),
+        ),
+        migrations.RunPython(mark_batch_jobs, migrations.RunPython.noop),
+    ]
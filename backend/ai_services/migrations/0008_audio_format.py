@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0007_job_priority'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audioblob',
+            name='audio_format',
+            field=models.CharField(blank=True, help_text='Container, codec, sample rate and channels detected from the file headers', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='audioblob',
+            name='stt_bytes_saved',
+            field=models.BigIntegerField(blank=True, help_text='Bytes saved by re-encoding the recording before speech-to-text', null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0008_audio_format'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audioblob',
+            name='silence_seconds_removed',
+            field=models.FloatField(blank=True, help_text='Seconds of silence cut before speech-to-text', null=True),
+        ),
+        migrations.AddField(
+            model_name='audioblob',
+            name='speech_offsets',
+            field=models.JSONField(blank=True, default=list, help_text='[sent_seconds, original_seconds] at the start of each speech range kept'),
+        ),
+        migrations.AddField(
+            model_name='audioblob',
+            name='speech_ratio',
+            field=models.FloatField(blank=True, help_text='Share of the recording detected as speech and sent for transcription', null=True),
+        ),
+    ]
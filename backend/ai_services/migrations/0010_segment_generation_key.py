@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0009_speech_activity'),
+    ]
+
+    # Old prompt_version values never equal a generation key, so those
+    # segments are simply re-summarized on the next edit
+    operations = [
+        migrations.RenameField(
+            model_name='notesegment',
+            old_name='prompt_version',
+            new_name='generation_key',
+        ),
+        migrations.AlterField(
+            model_name='notesegment',
+            name='generation_key',
+            field=models.CharField(help_text='Hash of the prompt version, generation mode, model and temperature the summary was made with', max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0010_segment_generation_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='audiouploadsession',
+            name='status',
+            field=models.CharField(choices=[('uploading', 'Uploading'), ('finalizing', 'Finalizing'), ('completed', 'Completed')], default='uploading', max_length=20),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0012_upload_session_finalizing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='airesultcache',
+            name='completion_tokens',
+            field=models.PositiveIntegerField(default=0, help_text='Output tokens generating the result used'),
+        ),
+        migrations.AddField(
+            model_name='airesultcache',
+            name='prompt_tokens',
+            field=models.PositiveIntegerField(default=0, help_text='Input tokens generating the result used'),
+        ),
+    ]
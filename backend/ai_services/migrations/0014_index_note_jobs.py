@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0013_cache_token_usage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='aijob',
+            name='job_type',
+            field=models.CharField(choices=[('process_note', 'Process Note'), ('process_audio', 'Process Audio'), ('index_note', 'Index Note')], help_text='Pipeline to run for the note', max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0014_index_note_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audioblob',
+            name='transcript_timings',
+            field=models.JSONField(blank=True, default=list, help_text='[character_offset, original_seconds] at the start of each transcript result'),
+        ),
+    ]
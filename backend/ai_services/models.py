@@ -1,3 +1,347 @@
+import uuid
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+
+class AIJob(models.Model):
+    """
+    Durable queue entry for background AI processing of a note
+    """
+    JOB_TYPE_CHOICES = [
+        ('process_note', 'Process Note'),
+        ('process_audio', 'Process Audio'),
+        ('index_note', 'Index Note'),
+    ]
+    # Job types that run the note pipeline and drive the note's processing status
+    PIPELINE_JOB_TYPES = ('process_note', 'process_audio')
+    PRIORITY_CHOICES = [
+        ('interactive', 'Interactive'),
+        ('reprocess', 'Reprocess'),
+        ('batch', 'Batch'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    note = models.ForeignKey(
+        'notes.Note',
+        on_delete=models.CASCADE,
+        related_name='ai_jobs',
+        help_text='Note being processed'
+    )
+    batch = models.ForeignKey(
+        'ReprocessBatch',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='jobs',
+        help_text='Bulk reprocess run this job belongs to'
+    )
+    job_type = models.CharField(
+        max_length=20,
+        choices=JOB_TYPE_CHOICES,
+        help_text='Pipeline to run for the note'
+    )
+    priority = models.CharField(
+        max_length=20,
+        choices=PRIORITY_CHOICES,
+        default='interactive',
+        help_text='Scheduling class: user uploads and edits, user-triggered reprocessing, or bulk runs'
+    )
+    payload = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text='Extra arguments for the pipeline (e.g. audio file path)'
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='queued',
+        help_text='Current job status'
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        help_text='Number of times the job has been claimed'
+    )
+    max_attempts = models.PositiveIntegerField(
+        default=3,
+        help_text='Attempts allowed before the job is marked failed'
+    )
+    run_after = models.DateTimeField(
+        default=timezone.now,
+        help_text='Earliest time the job may be claimed'
+    )
+    locked_by = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text='Identifier of the worker holding the lease'
+    )
+    locked_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='Lease expiry; after this the job is visible to other workers again'
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='When the job was last claimed by a worker'
+    )
+    last_error = models.TextField(
+        blank=True,
+        help_text='Error message from the most recent failed attempt'
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'ai_jobs'
+        ordering = ['run_after', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+            models.Index(fields=['status', 'priority', 'run_after']),
+            models.Index(fields=['started_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.job_type} #{self.id} ({self.status}) - note {self.note_id}"
+
+
+class ReprocessBatch(models.Model):
+    """
+    Bulk AI reprocessing of every eligible note in a course
+    """
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='reprocess_batches',
+        help_text='User who started the run'
+    )
+    course = models.ForeignKey(
+        'courses.Course',
+        on_delete=models.CASCADE,
+        related_name='reprocess_batches',
+        help_text='Course whose notes are reprocessed'
+    )
+    max_concurrency = models.PositiveIntegerField(
+        default=4,
+        help_text='Jobs of this batch that may run at the same time'
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='running',
+        help_text='Whether the batch still has queued or running jobs'
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'ai_reprocess_batches'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Reprocess batch {self.id} for course {self.course_id} ({self.status})"
+
+
+class AIResultCache(models.Model):
+    """
+    Generated key points and detailed notes keyed by content and prompt settings
+    """
+    cache_key = models.CharField(
+        max_length=64,
+        unique=True,
+        help_text='SHA-256 of content hash, prompt version, model and temperature'
+    )
+    content_hash = models.CharField(
+        max_length=64,
+        db_index=True,
+        help_text='SHA-256 of the raw content'
+    )
+    prompt_version = models.CharField(max_length=50)
+    model = models.CharField(max_length=100)
+    temperature = models.FloatField()
+    key_points = models.JSONField(default=list)
+    detailed_notes = models.TextField(blank=True)
+    size_bytes = models.PositiveIntegerField(
+        default=0,
+        help_text='Approximate size of the cached output'
+    )
+    hit_count = models.PositiveIntegerField(default=0)
+    prompt_tokens = models.PositiveIntegerField(
+        default=0,
+        help_text='Input tokens generating the result used'
+    )
+    completion_tokens = models.PositiveIntegerField(
+        default=0,
+        help_text='Output tokens generating the result used'
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_accessed_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        db_table = 'ai_result_cache'
+        ordering = ['-last_accessed_at']
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} ({self.model}, v{self.prompt_version})"
+
+
+class AudioUploadSession(models.Model):
+    """
+    Resumable upload of a recording sent as a series of byte-range chunks
+    """
+    STATUS_CHOICES = [
+        ('uploading', 'Uploading'),
+        ('finalizing', 'Finalizing'),
+        ('completed', 'Completed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='audio_upload_sessions',
+        help_text='Uploading user'
+    )
+    note = models.ForeignKey(
+        'notes.Note',
+        on_delete=models.CASCADE,
+        related_name='audio_upload_sessions',
+        help_text='Note the recording belongs to'
+    )
+    file_name = models.CharField(max_length=255)
+    total_size = models.BigIntegerField(help_text='Expected size of the complete file in bytes')
+    received_bytes = models.BigIntegerField(
+        default=0,
+        help_text='Length of the contiguous prefix received so far'
+    )
+    spool_path = models.CharField(
+        max_length=500,
+        help_text='Local file the chunks are appended to'
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'audio_upload_sessions'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.file_name} ({self.received_bytes}/{self.total_size})"
+
+    @property
+    def is_complete(self):
+        return self.received_bytes >= self.total_size
+
+
+class AudioBlob(models.Model):
+    """
+    Stored recording shared by every note whose upload has the same content
+    """
+    content_hash = models.CharField(
+        max_length=64,
+        unique=True,
+        help_text='SHA-256 of the file contents'
+    )
+    file_path = models.CharField(
+        max_length=500,
+        help_text='Storage name of the file'
+    )
+    size = models.BigIntegerField(help_text='File size in bytes')
+    transcript = models.TextField(
+        blank=True,
+        help_text='Cached speech-to-text result for this recording'
+    )
+    audio_format = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text='Container, codec, sample rate and channels detected from the file headers'
+    )
+    stt_bytes_saved = models.BigIntegerField(
+        null=True,
+        blank=True,
+        help_text='Bytes saved by re-encoding the recording before speech-to-text'
+    )
+    speech_ratio = models.FloatField(
+        null=True,
+        blank=True,
+        help_text='Share of the recording detected as speech and sent for transcription'
+    )
+    silence_seconds_removed = models.FloatField(
+        null=True,
+        blank=True,
+        help_text='Seconds of silence cut before speech-to-text'
+    )
+    speech_offsets = models.JSONField(
+        default=list,
+        blank=True,
+        help_text='[sent_seconds, original_seconds] at the start of each speech range kept'
+    )
+    transcript_timings = models.JSONField(
+        default=list,
+        blank=True,
+        help_text='[character_offset, original_seconds] at the start of each transcript result'
+    )
+    ref_count = models.PositiveIntegerField(
+        default=0,
+        help_text='Number of notes using this recording'
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'audio_blobs'
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} ({self.ref_count} refs)"
+
+
+class NoteSegment(models.Model):
+    """
+    Summary of one content-defined segment of a note's raw content
+    """
+    note = models.ForeignKey(
+        'notes.Note',
+        on_delete=models.CASCADE,
+        related_name='segments',
+        help_text='Note the segment belongs to'
+    )
+    position = models.PositiveIntegerField(help_text='Order of the segment within the note')
+    content_hash = models.CharField(
+        max_length=64,
+        help_text='SHA-256 of the segment text'
+    )
+    generation_key = models.CharField(
+        max_length=64,
+        help_text='Hash of the prompt version, generation mode, model and temperature the summary was made with'
+    )
+    key_points = models.JSONField(default=list)
+    detailed_notes = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'note_segments'
+        ordering = ['note', 'position']
+        unique_together = ['note', 'position']
 
-# Create your models here.
+    def __str__(self):
+        return f"Note {self.note_id} segment {self.position}"
@@ -0,0 +1,234 @@
+import logging
+import math
+import threading
+from collections import namedtuple
+from types import SimpleNamespace
+
+from django.conf import settings
+
+from .chunking import compact_text, estimate_tokens, truncate_to_tokens
+from .metrics import LLM_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever prompts or response parsing change so cached results are not reused
+PROMPT_VERSION = '4'
+
+# Chat format framing: tokens added per message and to prime the reply
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+
+KEY_POINTS_SYSTEM_PROMPT = (
+    "You are an expert note-taking assistant. Extract key points from transcribed "
+    "content and return them as a JSON array of strings."
+)
+DETAILED_NOTES_SYSTEM_PROMPT = (
+    "You are an expert note-taking assistant. Structure and organize transcribed "
+    "content into clear, detailed notes."
+)
+FUSED_SYSTEM_PROMPT = (
+    "You are an expert note-taking assistant. Extract key points from transcribed "
+    "content and structure it into clear, detailed notes. Respond with a JSON object."
+)
+REDUCE_KEY_POINTS_SYSTEM_PROMPT = (
+    "You are an expert note-taking assistant. Merge key points from consecutive sections "
+    "of one transcript into a single JSON array of strings."
+)
+REDUCE_DETAILED_NOTES_SYSTEM_PROMPT = (
+    "You are an expert note-taking assistant. Merge notes from consecutive sections of "
+    "one transcript into a single clear, detailed document."
+)
+
+
+def _key_points_template(content):
+    return f"""
+        Please analyze the following transcribed content and extract the key points as a JSON array of strings.
+        Each key point should be concise (1-2 sentences) and capture the main ideas.
+
+        Content: {content}
+
+        Return only a valid JSON array of strings, no additional text.
+        """
+
+
+def _detailed_notes_template(content):
+    return f"""
+        Please organize and structure the following transcribed content into detailed, well-formatted notes.
+        Make the content more readable, add proper structure with headings and bullet points where appropriate,
+        and ensure the information flows logically.
+
+        Content: {content}
+
+        Return well-structured notes in markdown format.
+        """
+
+
+def _fused_template(content):
+    return f"""
+        Please analyze the following transcribed content and return a JSON object with two fields:
+        - "key_points": an array of strings, each a concise (1-2 sentence) key point capturing a main idea.
+        - "detailed_notes": a string of detailed, well-structured notes in markdown format, with headings
+          and bullet points where appropriate, organized so the information flows logically.
+
+        Content: {content}
+
+        Return only the JSON object, no additional text.
+        """
+
+
+def _reduce_key_points_template(content):
+    return f"""
+        The following key points were extracted from consecutive sections of the same transcribed content.
+        Merge them into one list: remove duplicates, combine points that say the same thing,
+        and keep each point concise (1-2 sentences) and in the order the ideas appear.
+
+        Key points:
+        {content}
+
+        Return only a valid JSON array of strings, no additional text.
+        """
+
+
+def _reduce_detailed_notes_template(content):
+    return f"""
+        The following markdown notes were written for consecutive sections of the same transcribed content,
+        separated by "---". Merge them into a single well-formatted markdown document with one consistent
+        heading structure, removing repetition while keeping every distinct piece of information.
+
+        Notes:
+        {content}
+
+        Return well-structured notes in markdown format.
+        """
+
+
+# How a prompt is sized: the completion is given ``output_ratio`` tokens per
+# content token, clamped to [min_output_tokens, max_output_tokens]. ``name``
+# labels the pipeline stage in metrics.
+PromptSpec = namedtuple(
+    'PromptSpec',
+    ['name', 'system_prompt', 'template', 'output_ratio', 'min_output_tokens', 'max_output_tokens']
+)
+
+KEY_POINTS = PromptSpec('key_points', KEY_POINTS_SYSTEM_PROMPT, _key_points_template, 0.15, 150, 500)
+DETAILED_NOTES = PromptSpec(
+    'detailed_notes', DETAILED_NOTES_SYSTEM_PROMPT, _detailed_notes_template, 0.8, 300, 1500
+)
+FUSED = PromptSpec('fused', FUSED_SYSTEM_PROMPT, _fused_template, 0.95, 400, 2000)
+REDUCE_KEY_POINTS = PromptSpec(
+    'reduce_key_points', REDUCE_KEY_POINTS_SYSTEM_PROMPT, _reduce_key_points_template, 0.5, 150, 500
+)
+REDUCE_DETAILED_NOTES = PromptSpec(
+    'reduce_detailed_notes', REDUCE_DETAILED_NOTES_SYSTEM_PROMPT, _reduce_detailed_notes_template, 0.9, 300, 1500
+)
+
+BuiltPrompt = namedtuple('BuiltPrompt', ['messages', 'max_tokens', 'input_tokens'])
+
+
+def _messages(spec, content):
+    return [
+        {"role": "system", "content": spec.system_prompt},
+        {"role": "user", "content": spec.template(content)}
+    ]
+
+
+def count_message_tokens(messages):
+    """
+    Tokens a list of chat messages will consume as input
+    """
+    return sum(
+        estimate_tokens(message['content']) + MESSAGE_OVERHEAD_TOKENS for message in messages
+    ) + REPLY_PRIMING_TOKENS
+
+
+def _output_tokens(spec, content_tokens):
+    return min(
+        max(math.ceil(content_tokens * spec.output_ratio), spec.min_output_tokens),
+        spec.max_output_tokens
+    )
+
+
+def build_prompt(spec, content):
+    """
+    Build chat messages for ``content`` and size ``max_tokens`` to it.
+
+    Whitespace is compacted first. If the prompt plus the completion would
+    exceed ``settings.AI_REQUEST_TOKEN_BUDGET``, the budget is split between
+    input and output by the spec's ratio and the middle of the content is cut
+    so the request fits instead of failing with a context overflow.
+    """
+    budget = settings.AI_REQUEST_TOKEN_BUDGET
+    content = compact_text(content)
+    content_tokens = estimate_tokens(content)
+    max_tokens = _output_tokens(spec, content_tokens)
+    messages = _messages(spec, content)
+    input_tokens = count_message_tokens(messages)
+
+    if input_tokens + max_tokens > budget:
+        available = budget - count_message_tokens(_messages(spec, ''))
+        max_tokens = _output_tokens(spec, available / (1 + spec.output_ratio))
+        content_budget = available - max_tokens
+        if content_budget <= 0:
+            raise ValueError(f"AI_REQUEST_TOKEN_BUDGET of {budget} tokens is too small for this prompt")
+        # Token counts of the joined prompt can differ slightly from the sum of its parts
+        while input_tokens + max_tokens > budget and content_budget > 0:
+            content = truncate_to_tokens(content, content_budget)
+            messages = _messages(spec, content)
+            input_tokens = count_message_tokens(messages)
+            content_budget -= max(input_tokens + max_tokens - budget, 1)
+        logger.info("Trimmed %s-token prompt input to fit a %s-token budget", content_tokens, budget)
+
+    return BuiltPrompt(messages, max_tokens, input_tokens)
+
+
+class TokenUsage:
+    """
+    Thread-safe tally of prompt and completion tokens across provider calls
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.calls = 0
+
+    def record(self, prompt_tokens, completion_tokens):
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.calls += 1
+        LLM_TOKENS.inc(prompt_tokens, kind='prompt')
+        LLM_TOKENS.inc(completion_tokens, kind='completion')
+
+    def wrap(self, client):
+        """
+        Client proxy whose chat completions are counted in this tally
+        """
+        def create(**kwargs):
+            response = client.chat.completions.create(**kwargs)
+            if kwargs.get('stream'):
+                return counted_stream(response, kwargs['messages'])
+            usage = getattr(response, 'usage', None)
+            if usage is not None:
+                self.record(usage.prompt_tokens, usage.completion_tokens)
+            else:
+                self.record(
+                    count_message_tokens(kwargs['messages']),
+                    estimate_tokens(response.choices[0].message.content or '')
+                )
+            return response
+
+        def counted_stream(chunks, messages):
+            usage, parts = None, []
+            for chunk in chunks:
+                if getattr(chunk, 'usage', None) is not None:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                yield chunk
+            if usage is not None:
+                self.record(usage.prompt_tokens, usage.completion_tokens)
+            else:
+                self.record(count_message_tokens(messages), estimate_tokens(''.join(parts)))
+
+        return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
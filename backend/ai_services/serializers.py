@@ -0,0 +1,47 @@
+from django.conf import settings
+from rest_framework import serializers
+from .models import AudioUploadSession
+
+
+class UploadSessionCreateSerializer(serializers.Serializer):
+    """
+    Serializer for starting a resumable audio upload
+    """
+    note_id = serializers.IntegerField(required=True)
+    file_name = serializers.CharField(max_length=200, required=True)
+    total_size = serializers.IntegerField(min_value=1, required=True)
+
+    def validate_total_size(self, value):
+        """
+        Validate that the recording fits the upload size limit
+        """
+        if value > settings.AUDIO_UPLOAD_MAX_BYTES:
+            raise serializers.ValidationError(
+                f"Audio file exceeds the {settings.AUDIO_UPLOAD_MAX_BYTES} byte limit"
+            )
+        return value
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """
+    Serializer for reporting upload progress
+    """
+    upload_id = serializers.UUIDField(source='id', read_only=True)
+    note_id = serializers.IntegerField(read_only=True)
+    received_ranges = serializers.SerializerMethodField()
+    chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = AudioUploadSession
+        fields = (
+            'upload_id', 'note_id', 'file_name', 'total_size', 'received_bytes',
+            'received_ranges', 'chunk_size', 'status', 'created_at', 'updated_at'
+        )
+        read_only_fields = fields
+
+    def get_received_ranges(self, obj):
+        """Byte ranges (inclusive) already stored; chunks are appended in order"""
+        return [[0, obj.received_bytes - 1]] if obj.received_bytes else []
+
+    def get_chunk_size(self, obj):
+        return settings.AUDIO_UPLOAD_SESSION_CHUNK_BYTES
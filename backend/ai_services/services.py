@@ -1,122 +1,671 @@
 import os
 import json
-import openai
+import logging
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import django
 from google.cloud import speech
 from django.conf import settings
+from django.db import transaction
+from .audio import (
+    PCM_SAMPLE_RATE,
+    VAD_FRAME_SECONDS,
+    audio_duration,
+    describe_audio_format,
+    encode_pcm,
+    ffmpeg_available,
+    frame_features,
+    iter_pcm,
+    pcm_ranges,
+    prepare_audio,
+    quiet_points,
+    segment_ranges,
+    sniff_audio_format,
+    stitch_transcripts,
+)
+from .blobs import cached_transcript, record_audio_preparation, store_transcript
+from .cache import content_hash, generation_key, get_cached_result, store_result
+from .clients import get_openai_client, get_speech_client
+from .events import publish_note_status
+from .governor import ProviderUnavailable, get_governor
+from .metrics import AUDIO_SECONDS, record_bytes, stage_timer
+from .chunking import estimate_tokens, split_into_chunks, split_into_segments
+from . import prompts
+from .prompts import PROMPT_VERSION, TokenUsage, build_prompt
 
+logger = logging.getLogger(__name__)
 
-def transcribe_audio_google(audio_file_path):
+
+def _recognition_config(audio_format=None):
     """
-    Transcribe audio using Google Cloud Speech-to-Text
+    Recognition settings matching a sniffed audio format.
+
+    Without a recognized format (e.g. ``gs://`` recordings, which are not
+    read locally) the app's native WebM/Opus at 48 kHz is assumed.
     """
-    try:
-        # Initialize the client
-        client = speech.SpeechClient.from_service_account_json(
-            settings.GOOGLE_CLOUD_SPEECH_CREDENTIALS_PATH
-        ) if settings.GOOGLE_CLOUD_SPEECH_CREDENTIALS_PATH else speech.SpeechClient()
-        
-        # Load audio file
-        with open(audio_file_path, 'rb') as audio_file:
-            content = audio_file.read()
-        
-        audio = speech.RecognitionAudio(content=content)
-        config = speech.RecognitionConfig(
-            encoding=speech.RecognitionConfig.AudioEncoding.WEBM_OPUS,
-            sample_rate_hertz=48000,
-            language_code='en-US',
-            enable_automatic_punctuation=True,
-            enable_speaker_diarization=False,
+    config = speech.RecognitionConfig(
+        encoding=speech.RecognitionConfig.AudioEncoding.WEBM_OPUS,
+        sample_rate_hertz=48000,
+        language_code='en-US',
+        enable_automatic_punctuation=True,
+        enable_word_time_offsets=True,
+        diarization_config=speech.SpeakerDiarizationConfig(enable_speaker_diarization=False),
+    )
+    if audio_format is None or audio_format.encoding is None:
+        if audio_format is not None:
+            logger.warning("Sending %s audio as WebM/Opus", describe_audio_format(audio_format))
+        return config
+    config.encoding = speech.RecognitionConfig.AudioEncoding[audio_format.encoding]
+    config.sample_rate_hertz = audio_format.sample_rate or 0
+    if audio_format.channels and audio_format.channels > 1:
+        config.audio_channel_count = audio_format.channels
+    return config
+
+
+def _read_chunks(audio_file_path, chunk_size):
+    """
+    Yield the audio file in fixed-size chunks so it is never fully in memory
+    """
+    with open(audio_file_path, 'rb') as audio_file:
+        while True:
+            chunk = audio_file.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _transcription_mode(audio_file_path, seconds=None):
+    """
+    Pick the recognition API that can handle a recording of this length.
+
+    ``seconds`` is probed from the file when not given; if that is not
+    possible the file size is compared with the byte limits instead.
+    """
+    if audio_file_path.startswith('gs://'):
+        return 'long_running'
+    if seconds is None:
+        seconds = audio_duration(audio_file_path)
+    if seconds is not None:
+        if seconds <= settings.SPEECH_SYNC_MAX_SECONDS:
+            return 'sync'
+        if seconds <= settings.SPEECH_STREAMING_MAX_SECONDS:
+            return 'streaming'
+        return 'long_running'
+    size = os.path.getsize(audio_file_path)
+    if size <= settings.SPEECH_SYNC_MAX_BYTES:
+        return 'sync'
+    if size <= settings.SPEECH_STREAMING_MAX_BYTES:
+        return 'streaming'
+    return 'long_running'
+
+
+def _result_start(result):
+    """
+    Seconds into the audio sent where a recognition result starts, from the
+    time offset of its first word, or None without word offsets
+    """
+    words = getattr(result.alternatives[0], 'words', None)
+    if not words:
+        return None
+    return words[0].start_time.total_seconds()
+
+
+def _transcribe_sync(client, config, audio_file_path, on_result):
+    with open(audio_file_path, 'rb') as audio_file:
+        audio = speech.RecognitionAudio(content=audio_file.read())
+    response = get_governor('speech').call(client.recognize, config=config, audio=audio)
+    for result in response.results:
+        if result.alternatives:
+            on_result(result)
+
+
+def _transcribe_streaming(client, config, audio_file_path, on_result):
+    streaming_config = speech.StreamingRecognitionConfig(config=config, interim_results=False)
+    emitted = 0
+    
+    def stream():
+        # A retried stream starts over; skip the results already passed on
+        nonlocal emitted
+        requests = (
+            speech.StreamingRecognizeRequest(audio_content=chunk)
+            for chunk in _read_chunks(audio_file_path, settings.SPEECH_STREAM_CHUNK_BYTES)
         )
+        seen = 0
+        for response in client.streaming_recognize(config=streaming_config, requests=requests):
+            for result in response.results:
+                if result.is_final and result.alternatives:
+                    seen += 1
+                    if seen > emitted:
+                        emitted = seen
+                        on_result(result)
+    
+    get_governor('speech').call(stream)
+
+
+def _transcribe_long_running(client, config, audio_file_path, on_result):
+    if audio_file_path.startswith('gs://'):
+        audio = speech.RecognitionAudio(uri=audio_file_path)
+    else:
+        size = os.path.getsize(audio_file_path)
+        if size > settings.SPEECH_INLINE_MAX_BYTES:
+            raise ValueError(
+                f"{size} bytes of audio is over the {settings.SPEECH_INLINE_MAX_BYTES} byte inline limit "
+                "and can't be split without ffmpeg; upload it to Cloud Storage and pass its gs:// URI"
+            )
+        with open(audio_file_path, 'rb') as audio_file:
+            audio = speech.RecognitionAudio(content=audio_file.read())
+    
+    def recognize():
+        operation = client.long_running_recognize(config=config, audio=audio)
+        return operation.result(timeout=settings.SPEECH_LONG_RUNNING_TIMEOUT)
+    
+    response = get_governor('speech').call(recognize)
+    for result in response.results:
+        if result.alternatives:
+            on_result(result)
+
+
+TRANSCRIPTION_MODES = {
+    'sync': _transcribe_sync,
+    'streaming': _transcribe_streaming,
+    'long_running': _transcribe_long_running,
+}
+
+
+def transcribe_audio_google(audio_file_path, mode=None, on_result=None, audio_format=None, seconds=None,
+                            timings=None):
+    """
+    Transcribe audio using Google Cloud Speech-to-Text.
+
+    ``mode`` (default ``settings.SPEECH_TRANSCRIPTION_MODE``) is ``sync``,
+    ``streaming`` (the file is sent as a stream of fixed-size chunks),
+    ``long_running`` (for recordings over the sync limit; ``gs://`` URIs are
+    passed by reference, local files are transcribed in segments with
+    ``transcribe_audio_parallel`` when they can be decoded and sent inline
+    otherwise) or ``auto`` to choose by the recording's duration
+    (``seconds``, probed when not given). ``on_result`` is called with each
+    final transcript segment as it arrives. The recognition config follows
+    ``audio_format``, sniffed from the file when not given. A ``timings``
+    list receives ``[character_offset, seconds]`` for the start of each
+    result, in the transcript and in the audio sent.
+    """
+    mode = mode or settings.SPEECH_TRANSCRIPTION_MODE
+    if mode == 'auto':
+        mode = _transcription_mode(audio_file_path, seconds)
+    if mode not in TRANSCRIPTION_MODES:
+        raise ValueError(f"Unknown transcription mode: {mode}")
+    if mode == 'long_running' and _can_segment(audio_file_path):
+        # Inline audio is read whole and capped at 10 MB; segments are decoded as a stream
+        return transcribe_audio_parallel(audio_file_path, on_result=on_result, timings=timings)
+    
+    try:
+        segments = []
         
-        # Perform the transcription
-        response = client.recognize(config=config, audio=audio)
+        def collect(result):
+            transcript = result.alternatives[0].transcript.strip()
+            if not transcript:
+                return
+            start = _result_start(result)
+            if timings is not None and start is not None:
+                timings.append([sum(len(segment) + 1 for segment in segments), start])
+            segments.append(transcript)
+            if on_result:
+                on_result(transcript)
         
-        # Extract transcription
-        transcription = ''
-        for result in response.results:
-            transcription += result.alternatives[0].transcript + ' '
+        if audio_format is None and not audio_file_path.startswith('gs://'):
+            audio_format = sniff_audio_format(audio_file_path)
+        config = _recognition_config(audio_format)
+        TRANSCRIPTION_MODES[mode](get_speech_client(), config, audio_file_path, collect)
         
-        return transcription.strip()
+        transcription = ' '.join(segments)
+        sent_bytes = 0 if audio_file_path.startswith('gs://') else os.path.getsize(audio_file_path)
+        record_bytes('transcription', sent_bytes, len(transcription))
+        return transcription
     
+    except ProviderUnavailable:
+        raise
     except Exception as e:
         raise Exception(f"Speech-to-text failed: {str(e)}")
 
 
-def generate_ai_content(raw_content):
+def _recognize_segment(audio_bytes, audio_format):
+    """
+    Transcribe one encoded segment; runs inside a worker process
+    """
+    response = get_governor('speech').call(
+        get_speech_client().recognize,
+        config=_recognition_config(audio_format),
+        audio=speech.RecognitionAudio(content=audio_bytes)
+    )
+    return ' '.join(
+        result.alternatives[0].transcript.strip()
+        for result in response.results if result.alternatives
+    )
+
+
+def _can_segment(audio_file_path):
+    """
+    Whether a recording can be decoded locally and cut into segments
+    """
+    if audio_file_path.startswith('gs://'):
+        return False
+    return ffmpeg_available() or audio_file_path.lower().endswith('.wav')
+
+
+def _use_parallel_transcription(audio_file_path, seconds=None):
+    if settings.SPEECH_PARALLEL_WORKERS <= 1 or not _can_segment(audio_file_path):
+        return False
+    if seconds is not None:
+        return seconds > settings.SPEECH_SYNC_MAX_SECONDS
+    return os.path.getsize(audio_file_path) > settings.SPEECH_SYNC_MAX_BYTES
+
+
+def transcribe_audio_parallel(audio_file_path, recognizer=None, workers=None, on_result=None, timings=None):
     """
-    Generate key points and detailed notes using OpenAI
+    Transcribe a long recording as segments cut at quiet points, in parallel.
+
+    The audio is decoded to 16 kHz mono PCM as a stream, split near every
+    ``settings.SPEECH_SEGMENT_SECONDS`` at the lowest-energy frame, then
+    decoded again segment by segment; each is encoded with ``encode_pcm``
+    (Opus, or WAV without ffmpeg) and recognized on a process pool. Segments
+    are only cut as workers free up, so at most two per worker are held in
+    memory. ``recognizer`` is a picklable ``(audio_bytes, audio_format) ->
+    str`` callable (Google STT by default).
+    Segment transcripts are stitched in order with repeated boundary words
+    removed; ``on_result`` receives newly stitched text as soon as every
+    earlier segment is done. A ``timings`` list receives
+    ``[character_offset, seconds]`` for the start of each segment.
     """
+    recognizer = recognizer or _recognize_segment
+    workers = workers or settings.SPEECH_PARALLEL_WORKERS
+    
     try:
-        client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-        
-        # Prompt for generating key points
-        key_points_prompt = f"""
-        Please analyze the following transcribed content and extract the key points as a JSON array of strings.
-        Each key point should be concise (1-2 sentences) and capture the main ideas.
-        
-        Content: {raw_content}
-        
-        Return only a valid JSON array of strings, no additional text.
-        """
-        
-        # Generate key points
-        key_points_response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an expert note-taking assistant. Extract key points from transcribed content and return them as a JSON array of strings."},
-                {"role": "user", "content": key_points_prompt}
-            ],
-            max_tokens=500,
-            temperature=0.3
+        features = frame_features(iter_pcm(audio_file_path), int(PCM_SAMPLE_RATE * VAD_FRAME_SECONDS))
+        points = quiet_points(
+            features, PCM_SAMPLE_RATE,
+            settings.SPEECH_SEGMENT_SECONDS, settings.SPEECH_SEGMENT_SEARCH_SECONDS
         )
+        overlap = int(settings.SPEECH_SEGMENT_OVERLAP_SECONDS * PCM_SAMPLE_RATE)
+        ranges = segment_ranges(points, features.samples, overlap)
         
-        # Prompt for generating detailed notes
-        detailed_notes_prompt = f"""
-        Please organize and structure the following transcribed content into detailed, well-formatted notes.
-        Make the content more readable, add proper structure with headings and bullet points where appropriate,
-        and ensure the information flows logically.
-        
-        Content: {raw_content}
-        
-        Return well-structured notes in markdown format.
-        """
-        
-        # Generate detailed notes
-        detailed_notes_response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an expert note-taking assistant. Structure and organize transcribed content into clear, detailed notes."},
-                {"role": "user", "content": detailed_notes_prompt}
-            ],
-            max_tokens=1500,
-            temperature=0.3
-        )
+        parts = [None] * len(ranges)
+        pending = {}
+        sent_bytes, emitted, stitched = 0, 0, ''
         
-        # Parse key points response
-        try:
-            key_points_text = key_points_response.choices[0].message.content.strip()
-            # Remove any markdown code block formatting
-            if key_points_text.startswith('```'):
-                key_points_text = key_points_text.split('\n', 1)[1]
-            if key_points_text.endswith('```'):
-                key_points_text = key_points_text.rsplit('\n', 1)[0]
-            
-            key_points = json.loads(key_points_text)
-            if not isinstance(key_points, list):
-                raise ValueError("Key points must be a list")
-        except (json.JSONDecodeError, ValueError) as e:
-            # Fallback: create simple bullet points
-            key_points = [line.strip() for line in key_points_response.choices[0].message.content.split('\n') if line.strip()]
-        
-        detailed_notes = detailed_notes_response.choices[0].message.content.strip()
+        def collect(done):
+            nonlocal emitted, stitched
+            for future in done:
+                parts[pending.pop(future)] = future.result()
+            if on_result is None:
+                return
+            while emitted < len(parts) and parts[emitted] is not None:
+                emitted += 1
+                updated = stitch_transcripts(parts[:emitted])
+                if len(updated) > len(stitched):
+                    on_result(updated[len(stitched):].strip())
+                stitched = updated
         
+        max_workers = min(workers, len(ranges)) or 1
+        context = multiprocessing.get_context(settings.SPEECH_PARALLEL_START_METHOD)
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context, initializer=django.setup) as executor:
+            for index, segment in enumerate(pcm_ranges(iter_pcm(audio_file_path), ranges)):
+                if len(pending) >= 2 * max_workers:
+                    collect(wait(pending, return_when=FIRST_COMPLETED).done)
+                audio_bytes, audio_format = encode_pcm(segment, PCM_SAMPLE_RATE)
+                sent_bytes += len(audio_bytes)
+                pending[executor.submit(recognizer, audio_bytes, audio_format)] = index
+            while pending:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
+        
+        transcription = stitch_transcripts(parts)
+        if timings is not None:
+            for index, (start, _) in enumerate(ranges):
+                if parts[index].strip():
+                    before = stitch_transcripts(parts[:index])
+                    timings.append([len(before) + 1 if before else 0, round(start / PCM_SAMPLE_RATE, 3)])
+        record_bytes('transcription', sent_bytes, len(transcription))
+        return transcription
+    
+    except ProviderUnavailable:
+        raise
+    except Exception as e:
+        raise Exception(f"Speech-to-text failed: {str(e)}")
+
+
+def _chat_completion(client, spec, content, on_partial=None, **kwargs):
+    """
+    Run a single chat completion sized to its content and return the message text.
+
+    With ``on_partial`` the completion is streamed and the text received so
+    far is passed to it on the first token and then at most every
+    ``settings.AI_STREAM_CHECKPOINT_SECONDS``.
+    """
+    prompt = build_prompt(spec, content)
+    request = dict(
+        model=settings.OPENAI_MODEL,
+        messages=prompt.messages,
+        max_tokens=prompt.max_tokens,
+        temperature=settings.OPENAI_TEMPERATURE,
+        **kwargs
+    )
+    with stage_timer(spec.name):
+        text = _run_completion(client, request, on_partial)
+    record_bytes(
+        spec.name,
+        sum(len(message['content']) for message in prompt.messages),
+        len(text or '')
+    )
+    return text
+
+
+def _run_completion(client, request, on_partial):
+    """
+    Send a chat request through the governor, streaming it when ``on_partial`` is given
+    """
+    if on_partial is None:
+        response = get_governor('openai').call(client.chat.completions.create, **request)
+        return response.choices[0].message.content
+    
+    def stream():
+        parts, checkpointed_at = [], None
+        for chunk in client.chat.completions.create(
+            stream=True, stream_options={"include_usage": True}, **request
+        ):
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if not delta:
+                continue
+            parts.append(delta)
+            now = time.monotonic()
+            if checkpointed_at is None or now - checkpointed_at >= settings.AI_STREAM_CHECKPOINT_SECONDS:
+                on_partial(''.join(parts))
+                checkpointed_at = now
+        return ''.join(parts)
+    
+    # The whole stream runs under the governor so it holds a concurrency slot until done
+    return get_governor('openai').call(stream)
+
+
+def _parse_key_points(key_points_text):
+    """
+    Parse the key points completion into a list of strings
+    """
+    try:
+        text = key_points_text.strip()
+        # Remove any markdown code block formatting
+        if text.startswith('```'):
+            text = text.split('\n', 1)[1]
+        if text.endswith('```'):
+            text = text.rsplit('\n', 1)[0]
+        
+        key_points = json.loads(text)
+        if not isinstance(key_points, list):
+            raise ValueError("Key points must be a list")
+    except (json.JSONDecodeError, ValueError, IndexError):
+        # Fallback: create simple bullet points
+        key_points = [line.strip() for line in key_points_text.split('\n') if line.strip()]
+    return key_points
+
+
+def _generate_key_points(client, raw_content):
+    return _parse_key_points(_chat_completion(client, prompts.KEY_POINTS, raw_content))
+
+
+def _generate_detailed_notes(client, raw_content, on_partial=None):
+    return _chat_completion(client, prompts.DETAILED_NOTES, raw_content, on_partial=on_partial).strip()
+
+
+def _generate_sequential(client, raw_content, on_partial=None):
+    return {
+        'key_points': _generate_key_points(client, raw_content),
+        'detailed_notes': _generate_detailed_notes(client, raw_content, on_partial)
+    }
+
+
+def _generate_parallel(client, raw_content, on_partial=None):
+    """
+    Send the key points and detailed notes prompts concurrently
+    """
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        key_points = executor.submit(_generate_key_points, client, raw_content)
+        detailed_notes = executor.submit(_generate_detailed_notes, client, raw_content, on_partial)
+        return {
+            'key_points': key_points.result(),
+            'detailed_notes': detailed_notes.result()
+        }
+
+
+def _generate_fused(client, raw_content, on_partial=None):
+    """
+    Get key points and detailed notes from a single JSON-mode request.
+
+    The JSON response is not streamed; ``on_partial`` only applies if the
+    output is unusable and generation falls back to parallel mode.
+    """
+    text = _chat_completion(
+        client, prompts.FUSED, raw_content, response_format={"type": "json_object"}
+    )
+    try:
+        data = json.loads(text)
+        key_points = data['key_points']
+        detailed_notes = data['detailed_notes']
+        if not isinstance(key_points, list) or not isinstance(detailed_notes, str):
+            raise ValueError("Unexpected fused response shape")
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+        logger.warning("Fused generation returned unusable output (%s), falling back to parallel mode", e)
+        return _generate_parallel(client, raw_content, on_partial)
+    
+    return {
+        'key_points': [str(point).strip() for point in key_points if str(point).strip()],
+        'detailed_notes': detailed_notes.strip()
+    }
+
+
+GENERATION_MODES = {
+    'sequential': _generate_sequential,
+    'parallel': _generate_parallel,
+    'fused': _generate_fused,
+}
+
+
+def _group_for_reduce(partials, max_tokens):
+    """
+    Group consecutive partial results so each group's merge prompt fits the budget
+    """
+    groups, current, current_tokens = [], [], 0
+    for partial in partials:
+        tokens = estimate_tokens(partial['detailed_notes']) + \
+            estimate_tokens(json.dumps(partial['key_points']))
+        if current and current_tokens + tokens > max_tokens:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(partial)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _reduce_group(client, partials, mode, on_partial=None):
+    """
+    Merge the key points and notes of consecutive chunks into one result
+    """
+    key_points = '\n'.join(
+        f"- {point}" for partial in partials for point in partial['key_points']
+    )
+    sections = '\n\n---\n\n'.join(partial['detailed_notes'] for partial in partials)
+    
+    def merge_key_points():
+        return _parse_key_points(_chat_completion(client, prompts.REDUCE_KEY_POINTS, key_points))
+    
+    def merge_detailed_notes():
+        return _chat_completion(
+            client, prompts.REDUCE_DETAILED_NOTES, sections, on_partial=on_partial
+        ).strip()
+    
+    if mode == 'sequential':
+        return {'key_points': merge_key_points(), 'detailed_notes': merge_detailed_notes()}
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        merged_key_points = executor.submit(merge_key_points)
+        merged_detailed_notes = executor.submit(merge_detailed_notes)
         return {
-            'key_points': key_points,
-            'detailed_notes': detailed_notes
+            'key_points': merged_key_points.result(),
+            'detailed_notes': merged_detailed_notes.result()
         }
+
+
+def _summarize_chunks(client, chunks, mode, max_workers):
+    """
+    Summarize chunks concurrently, at most ``max_workers`` at a time
+    """
+    generate = GENERATION_MODES[mode]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda chunk: generate(client, chunk), chunks))
+
+
+def _merge_partials(client, partials, mode, max_workers, on_partial=None):
+    """
+    Merge partial results in budget-sized groups until one remains; only the
+    final merge streams its detailed notes to ``on_partial``
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while len(partials) > 1:
+            groups = _group_for_reduce(partials, settings.AI_CHUNK_TOKENS)
+            if len(groups) == len(partials):
+                # Every partial fills the budget on its own; merge pairwise to make progress
+                groups = [partials[i:i + 2] for i in range(0, len(partials), 2)]
+            final = on_partial if len(groups) == 1 else None
+            partials = list(executor.map(lambda group: _reduce_group(client, group, mode, final), groups))
+    return partials[0]
+
+
+def _generate_map_reduce(client, chunks, mode, max_workers, on_partial=None):
+    """
+    Summarize chunks concurrently, then merge the partial results
+    """
+    return _merge_partials(
+        client, _summarize_chunks(client, chunks, mode, max_workers), mode, max_workers, on_partial
+    )
+
+
+def generate_ai_content(raw_content, client=None, mode=None, max_workers=None, on_partial=None):
+    """
+    Generate key points and detailed notes using OpenAI.
+
+    ``mode`` (default ``settings.AI_GENERATION_MODE``) selects how the two
+    outputs are requested: ``sequential``, ``parallel`` or a single ``fused``
+    JSON-mode call. Content longer than ``settings.AI_CHUNK_TOKENS`` is split
+    into chunks that are summarized concurrently (at most ``max_workers`` at a
+    time) and then merged. ``on_partial`` receives the final detailed notes
+    as they stream in.
+    """
+    mode = mode or settings.AI_GENERATION_MODE
+    if mode not in GENERATION_MODES:
+        raise ValueError(f"Unknown AI generation mode: {mode}")
+    
+    try:
+        client = client or get_openai_client()
+        chunks = split_into_chunks(raw_content, settings.AI_CHUNK_TOKENS)
+        if len(chunks) > 1:
+            return _generate_map_reduce(
+                client, chunks, mode, max_workers or settings.AI_MAP_CONCURRENCY, on_partial
+            )
+        return GENERATION_MODES[mode](client, raw_content, on_partial)
+    
+    except ProviderUnavailable:
+        raise
+    except Exception as e:
+        raise Exception(f"AI processing failed: {str(e)}")
+
+
+def generate_ai_content_incremental(note, client=None, on_partial=None):
+    """
+    Generate AI content for a long note, re-summarizing only changed segments.
+
+    Returns None for notes that fit in one chunk (or with AI_SEGMENT_TOKENS
+    off): one full call costs less than summarizing segments and merging
+    them, even after a one-sentence edit.
+
+    Longer notes are split into content-defined segments. Summaries stored for
+    segments with the same hash and generation settings (prompt version, mode,
+    model and temperature) are reused, only new segments are sent to the
+    provider, and the per-segment results are then merged. On first
+    processing every segment is new; segments average about two thirds of a
+    chunk, so this costs a little more than chunked map-reduce and stores the
+    summaries later edits reuse. The note's stored
+    segments are replaced with the current set.
+    """
+    from .models import NoteSegment
+    
+    if not settings.AI_SEGMENT_TOKENS or estimate_tokens(note.raw_content) <= settings.AI_CHUNK_TOKENS:
+        NoteSegment.objects.filter(note=note).delete()
+        return None
+    # Segments never outgrow a chunk, so each is one map call like a chunk would be
+    segments = split_into_segments(
+        note.raw_content, min(settings.AI_SEGMENT_TOKENS, settings.AI_CHUNK_TOKENS),
+        max_tokens=settings.AI_CHUNK_TOKENS
+    )
+    if len(segments) < 2:
+        NoteSegment.objects.filter(note=note).delete()
+        return None
+    
+    mode = settings.AI_GENERATION_MODE
+    key = generation_key(f"{PROMPT_VERSION}:{mode}", settings.OPENAI_MODEL, settings.OPENAI_TEMPERATURE)
+    hashes = [content_hash(segment) for segment in segments]
+    stored = {
+        segment.content_hash: segment
+        for segment in NoteSegment.objects.filter(note=note, generation_key=key)
+    }
     
+    missing = [index for index, segment_hash in enumerate(hashes) if segment_hash not in stored]
+    
+    try:
+        client = client or get_openai_client()
+        fresh = _summarize_chunks(
+            client, [segments[index] for index in missing], mode, settings.AI_MAP_CONCURRENCY
+        ) if missing else []
+        summaries = dict(zip(missing, fresh))
+        partials = [
+            summaries[index] if index in summaries else {
+                'key_points': stored[segment_hash].key_points,
+                'detailed_notes': stored[segment_hash].detailed_notes
+            }
+            for index, segment_hash in enumerate(hashes)
+        ]
+        result = _merge_partials(client, partials, mode, settings.AI_MAP_CONCURRENCY, on_partial)
+    except ProviderUnavailable:
+        raise
     except Exception as e:
         raise Exception(f"AI processing failed: {str(e)}")
+    
+    with transaction.atomic():
+        NoteSegment.objects.filter(note=note).delete()
+        NoteSegment.objects.bulk_create([
+            NoteSegment(
+                note=note,
+                position=index,
+                content_hash=segment_hash,
+                generation_key=key,
+                key_points=partial['key_points'],
+                detailed_notes=partial['detailed_notes']
+            )
+            for index, (segment_hash, partial) in enumerate(zip(hashes, partials))
+        ])
+    
+    logger.info("Note %s: re-summarized %s of %s segments", note.id, len(missing), len(segments))
+    return result
+
+
+def _checkpoint_detailed_notes(note):
+    """
+    Callback that saves and publishes partial detailed notes of a note
+    """
+    def checkpoint(text):
+        note.detailed_notes = text
+        with stage_timer('db_write'):
+            note.save(update_fields=['detailed_notes', 'updated_at'])
+        publish_note_status(note)
+    return checkpoint
 
 
 def process_note_with_ai(note_id):
@@ -125,22 +674,49 @@ def process_note_with_ai(note_id):
     """
     from notes.models import Note
     
+    previous_detailed_notes = None
     try:
         note = Note.objects.get(id=note_id)
         note.processing_status = 'processing'
+        note.processing_error = ''
         note.save()
+        publish_note_status(note)
         
         if not note.raw_content:
             raise Exception("No raw content to process")
         
-        # Generate AI content
-        ai_content = generate_ai_content(note.raw_content)
+        # Reuse a cached result for identical input; otherwise only
+        # re-summarize the segments of a long note that changed
+        prompt_version = f"{PROMPT_VERSION}:{settings.AI_GENERATION_MODE}"
+        cache_args = (note.raw_content, prompt_version, settings.OPENAI_MODEL, settings.OPENAI_TEMPERATURE)
+        usage = TokenUsage()
+        ai_content = get_cached_result(*cache_args)
+        if ai_content is None:
+            client = usage.wrap(get_openai_client())
+            on_partial = None
+            if settings.AI_STREAM_DETAILED_NOTES and settings.AI_GENERATION_MODE != 'fused':
+                # While processing, detailed_notes holds the partial output
+                previous_detailed_notes = note.detailed_notes
+                note.detailed_notes = ''
+                note.save(update_fields=['detailed_notes', 'updated_at'])
+                on_partial = _checkpoint_detailed_notes(note)
+            with stage_timer('generation'):
+                ai_content = generate_ai_content_incremental(note, client=client, on_partial=on_partial) or \
+                    generate_ai_content(note.raw_content, client=client, on_partial=on_partial)
+            ai_content.update(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+            store_result(*cache_args, ai_content)
         
-        # Update note with AI-generated content
+        # Update note with AI-generated content; a cached result keeps the
+        # tokens it was generated with (metrics count those as cached, not spent)
         note.key_points = ai_content['key_points']
         note.detailed_notes = ai_content['detailed_notes']
+        note.prompt_tokens = ai_content['prompt_tokens']
+        note.completion_tokens = ai_content['completion_tokens']
         note.processing_status = 'completed'
-        note.save()
+        with stage_timer('db_write'):
+            note.save()
+        publish_note_status(note)
+        _update_note_embeddings(note)
         
         return note
     
@@ -149,12 +725,78 @@ def process_note_with_ai(note_id):
             from notes.models import Note
             note = Note.objects.get(id=note_id)
             note.processing_status = 'failed'
+            note.processing_error = str(e)
+            if previous_detailed_notes is not None:
+                # Don't leave a half-streamed document in place of the last good one
+                note.detailed_notes = previous_detailed_notes
             note.save()
+            publish_note_status(note)
         except:
             pass
         raise e
 
 
+def _update_note_embeddings(note):
+    """
+    Refresh the note's semantic search vectors; a failure leaves the old
+    vectors in place rather than failing the finished note
+    """
+    from notes import semantic
+
+    try:
+        with stage_timer('embedding'):
+            semantic.index_note(note)
+    except Exception:
+        logger.exception("Could not update embeddings for note %s", note.id)
+
+
+def _prepare_recording(note, audio_file_path):
+    """
+    Strip silence from and compactly re-encode a recording ahead of
+    transcription, or return None when it is not read locally
+    """
+    if audio_file_path.startswith('gs://') or not settings.SPEECH_PREPROCESS_AUDIO:
+        return None
+    
+    with stage_timer('preprocess'):
+        prepared = prepare_audio(audio_file_path, strip_silence=settings.SPEECH_VAD_ENABLED)
+    record_bytes('preprocess', prepared.original_bytes, prepared.bytes)
+    record_audio_preparation(note, prepared)
+    logger.info("Note %s: %s audio sent as %s, %s of %s bytes saved",
+                note.id, describe_audio_format(prepared.original_format), describe_audio_format(prepared.format),
+                prepared.original_bytes - prepared.bytes, prepared.original_bytes)
+    if prepared.offsets is not None:
+        offsets = prepared.offsets
+        AUDIO_SECONDS.inc(offsets.original_seconds, kind='original')
+        AUDIO_SECONDS.inc(offsets.speech_seconds, kind='speech')
+        logger.info("Note %s: speech ratio %.2f, %.1fs of %.1fs audio removed as silence",
+                    note.id, offsets.speech_ratio, offsets.original_seconds - offsets.speech_seconds,
+                    offsets.original_seconds)
+    return prepared
+
+
+def _original_timings(timings, prepared):
+    """
+    Transcript timings moved from the audio sent to the original recording,
+    through the speech offsets when silence was cut
+    """
+    offsets = prepared.offsets if prepared is not None else None
+    if offsets is None:
+        return timings
+    return [[offset, round(float(offsets.to_original(seconds)), 3)] for offset, seconds in timings]
+
+
+def _recording_seconds(prepared, source):
+    """
+    Duration of the audio about to be transcribed, known already when silence was cut
+    """
+    if prepared is not None and prepared.offsets is not None:
+        return prepared.offsets.speech_seconds
+    if source.startswith('gs://'):
+        return None
+    return audio_duration(source)
+
+
 def process_audio_to_note(audio_file_path, note_id):
     """
     Complete pipeline: transcribe audio and process with AI
@@ -163,16 +805,51 @@ def process_audio_to_note(audio_file_path, note_id):
     
     try:
         note = Note.objects.get(id=note_id)
+        
+        # Identical recordings share one transcript
+        transcription = cached_transcript(note)
+        if transcription:
+            note.raw_content = transcription
+            note.audio_file_path = audio_file_path
+            note.save()
+            return process_note_with_ai(note_id)
+        
         note.processing_status = 'transcribing'
+        note.processing_error = ''
+        note.raw_content = ''
+        note.audio_file_path = audio_file_path
         note.save()
+        publish_note_status(note)
+        
+        def append_transcript(transcript):
+            # Make partial transcripts readable while recognition continues
+            note.raw_content = f"{note.raw_content} {transcript.strip()}".strip()
+            note.save(update_fields=['raw_content', 'updated_at'])
+            publish_note_status(note)
         
-        # Transcribe audio
-        transcription = transcribe_audio_google(audio_file_path)
+        prepared = _prepare_recording(note, audio_file_path)
+        source = prepared.path if prepared else audio_file_path
+        seconds = _recording_seconds(prepared, source)
+        timings = []
         
-        # Update note with transcription
+        # Transcribe audio, splitting long recordings across worker processes
+        try:
+            with stage_timer('transcription'):
+                if _use_parallel_transcription(source, seconds):
+                    transcription = transcribe_audio_parallel(source, on_result=append_transcript, timings=timings)
+                else:
+                    transcription = transcribe_audio_google(
+                        source, on_result=append_transcript, audio_format=prepared.format if prepared else None,
+                        seconds=seconds, timings=timings
+                    )
+        finally:
+            if prepared and prepared.temporary:
+                os.remove(prepared.path)
+        
+        # Update note with the complete transcription
         note.raw_content = transcription
-        note.audio_file_path = audio_file_path
         note.save()
+        store_transcript(note, transcription, _original_timings(timings, prepared))
         
         # Process with AI
         return process_note_with_ai(note_id)
@@ -181,7 +858,9 @@ def process_audio_to_note(audio_file_path, note_id):
         try:
             note = Note.objects.get(id=note_id)
             note.processing_status = 'failed'
+            note.processing_error = str(e)
             note.save()
+            publish_note_status(note)
         except:
             pass
         raise e
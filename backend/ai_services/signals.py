@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from notes.models import Note
+from .blobs import release_blob
+
+
+@receiver(post_delete, sender=Note)
+def release_note_audio(sender, instance, **kwargs):
+    """
+    Drop the deleted note's reference to its recording
+    """
+    if instance.audio_blob_id:
+        release_blob(instance.audio_blob_id)
@@ -1,3 +1,965 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import wave
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from google.api_core import exceptions as google_exceptions
+from google.cloud import speech
+
+from .audio import (
+    AudioFormat,
+    SpeechOffsets,
+    audio_duration,
+    detect_speech,
+    find_split_points,
+    frame_features,
+    iter_pcm,
+    pcm_ranges,
+    prepare_audio,
+    quiet_points,
+    segment_ranges,
+    sniff_audio_format,
+    speech_spans,
+    split_segments,
+    stitch_transcripts,
+)
+from . import blobs, prompts
+from .blobs import attach_audio
+from .chunking import estimate_tokens, split_into_chunks
+from . import metrics
+from .cache import get_cached_result, store_result
+from .fakes import FakeLLMClient, FakeSpeechClient, LatencyModel
+from .events import note_event, with_event_fields
+from .governor import ProviderGovernor, ProviderUnavailable, reset_governors
+from .jobs import claim_job, complete_job, enqueue_note_processing, fail_job
+from .models import AIJob, NoteSegment
+from .prompts import TokenUsage, build_prompt
+from .models import AudioUploadSession
+from .uploads import (
+    UploadRangeError,
+    append_upload_chunk,
+    complete_upload_session,
+    expire_upload_sessions,
+    start_upload_session,
+)
+from .services import (
+    _original_timings,
+    _transcription_mode,
+    generate_ai_content,
+    generate_ai_content_incremental,
+    transcribe_audio_google,
+    transcribe_audio_parallel,
+)
+
+
+class FakeChatClient:
+    """
+    Local stand-in for the OpenAI client that records calls and peak concurrency
+    """
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, max_tokens, temperature, **kwargs):
+        with self._lock:
+            self.calls.append(messages)
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            system_prompt = messages[0]['content']
+            if 'JSON array' in system_prompt:
+                content = json.dumps([f"point {len(self.calls)}"])
+            else:
+                content = f"# Section {len(self.calls)}"
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def _segment_size(audio_bytes, audio_format):
+    # Picklable recognizer for transcribe_audio_parallel
+    return f"{audio_format.encoding.lower()}-{len(audio_bytes)}"
+
+
+def _transcript(paragraphs, sentences_per_paragraph=10):
+    return '\n\n'.join(
+        ' '.join(f"Paragraph {p} sentence {s} about cell biology." for s in range(sentences_per_paragraph))
+        for p in range(paragraphs)
+    )
+
+
+class ChunkingTests(SimpleTestCase):
+
+    def test_chunks_respect_token_budget(self):
+        chunks = split_into_chunks(_transcript(30), max_tokens=200)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(estimate_tokens(chunk), 200)
+
+    def test_chunks_break_on_sentence_boundaries(self):
+        chunks = split_into_chunks(_transcript(1, sentences_per_paragraph=40), max_tokens=100)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertTrue(chunk.endswith('.'))
+
+    def test_chunks_preserve_all_words(self):
+        text = _transcript(12)
+        chunks = split_into_chunks(text, max_tokens=150)
+        self.assertEqual(' '.join(chunks).split(), text.split())
+
+    def test_short_text_is_a_single_chunk(self):
+        self.assertEqual(split_into_chunks('One short note.', max_tokens=100), ['One short note.'])
+
+
+class PromptBuildingTests(SimpleTestCase):
+
+    def test_max_tokens_scales_with_input(self):
+        short = build_prompt(prompts.DETAILED_NOTES, 'A short lecture.')
+        long = build_prompt(prompts.DETAILED_NOTES, _transcript(10))
+        self.assertEqual(short.max_tokens, prompts.DETAILED_NOTES.min_output_tokens)
+        self.assertGreater(long.max_tokens, short.max_tokens)
+        self.assertLessEqual(long.max_tokens, prompts.DETAILED_NOTES.max_output_tokens)
+
+    @override_settings(AI_REQUEST_TOKEN_BUDGET=1000)
+    def test_oversized_input_is_trimmed_to_budget(self):
+        text = _transcript(40)
+        prompt = build_prompt(prompts.DETAILED_NOTES, text)
+        self.assertLessEqual(prompt.input_tokens + prompt.max_tokens, 1000)
+        user_prompt = prompt.messages[1]['content']
+        self.assertIn(text[:40], user_prompt)
+        self.assertIn(text[-40:], user_prompt)
+
+    def test_whitespace_is_compacted(self):
+        prompt = build_prompt(prompts.KEY_POINTS, 'First   line.\n\n\n\n\nSecond \t line.')
+        self.assertIn('First line.\n\nSecond line.', prompt.messages[1]['content'])
+
+    def test_usage_is_recorded_per_call(self):
+        usage = TokenUsage()
+        generate_ai_content('A short lecture.', client=usage.wrap(FakeChatClient()), mode='parallel')
+        self.assertEqual(usage.calls, 2)
+        self.assertGreater(usage.prompt_tokens, 0)
+        self.assertGreater(usage.completion_tokens, 0)
+
+
+class FlakyCall:
+    """
+    Callable that raises the given errors in order, then succeeds
+    """
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+@override_settings(
+    PROVIDER_RETRY_ATTEMPTS=3,
+    PROVIDER_RETRY_BASE_SECONDS=0.001,
+    PROVIDER_RETRY_MAX_SECONDS=0.01,
+    PROVIDER_BREAKER_THRESHOLD=3,
+    PROVIDER_BREAKER_RESET_SECONDS=60,
+)
+class ProviderGovernorTests(SimpleTestCase):
+
+    def test_transient_errors_are_retried(self):
+        governor = ProviderGovernor('test', rate=1000, burst=10, max_concurrency=8)
+        call = FlakyCall(google_exceptions.ServiceUnavailable('down'), google_exceptions.ResourceExhausted('429'))
+        self.assertEqual(governor.call(call), 'ok')
+        self.assertEqual(call.calls, 3)
+        self.assertEqual(governor.snapshot()['retries'], 2)
+
+    def test_rate_limits_halve_concurrency(self):
+        governor = ProviderGovernor('test', rate=1000, burst=10, max_concurrency=8)
+        governor.call(FlakyCall(google_exceptions.ResourceExhausted('429')))
+        self.assertLess(governor.limiter.limit, 4)
+        self.assertGreaterEqual(governor.limiter.limit, 2)
+
+    def test_client_errors_are_not_retried(self):
+        governor = ProviderGovernor('test', rate=1000, burst=10, max_concurrency=8)
+        call = FlakyCall(google_exceptions.InvalidArgument('bad audio'))
+        with self.assertRaises(google_exceptions.InvalidArgument):
+            governor.call(call)
+        self.assertEqual(call.calls, 1)
+
+    def test_breaker_opens_and_fails_fast(self):
+        governor = ProviderGovernor('test', rate=1000, burst=10, max_concurrency=8)
+        down = FlakyCall(*[google_exceptions.ServiceUnavailable('down')] * 10)
+        with self.assertRaises(ProviderUnavailable):
+            governor.call(down)
+        self.assertEqual(down.calls, 3)
+        self.assertEqual(governor.snapshot()['circuit'], 'open')
+
+        healthy = FlakyCall()
+        with self.assertRaises(ProviderUnavailable):
+            governor.call(healthy)
+        self.assertEqual(healthy.calls, 0)
+
+    def test_token_bucket_paces_calls(self):
+        governor = ProviderGovernor('test', rate=100, burst=1, max_concurrency=8)
+        started = time.perf_counter()
+        for _ in range(6):
+            governor.call(FlakyCall())
+        self.assertGreaterEqual(time.perf_counter() - started, 0.04)
+
+
+class UploadSessionTests(TestCase):
+
+    def setUp(self):
+        from courses.models import Course
+        from notes.models import Note
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        spool_dir = os.path.join(directory.name, 'spool')
+        overrides = override_settings(
+            MEDIA_ROOT=directory.name, AUDIO_UPLOAD_SPOOL_DIR=spool_dir, AUDIO_UPLOAD_CHUNK_BYTES=4
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        user = get_user_model().objects.create_user(username='alice', email='alice@example.com', password='pw')
+        course = Course.objects.create(user=user, title='Biology')
+        note = Note.objects.create(user=user, course=course, title='Lecture')
+        self.data = b'0123456789abcdef'
+        self.session = start_upload_session(user, note, 'lecture.webm', len(self.data))
+
+    def _append(self, offset, data, length=None):
+        return append_upload_chunk(self.session.id, io.BytesIO(data), offset, length or len(data))
+
+    def _spool(self):
+        with open(self.session.spool_path, 'rb') as spool:
+            return spool.read()
+
+    def test_chunks_resume_after_interruptions_and_repeats(self):
+        self._append(0, self.data[:6])
+        # The body ended after 2 of the 6 declared bytes
+        self.assertEqual(self._append(6, self.data[6:8], length=6).received_bytes, 8)
+        self.assertEqual(self._append(0, self.data[:6]).received_bytes, 8)
+        with self.assertRaises(UploadRangeError):
+            self._append(12, self.data[12:])
+
+        self._append(8, self.data[8:])
+        self.assertEqual(self._spool(), self.data)
+        self.assertEqual(complete_upload_session(self.session).size, len(self.data))
+        with self.assertRaises(UploadRangeError):
+            complete_upload_session(self.session)
+
+    def test_a_chunk_racing_another_request_is_rejected(self):
+        class RacingStream(io.BytesIO):
+            # Another request for the same range commits while this body is read
+            def read(stream, size=-1):
+                if stream.tell() == 0:
+                    AudioUploadSession.objects.filter(id=self.session.id).update(received_bytes=4)
+                return super().read(size)
+
+        with self.assertRaises(UploadRangeError):
+            append_upload_chunk(self.session.id, RacingStream(b'wxyz!!'), 0, 6)
+        self.assertEqual(self._spool(), b'')
+        spool_dir = os.path.dirname(self.session.spool_path)
+        self.assertEqual(os.listdir(spool_dir), [os.path.basename(self.session.spool_path)])
+
+    @override_settings(AUDIO_UPLOAD_SESSION_EXPIRY_SECONDS=60)
+    def test_abandoned_sessions_and_orphaned_spools_expire(self):
+        self._append(0, self.data[:6])
+        orphan = os.path.join(os.path.dirname(self.session.spool_path), 'not-a-session.part')
+        open(orphan, 'wb').close()
+        an_hour_ago = time.time() - 3600
+        for path in (orphan, self.session.spool_path):
+            os.utime(path, (an_hour_ago, an_hour_ago))
+
+        self.assertEqual(expire_upload_sessions(), 0)
+        self.assertTrue(os.path.exists(self.session.spool_path))
+        self.assertFalse(os.path.exists(orphan))
+
+        AudioUploadSession.objects.filter(id=self.session.id).update(
+            updated_at=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(expire_upload_sessions(), 1)
+        self.assertFalse(os.path.exists(self.session.spool_path))
+
+
+class AudioBlobTests(TestCase):
+
+    def setUp(self):
+        from courses.models import Course
+        from notes.models import Note
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = override_settings(MEDIA_ROOT=directory.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        user = get_user_model().objects.create_user(username='alice', email='alice@example.com', password='pw')
+        course = Course.objects.create(user=user, title='Biology')
+        self.first, self.second = (
+            Note.objects.create(user=user, course=course, title=title) for title in ('Lecture 1', 'Lecture 2')
+        )
+
+    def _attach(self, note):
+        save_file = lambda name: default_storage.save(name, ContentFile(b'audio'))
+        return attach_audio(note, 'a' * 64, 5, 'lecture.webm', save_file)
+
+    def test_a_blob_released_during_attach_is_stored_again(self):
+        self._attach(self.first)
+        stored_blob = blobs._stored_blob
+
+        def release_first(*args):
+            # The only other reference goes away between the lookup and the increment
+            blob = stored_blob(*args)
+            type(self.first).objects.filter(id=self.first.id).delete()
+            return blob
+
+        with mock.patch.object(blobs, '_stored_blob', side_effect=release_first):
+            blob = self._attach(self.second)
+
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+        self.assertTrue(default_storage.exists(blob.file_path))
+        self.second.refresh_from_db()
+        self.assertEqual(self.second.audio_blob_id, blob.id)
+
+
+class NoteEventTests(TestCase):
+
+    def setUp(self):
+        from courses.models import Course
+        from notes.models import Note
+
+        user = get_user_model().objects.create_user(username='alice', email='alice@example.com', password='pw')
+        course = Course.objects.create(user=user, title='Biology')
+        self.note = Note.objects.create(user=user, course=course, title='Lecture', raw_content='Text')
+
+    def _watched_event(self):
+        # Loaded the way the database watcher of another process loads it
+        from notes.models import Note
+
+        return note_event(with_event_fields(Note.objects.filter(id=self.note.id)).get())
+
+    def test_progress_is_read_from_the_note_row(self):
+        self.note.processing_status = 'transcribing'
+        self.note.raw_content = 'Cells divide by mitosis.'
+        self.note.save()
+
+        event = self._watched_event()
+        self.assertEqual(event, note_event(self.note))
+        self.assertEqual(event['stage'], 'transcription')
+        self.assertEqual(event['transcript_chars'], 24)
+
+    def test_failures_carry_their_error(self):
+        enqueue_note_processing(self.note)
+        job = claim_job('worker-1')
+        job.attempts = job.max_attempts
+        fail_job(job, ValueError('No raw content to process'))
+
+        event = self._watched_event()
+        self.assertEqual(event['processing_status'], 'failed')
+        self.assertEqual(event['error'], 'No raw content to process')
+
+
+
+@override_settings(AI_USER_MAX_CONCURRENCY=100, AI_JOB_MAX_ATTEMPTS=2, AI_JOB_RETRY_BACKOFF_SECONDS=60)
+class JobQueueTests(TestCase):
+
+    def setUp(self):
+        from courses.models import Course
+        from notes.models import Note
+
+        user = get_user_model().objects.create_user(username='alice', email='alice@example.com', password='pw')
+        course = Course.objects.create(user=user, title='Biology')
+        self.notes = [
+            Note.objects.create(user=user, course=course, title=f'Lecture {index}', raw_content='Text')
+            for index in range(2)
+        ]
+
+    def test_each_job_is_claimed_once(self):
+        for note in self.notes:
+            enqueue_note_processing(note)
+
+        first, second = claim_job('worker-1'), claim_job('worker-2')
+
+        self.assertNotEqual(first.id, second.id)
+        self.assertEqual((first.locked_by, second.locked_by), ('worker-1', 'worker-2'))
+        self.assertIsNone(claim_job('worker-3'))
+
+    def test_expired_leases_pass_to_another_worker(self):
+        enqueue_note_processing(self.notes[0])
+        stale = claim_job('worker-1')
+        AIJob.objects.filter(id=stale.id).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+        current = claim_job('worker-2')
+        self.assertEqual((current.id, current.attempts), (stale.id, 2))
+
+        # The first worker finishing late must not close the second worker's run
+        self.assertFalse(complete_job(stale))
+        self.assertFalse(fail_job(stale, ValueError('late')))
+        self.assertEqual(AIJob.objects.get(id=stale.id).locked_by, 'worker-2')
+        self.assertTrue(complete_job(current))
+        self.assertEqual(AIJob.objects.get(id=stale.id).status, 'succeeded')
+
+    def test_failures_are_retried_with_backoff_until_attempts_run_out(self):
+        enqueue_note_processing(self.notes[0])
+        fail_job(claim_job('worker-1'), ValueError('timeout'))
+
+        job = AIJob.objects.get()
+        self.assertEqual(job.status, 'queued')
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=50))
+        self.assertIsNone(claim_job('worker-1'))
+
+        AIJob.objects.update(run_after=timezone.now())
+        fail_job(claim_job('worker-1'), ValueError('timeout again'))
+
+        job.refresh_from_db()
+        self.notes[0].refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertEqual(self.notes[0].processing_status, 'failed')
+        self.assertEqual(self.notes[0].processing_error, 'timeout again')
+
+@override_settings(AI_CHUNK_TOKENS=300, AI_MAP_CONCURRENCY=4, OPENAI_RATE_LIMIT_RPS=10000)
+class MapReduceGenerationTests(SimpleTestCase):
+
+    def setUp(self):
+        # Pick up the test rate limit instead of pacing calls like production
+        reset_governors()
+        self.addCleanup(reset_governors)
+
+    def test_short_content_uses_single_pass(self):
+        client = FakeChatClient()
+        result = generate_ai_content('A short lecture.', client=client, mode='parallel')
+        self.assertEqual(len(client.calls), 2)
+        self.assertIsInstance(result['key_points'], list)
+
+    def test_long_content_is_mapped_then_reduced(self):
+        client = FakeChatClient()
+        text = _transcript(20)
+        chunks = split_into_chunks(text, 300)
+
+        result = generate_ai_content(text, client=client, mode='sequential')
+
+        map_calls = [c for c in client.calls if 'Content:' in c[1]['content']]
+        reduce_calls = [c for c in client.calls if 'consecutive sections' in c[1]['content']]
+        self.assertEqual(len(map_calls), 2 * len(chunks))
+        self.assertGreaterEqual(len(reduce_calls), 2)
+        self.assertIsInstance(result['key_points'], list)
+        self.assertTrue(result['detailed_notes'])
+
+    def test_map_concurrency_is_bounded(self):
+        client = FakeChatClient(delay=0.02)
+        generate_ai_content(_transcript(20), client=client, mode='sequential', max_workers=3)
+        self.assertLessEqual(client.peak_in_flight, 3)
+        self.assertGreater(client.peak_in_flight, 1)
+
+    def test_throughput_scales_with_concurrency(self):
+        text = _transcript(20)
+
+        started = time.perf_counter()
+        generate_ai_content(text, client=FakeChatClient(delay=0.02), mode='sequential', max_workers=1)
+        serial = time.perf_counter() - started
+
+        started = time.perf_counter()
+        generate_ai_content(text, client=FakeChatClient(delay=0.02), mode='sequential', max_workers=4)
+        concurrent = time.perf_counter() - started
+
+        self.assertLess(concurrent, serial * 0.6)
+
+
+class FakeProviderTests(SimpleTestCase):
+
+    def test_fake_llm_is_deterministic_per_seed(self):
+        def run(seed):
+            client = FakeLLMClient(LatencyModel(0), output_tokens=50, seed=seed)
+            return generate_ai_content('A short lecture.', client=client, mode='sequential')
+
+        self.assertEqual(run(1), run(1))
+        self.assertNotEqual(run(1), run(2))
+
+    def test_fake_llm_output_size_is_capped_by_max_tokens(self):
+        client = FakeLLMClient(LatencyModel(0), output_tokens=10 ** 6)
+        response = client.chat.completions.create(
+            model='fake', messages=[{'role': 'user', 'content': 'hi'}], max_tokens=100
+        )
+        self.assertLessEqual(response.usage.completion_tokens, 100)
+
+    def test_fake_speech_injects_errors_at_the_configured_rate(self):
+        client = FakeSpeechClient(LatencyModel(0), error_rate=0.3, seed=3)
+        audio = SimpleNamespace(content=b'\0' * 32000 * 30)
+        config = speech.RecognitionConfig(
+            encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16, sample_rate_hertz=16000
+        )
+        errors = 0
+        for _ in range(200):
+            try:
+                response = client.recognize(config=config, audio=audio)
+            except google_exceptions.ServiceUnavailable:
+                errors += 1
+            else:
+                self.assertEqual(len(response.results), 2)
+        self.assertTrue(40 <= errors <= 80)
+
+
+@override_settings(METRICS_DIR='')
+class MetricsTests(SimpleTestCase):
+
+    def setUp(self):
+        for metric in metrics.REGISTRY:
+            metric.reset()
+
+    def test_stage_timer_records_duration_and_error_type(self):
+        with metrics.stage_timer('key_points'):
+            pass
+        with self.assertRaises(ValueError):
+            with metrics.stage_timer('key_points'):
+                raise ValueError('bad')
+
+        text = metrics.render_metrics()
+        self.assertIn('sapphire_stage_duration_seconds_count{stage="key_points"} 2', text)
+        self.assertIn('sapphire_stage_duration_seconds_bucket{stage="key_points",le="+Inf"} 2', text)
+        self.assertIn('sapphire_stage_errors_total{stage="key_points",error="ValueError"} 1', text)
+
+    def test_snapshots_of_all_processes_are_summed(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            metrics.STAGE_BYTES.inc(100, stage='upload', direction='in')
+            metrics.STAGE_DURATION.observe(0.2, stage='upload')
+            # Another process's file
+            metrics._write_snapshot(os.path.join(directory, '1-other.json'))
+            for metric in metrics.REGISTRY:
+                metric.reset()
+            metrics.STAGE_BYTES.inc(50, stage='upload', direction='in')
+            metrics.STAGE_DURATION.observe(2.0, stage='upload')
+
+            text = metrics.render_metrics()
+        self.assertIn('sapphire_stage_bytes_total{stage="upload",direction="in"} 150', text)
+        self.assertIn('sapphire_stage_duration_seconds_bucket{stage="upload",le="0.25"} 1', text)
+        self.assertIn('sapphire_stage_duration_seconds_count{stage="upload"} 2', text)
+
+    def test_snapshots_of_exited_processes_are_folded(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            metrics.STAGE_BYTES.inc(100, stage='upload', direction='in')
+            # pid_max is at most 2**22, so these processes cannot be running
+            metrics._write_snapshot(os.path.join(directory, f'{2 ** 22 + 1}-exited.json'))
+            metrics._write_snapshot(os.path.join(directory, f'{2 ** 22 + 2}-exited.json'))
+            for metric in metrics.REGISTRY:
+                metric.reset()
+            metrics.STAGE_BYTES.inc(5, stage='upload', direction='in')
+
+            first = metrics.render_metrics()
+            files = sorted(os.listdir(directory))
+            second = metrics.render_metrics()
+        expected = 'sapphire_stage_bytes_total{stage="upload",direction="in"} 205'
+        self.assertIn(expected, first)
+        self.assertIn(expected, second)
+        self.assertEqual({name for name in files if name.endswith('.json')},
+                         {metrics.AGGREGATE_FILE, metrics._flusher.file_name})
+
+
+
+@override_settings(METRICS_DIR='', AI_CACHE_ENABLED=True)
+class AIResultCacheTests(TestCase):
+
+    def setUp(self):
+        for metric in metrics.REGISTRY:
+            metric.reset()
+
+    def test_hits_return_and_count_the_tokens_of_the_cached_result(self):
+        args = ('Transcript', 'v1:parallel', 'gpt-test', 0.3)
+        self.assertIsNone(get_cached_result(*args))
+        store_result(*args, {'key_points': ['A'], 'detailed_notes': 'B', 'prompt_tokens': 900,
+                             'completion_tokens': 300})
+
+        cached = get_cached_result(*args)
+
+        self.assertEqual((cached['prompt_tokens'], cached['completion_tokens']), (900, 300))
+        text = metrics.render_metrics()
+        for line in ('sapphire_ai_cache_total{event="miss"} 1', 'sapphire_ai_cache_total{event="store"} 1',
+                     'sapphire_ai_cache_total{event="hit"} 1',
+                     'sapphire_llm_tokens_cached_total{kind="prompt"} 900'):
+            self.assertIn(line, text)
+        self.assertNotIn('sapphire_llm_tokens_total{kind="prompt"}', text)
+
+@override_settings(AI_STREAM_CHECKPOINT_SECONDS=0, OPENAI_RATE_LIMIT_RPS=10000)
+class StreamingGenerationTests(SimpleTestCase):
+
+    def setUp(self):
+        reset_governors()
+        self.addCleanup(reset_governors)
+
+    def test_partial_detailed_notes_arrive_before_completion(self):
+        client = FakeLLMClient(LatencyModel(0.05, per_unit=0.001), output_tokens=200)
+        partials = []
+        started = time.perf_counter()
+
+        def on_partial(text):
+            partials.append((time.perf_counter() - started, text))
+
+        result = generate_ai_content('A short lecture.', client=client, mode='parallel', on_partial=on_partial)
+        finished = time.perf_counter() - started
+
+        self.assertGreater(len(partials), 1)
+        self.assertLess(partials[0][0], finished / 2)
+        self.assertTrue(result['detailed_notes'].startswith(partials[-1][1].strip()[:50]))
+        self.assertIsInstance(result['key_points'], list)
+        self.assertTrue(result['key_points'])
+
+    def test_streamed_usage_is_recorded(self):
+        usage = TokenUsage()
+        client = usage.wrap(FakeLLMClient(LatencyModel(0), output_tokens=100))
+        generate_ai_content('A short lecture.', client=client, mode='sequential', on_partial=lambda text: None)
+        self.assertEqual(usage.calls, 2)
+        self.assertGreater(usage.completion_tokens, 0)
+
+
+class AudioSegmentationTests(SimpleTestCase):
+
+    def test_split_points_land_in_silence(self):
+        sample_rate = 1000
+        pcm = np.full(sample_rate * 25, 5000, dtype=np.int16)
+        pcm[8000:8500] = 0
+        pcm[17000:17500] = 0
+        points = find_split_points(pcm, sample_rate, target_seconds=10, search_seconds=4)
+        self.assertEqual(len(points), 2)
+        self.assertTrue(8000 <= points[0] < 8500)
+        self.assertTrue(17000 <= points[1] < 17500)
+
+    def test_segments_cover_audio_with_overlap(self):
+        pcm = np.arange(100, dtype=np.int16)
+        segments = split_segments(pcm, [40, 70], overlap_samples=5)
+        self.assertEqual([len(segment) for segment in segments], [45, 35, 30])
+        self.assertEqual(segments[-1][-1], 99)
+
+    def test_stitching_drops_repeated_boundary_words(self):
+        parts = ['The cell uses ATP for', 'ATP for energy. Mitochondria', 'mitochondria make it.']
+        self.assertEqual(
+            stitch_transcripts(parts),
+            'The cell uses ATP for energy. Mitochondria make it.'
+        )
+
+
+class AudioFormatTests(SimpleTestCase):
+
+    def _write(self, data, suffix):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(data)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_headers_are_sniffed(self):
+        streaminfo = b'\x00' * 10 + ((44100 << 4) | (1 << 1)).to_bytes(3, 'big') + b'\x00' * 13
+        flac = self._write(b'fLaC\x80\x00\x00\x22' + streaminfo, '.flac')
+        webm = self._write(b'\x1a\x45\xdf\xa3' + b'\x00' * 40 + b'A_OPUS', '.webm')
+        m4a = self._write(b'\x00\x00\x00\x20ftypM4A ', '.m4a')
+
+        self.assertEqual(tuple(sniff_audio_format(flac)), ('flac', 'FLAC', 44100, 2))
+        self.assertEqual(sniff_audio_format(webm).encoding, 'WEBM_OPUS')
+        self.assertIsNone(sniff_audio_format(m4a).encoding)
+
+    @override_settings(FFMPEG_BINARY='missing-ffmpeg')
+    def test_stereo_wav_is_downmixed_and_resampled(self):
+        samples = (np.sin(np.arange(48000) / 10) * 8000).astype('<i2')
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav:
+            wav.setnchannels(2)
+            wav.setsampwidth(2)
+            wav.setframerate(48000)
+            wav.writeframes(np.repeat(samples, 2).tobytes())
+        path = self._write(buffer.getvalue(), '.wav')
+
+        prepared = prepare_audio(path)
+        self.addCleanup(os.remove, prepared.path)
+
+        self.assertEqual(tuple(sniff_audio_format(prepared.path)), ('wav', 'LINEAR16', 16000, 1))
+        self.assertEqual(prepared.original_format.channels, 2)
+        self.assertLess(prepared.bytes, prepared.original_bytes / 5)
+
+    @override_settings(FFMPEG_BINARY='missing-ffmpeg')
+    def test_mode_follows_duration_not_size(self):
+        # 70 s of 8 kHz WAV is only 1.1 MB, but too long for synchronous recognition
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(8000)
+            wav.writeframes(b'\x00\x00' * 8000 * 70)
+        wav_path = self._write(buffer.getvalue(), '.wav')
+        # Ten minutes of 16 kHz mono FLAC by its STREAMINFO, in a few bytes
+        streaminfo = b'\x00' * 10 + ((16000 << 44) | (15 << 36) | (16000 * 600)).to_bytes(8, 'big') + b'\x00' * 16
+        flac_path = self._write(b'fLaC\x80\x00\x00\x22' + streaminfo, '.flac')
+        webm_path = self._write(b'\x1a\x45\xdf\xa3' + b'\x00' * 40 + b'A_OPUS', '.webm')
+
+        self.assertAlmostEqual(audio_duration(wav_path), 70.0)
+        self.assertAlmostEqual(audio_duration(flac_path), 600.0)
+        self.assertIsNone(audio_duration(webm_path))
+        self.assertEqual(_transcription_mode(wav_path), 'streaming')
+        self.assertEqual(_transcription_mode(flac_path), 'long_running')
+        self.assertEqual(_transcription_mode(flac_path, seconds=30), 'sync')
+        # Without a duration the size limits still apply
+        self.assertEqual(_transcription_mode(webm_path), 'sync')
+
+
+class VoiceActivityTests(SimpleTestCase):
+    rate = 16000
+
+    def _recording(self):
+        rng = np.random.default_rng(0)
+        speech = (np.sin(np.arange(2 * self.rate) * 0.3) * 6000).astype(np.int16)
+        silence = rng.normal(0, 20, 4 * self.rate).astype(np.int16)
+        return np.concatenate([silence[:2 * self.rate], speech, silence, speech])
+
+    def _wav(self):
+        fd, path = tempfile.mkstemp(suffix='.wav')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        with wave.open(path, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.rate)
+            wav.writeframes(self._recording().tobytes())
+        return path
+
+    def test_long_silences_are_dropped_with_padding(self):
+        spans = detect_speech(self._recording(), self.rate, padding_seconds=0.2, min_silence_seconds=1.0)
+
+        self.assertEqual(len(spans), 2)
+        (first_start, first_end), (second_start, second_end) = spans
+        self.assertAlmostEqual(first_start / self.rate, 1.8, delta=0.05)
+        self.assertAlmostEqual(first_end / self.rate, 4.2, delta=0.05)
+        self.assertAlmostEqual(second_start / self.rate, 7.8, delta=0.05)
+        self.assertEqual(second_end, 10 * self.rate)
+
+    @override_settings(FFMPEG_BINARY='missing-ffmpeg')
+    def test_recordings_are_analysed_and_cut_block_by_block(self):
+        pcm = self._recording()
+        # Blocks that end mid-frame
+        blocks = list(iter_pcm(self._wav(), self.rate, block_seconds=0.7013))
+        self.assertGreater(len(blocks), 10)
+        self.assertTrue(np.array_equal(np.concatenate(blocks), pcm))
+
+        features = frame_features(blocks, int(self.rate * 0.02))
+        self.assertEqual(speech_spans(features, 0.2, 1.0), detect_speech(pcm, self.rate, 0.2, 1.0))
+        points = quiet_points(features, self.rate, target_seconds=3, search_seconds=1)
+        self.assertEqual(points, find_split_points(pcm, self.rate, target_seconds=3, search_seconds=1))
+
+        ranges = segment_ranges(points, len(pcm), overlap_samples=800)
+        segments = list(pcm_ranges(iter(blocks), ranges))
+        expected = split_segments(pcm, points, overlap_samples=800)
+        self.assertEqual(len(segments), len(expected))
+        self.assertTrue(all(np.array_equal(got, want) for got, want in zip(segments, expected)))
+
+    def test_offsets_map_back_to_the_original(self):
+        pcm = self._recording()
+        offsets = SpeechOffsets(detect_speech(pcm, self.rate, 0.2, 1.0), self.rate, len(pcm))
+
+        self.assertAlmostEqual(offsets.speech_ratio, 4.6 / 10, delta=0.02)
+        # One second into the speech-only audio, and one second into the second range
+        self.assertAlmostEqual(offsets.to_original(1.0), 2.8, delta=0.05)
+        self.assertAlmostEqual(offsets.to_original(3.4), 8.8, delta=0.05)
+
+    @override_settings(FFMPEG_BINARY='missing-ffmpeg', METRICS_DIR='')
+    def test_transcript_timings_follow_the_original_recording(self):
+        prepared = prepare_audio(self._wav(), strip_silence=True)
+        self.addCleanup(os.remove, prepared.path)
+        timings = []
+        client = FakeSpeechClient(LatencyModel(0), result_seconds=2)
+        with mock.patch('ai_services.services.get_speech_client', return_value=client):
+            transcript = transcribe_audio_google(
+                prepared.path, mode='sync', audio_format=prepared.format, timings=timings
+            )
+
+        timings = _original_timings(timings, prepared)
+        self.assertEqual([offset for offset, _ in timings][0], 0)
+        self.assertTrue(all(transcript[offset - 1] == ' ' for offset, _ in timings[1:]))
+        # With 0.3 s of padding, speech is kept from 1.7-4.3 s and 7.7-10 s; results
+        # start 0, 2 and 4 s into it
+        self.assertEqual(len(timings), 3)
+        for (_, seconds), expected in zip(timings, (1.7, 3.7, 9.1)):
+            self.assertAlmostEqual(seconds, expected, delta=0.05)
+
+    @override_settings(FFMPEG_BINARY='missing-ffmpeg')
+    def test_trimmed_audio_is_only_used_when_smaller(self):
+        path = self._wav()
+
+        prepared = prepare_audio(path, strip_silence=True)
+        self.addCleanup(os.remove, prepared.path)
+        self.assertIsNotNone(prepared.offsets)
+        self.assertLess(prepared.bytes, prepared.original_bytes)
+
+        # A re-encoding larger than the upload (e.g. FLAC of an Opus recording) is thrown away
+        def encode_larger(blocks, output_path):
+            with open(output_path, 'wb') as output:
+                output.write(b'\x00' * (prepared.original_bytes + 1))
+            return AudioFormat('flac', 'FLAC', self.rate, 1)
+
+        with mock.patch('ai_services.audio.encode_pcm_file', side_effect=encode_larger):
+            prepared = prepare_audio(path, strip_silence=True)
+        self.assertIsNone(prepared.offsets)
+        self.assertEqual(prepared.path, path)
+
+    @override_settings(
+        FFMPEG_BINARY='missing-ffmpeg', METRICS_DIR='', SPEECH_PARALLEL_START_METHOD='fork',
+        SPEECH_SEGMENT_SECONDS=4.0, SPEECH_SEGMENT_SEARCH_SECONDS=1.0, SPEECH_SEGMENT_OVERLAP_SECONDS=0.0
+    )
+    def test_parallel_transcription_records_the_bytes_uploaded(self):
+        path = self._wav()
+        for metric in metrics.REGISTRY:
+            metric.reset()
+
+        timings = []
+        transcript = transcribe_audio_parallel(path, recognizer=_segment_size, workers=2, timings=timings)
+
+        sizes = [int(part.split('-')[1]) for part in transcript.split()]
+        self.assertGreater(len(sizes), 1)
+        parts = transcript.split()
+        starts = [sum(len(part) + 1 for part in parts[:index]) for index in range(len(parts))]
+        self.assertEqual([offset for offset, _ in timings], starts)
+        self.assertEqual(timings[0][1], 0)
+        self.assertIn(
+            f'sapphire_stage_bytes_total{{stage="transcription",direction="in"}} {sum(sizes)}',
+            metrics.render_metrics()
+        )
+
+
+    @override_settings(
+        FFMPEG_BINARY='missing-ffmpeg', METRICS_DIR='', SPEECH_PARALLEL_START_METHOD='fork',
+        SPEECH_SEGMENT_SECONDS=4.0, SPEECH_SEGMENT_SEARCH_SECONDS=1.0, SPEECH_INLINE_MAX_BYTES=1024
+    )
+    def test_long_local_recordings_are_never_sent_inline(self):
+        client = FakeSpeechClient(LatencyModel(0))
+        with mock.patch('ai_services.services.get_speech_client', return_value=client), \
+                mock.patch.object(client, 'long_running_recognize') as long_running_recognize:
+            self.assertTrue(transcribe_audio_google(self._wav(), mode='long_running'))
+
+            fd, webm = tempfile.mkstemp(suffix='.webm')
+            self.addCleanup(os.remove, webm)
+            with os.fdopen(fd, 'wb') as audio_file:
+                audio_file.write(b'\x1a\x45\xdf\xa3' + b'\x00' * 2048)
+            with self.assertRaisesRegex(Exception, 'inline limit'):
+                transcribe_audio_google(webm, mode='long_running')
+        long_running_recognize.assert_not_called()
+
+class JobPriorityTests(TestCase):
+
+    def setUp(self):
+        from courses.models import Course
+        from notes.models import Note
+
+        User = get_user_model()
+        self.notes = {}
+        for name in ('alice', 'bob'):
+            user = User.objects.create_user(username=name, email=f'{name}@example.com', password='pw')
+            course = Course.objects.create(user=user, title='Biology')
+            self.notes[name] = Note.objects.create(user=user, course=course, title='Lecture', raw_content='Text')
+
+    def _queue(self, name, priority, count):
+        AIJob.objects.bulk_create(
+            AIJob(note=self.notes[name], job_type='process_note', priority=priority) for _ in range(count)
+        )
+
+    @override_settings(AI_USER_MAX_CONCURRENCY=100)
+    def test_classes_share_claims_by_weight(self):
+        self._queue('alice', 'batch', 20)
+        self._queue('alice', 'interactive', 20)
+
+        claimed = []
+        for index in range(9):
+            job = claim_job(f'worker-{index}')
+            claimed.append(job.priority)
+            complete_job(job)
+
+        self.assertEqual(claimed[0], 'interactive')
+        self.assertEqual(claimed.count('interactive'), 8)
+        self.assertEqual(claimed.count('batch'), 1)
+
+    @override_settings(AI_USER_MAX_CONCURRENCY=1)
+    def test_user_concurrency_is_capped(self):
+        self._queue('alice', 'interactive', 3)
+        self._queue('bob', 'batch', 1)
+
+        first = claim_job('worker-1')
+        second = claim_job('worker-2')
+
+        self.assertEqual(first.note.user.username, 'alice')
+        self.assertEqual(second.note.user.username, 'bob')
+        self.assertIsNone(claim_job('worker-3'))
+
+    @override_settings(AI_USER_MAX_CONCURRENCY=1)
+    def test_user_cap_holds_when_the_prefilter_is_stale(self):
+        self._queue('alice', 'interactive', 2)
+
+        # As if another claim for alice committed after this one read who is at capacity
+        with mock.patch('ai_services.jobs._users_at_capacity', return_value=[]):
+            self.assertIsNotNone(claim_job('worker-1'))
+            self.assertIsNone(claim_job('worker-2'))
+
+
+@override_settings(AI_CHUNK_TOKENS=300, AI_SEGMENT_TOKENS=150, AI_GENERATION_MODE='sequential')
+class IncrementalGenerationTests(TestCase):
+
+    def setUp(self):
+        from courses.models import Course
+        from notes.models import Note
+
+        reset_governors()
+        self.addCleanup(reset_governors)
+        user = get_user_model().objects.create_user(username='alice', email='alice@example.com', password='pw')
+        course = Course.objects.create(user=user, title='Biology')
+        self.note = Note.objects.create(user=user, course=course, title='Lecture', raw_content=_transcript(12))
+
+    @staticmethod
+    def _map_calls(client):
+        return [call for call in client.calls if 'Content:' in call[1]['content']]
+
+    def test_notes_within_one_chunk_skip_segments(self):
+        self.note.raw_content = _transcript(1, 5)
+        client = FakeChatClient()
+
+        self.assertIsNone(generate_ai_content_incremental(self.note, client=client))
+        self.assertEqual(client.calls, [])
+        self.assertFalse(NoteSegment.objects.filter(note=self.note).exists())
+
+    def test_first_processing_stores_segments_and_edits_reuse_them(self):
+        client = FakeChatClient()
+        generate_ai_content_incremental(self.note, client=client)
+        segments = NoteSegment.objects.filter(note=self.note).count()
+        self.assertGreater(segments, 2)
+        self.assertEqual(len(self._map_calls(client)), 2 * segments)
+
+        self.note.raw_content = self.note.raw_content.replace(
+            'Paragraph 5 sentence 3 about cell biology.', 'Paragraph 5 sentence 3 about mitosis.'
+        )
+        client = FakeChatClient()
+        result = generate_ai_content_incremental(self.note, client=client)
+
+        # Only the edited segment (and at most its neighbour) is summarized again
+        self.assertLessEqual(len(self._map_calls(client)), 4)
+        self.assertTrue(result['detailed_notes'])
+
+    def test_segments_are_not_reused_across_models(self):
+        generate_ai_content_incremental(self.note, client=FakeChatClient())
+        segments = NoteSegment.objects.filter(note=self.note).count()
+
+        client = FakeChatClient()
+        with override_settings(OPENAI_MODEL='another-model'):
+            generate_ai_content_incremental(self.note, client=client)
+        self.assertEqual(len(self._map_calls(client)), 2 * segments)
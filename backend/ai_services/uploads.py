@@ -0,0 +1,279 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from django.utils import timezone
+
+from .blobs import attach_audio
+from .metrics import record_bytes, stage_timer
+from .models import AudioUploadSession
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+UNFINISHED_STATUSES = ('uploading', 'finalizing')
+# Abandoned sessions are looked for at most this often, when a session starts
+CLEANUP_INTERVAL_SECONDS = 600
+
+_next_cleanup = 0.0
+
+
+class UploadRangeError(Exception):
+    """
+    A chunk does not continue the bytes received so far
+    """
+
+    def __init__(self, message, received_bytes):
+        super().__init__(message)
+        self.received_bytes = received_bytes
+
+
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Spool uploads to a temporary file while computing their SHA-256 and size.
+
+    Uploads larger than ``max_bytes`` are skipped as soon as the limit is
+    crossed and flagged on ``rejected``, so the payload is never held in
+    memory and oversized files never finish spooling.
+    """
+
+    def __init__(self, request=None, max_bytes=None):
+        super().__init__(request)
+        self.chunk_size = settings.AUDIO_UPLOAD_CHUNK_BYTES
+        self.max_bytes = max_bytes or settings.AUDIO_UPLOAD_MAX_BYTES
+        self.rejected = False
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Refuse early when the declared body cannot fit; the multipart
+        # overhead allowance covers the boundaries and form fields
+        if content_length and content_length > self.max_bytes + 64 * 1024:
+            self.rejected = True
+        return None
+
+    def new_file(self, *args, **kwargs):
+        if self.rejected:
+            raise SkipFile()
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > self.max_bytes:
+            self.rejected = True
+            raise SkipFile()
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        uploaded_file.content_hash = self.hasher.hexdigest()
+        return uploaded_file
+
+
+def start_upload_session(user, note, file_name, total_size):
+    """
+    Create a resumable upload session with an empty spool file
+    """
+    global _next_cleanup
+    if time.monotonic() >= _next_cleanup:
+        _next_cleanup = time.monotonic() + CLEANUP_INTERVAL_SECONDS
+        expire_upload_sessions()
+
+    os.makedirs(settings.AUDIO_UPLOAD_SPOOL_DIR, exist_ok=True)
+    session = AudioUploadSession(user=user, note=note, file_name=file_name, total_size=total_size)
+    session.spool_path = os.path.join(settings.AUDIO_UPLOAD_SPOOL_DIR, f"{session.id}.part")
+    open(session.spool_path, 'wb').close()
+    session.save()
+    return session
+
+
+def _already_received(session, offset, length):
+    """
+    Whether a chunk repeats stored bytes; raises UploadRangeError if it cannot be appended
+    """
+    if session.status != 'uploading':
+        raise UploadRangeError('Upload has already been finalized', session.received_bytes)
+    if offset + length <= session.received_bytes:
+        return True
+    if offset != session.received_bytes:
+        raise UploadRangeError(
+            f'Expected a chunk starting at byte {session.received_bytes}', session.received_bytes
+        )
+    if offset + length > session.total_size:
+        raise UploadRangeError('Chunk extends past the declared file size', session.received_bytes)
+    return False
+
+
+@contextmanager
+def _locked_spool(path):
+    """
+    Spool file opened for writing, locked against other requests of the session
+    """
+    with open(path, 'r+b') as spool:
+        if fcntl is not None:
+            fcntl.flock(spool, fcntl.LOCK_EX)
+        yield spool
+
+
+def append_upload_chunk(session_id, stream, offset, length):
+    """
+    Append ``length`` bytes read from ``stream`` at ``offset`` to the spool file.
+
+    Chunks must continue exactly where the received prefix ends; a repeat of
+    an already stored range is accepted and ignored. The body is first read
+    into a file of its own with nothing locked, then appended under a lock on
+    the spool file, and ``received_bytes`` only advances if it still equals
+    ``offset``. If the request body ends early, whatever arrived is kept and
+    the client can resume from the new ``received_bytes``.
+    """
+    session = AudioUploadSession.objects.get(id=session_id)
+    if _already_received(session, offset, length):
+        return session
+
+    fd, chunk_path = tempfile.mkstemp(
+        dir=os.path.dirname(session.spool_path), prefix=f"{session.id}.", suffix='.chunk'
+    )
+    try:
+        with stage_timer('upload_chunk'):
+            written = 0
+            with os.fdopen(fd, 'wb') as chunk:
+                while written < length:
+                    data = stream.read(min(settings.AUDIO_UPLOAD_CHUNK_BYTES, length - written))
+                    if not data:
+                        break
+                    chunk.write(data)
+                    written += len(data)
+            if not written:
+                return session
+
+            with _locked_spool(session.spool_path) as spool:
+                session.refresh_from_db(fields=['status', 'received_bytes'])
+                if _already_received(session, offset, written):
+                    return session
+                # Discard any tail left behind by an interrupted request
+                spool.seek(offset)
+                spool.truncate()
+                with open(chunk_path, 'rb') as chunk:
+                    shutil.copyfileobj(chunk, spool, settings.AUDIO_UPLOAD_CHUNK_BYTES)
+                spool.flush()
+                claimed = AudioUploadSession.objects.filter(
+                    id=session.id, status='uploading', received_bytes=offset
+                ).update(received_bytes=offset + written, updated_at=timezone.now())
+                if not claimed:
+                    session.refresh_from_db(fields=['received_bytes'])
+                    raise UploadRangeError(
+                        f'Expected a chunk starting at byte {session.received_bytes}', session.received_bytes
+                    )
+    finally:
+        os.remove(chunk_path)
+
+    session.received_bytes = offset + written
+    record_bytes('upload', written)
+    return session
+
+
+def complete_upload_session(session):
+    """
+    Attach a fully received spool file to the session's note.
+
+    The session moves to ``finalizing`` first, so a concurrent finalize
+    request fails instead of attaching the recording twice; it returns to
+    ``uploading`` if storing fails. The spool is only moved into storage if
+    no identical recording is stored already. Returns the audio blob.
+    """
+    claimed = AudioUploadSession.objects.filter(
+        id=session.id, status='uploading', received_bytes=session.total_size
+    ).update(status='finalizing', updated_at=timezone.now())
+    if not claimed:
+        session.refresh_from_db(fields=['status', 'received_bytes'])
+        if session.status != 'uploading':
+            raise UploadRangeError('Upload has already been finalized', session.received_bytes)
+        raise UploadRangeError('Upload is incomplete', session.received_bytes)
+
+    try:
+        hasher = hashlib.sha256()
+        with stage_timer('upload_finalize'), open(session.spool_path, 'rb') as spool:
+            for data in iter(lambda: spool.read(settings.AUDIO_UPLOAD_CHUNK_BYTES), b''):
+                hasher.update(data)
+            spool.seek(0)
+            blob = attach_audio(
+                session.note,
+                hasher.hexdigest(),
+                session.total_size,
+                session.file_name,
+                lambda name: default_storage.save(name, File(spool, name=os.path.basename(name)))
+            )
+    except Exception:
+        AudioUploadSession.objects.filter(id=session.id, status='finalizing').update(
+            status='uploading', updated_at=timezone.now()
+        )
+        raise
+
+    os.remove(session.spool_path)
+    session.status = 'completed'
+    session.save(update_fields=['status', 'updated_at'])
+    return blob
+
+
+def expire_upload_sessions():
+    """
+    Delete unfinished upload sessions idle for AUDIO_UPLOAD_SESSION_EXPIRY_SECONDS,
+    and spool files that no unfinished session owns (e.g. of deleted notes).
+    Returns the number of sessions deleted.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.AUDIO_UPLOAD_SESSION_EXPIRY_SECONDS)
+    count, _ = AudioUploadSession.objects.filter(
+        status__in=UNFINISHED_STATUSES, updated_at__lt=cutoff
+    ).delete()
+
+    spool_dir = settings.AUDIO_UPLOAD_SPOOL_DIR
+    try:
+        names = os.listdir(spool_dir)
+    except FileNotFoundError:
+        return count
+    stale = {}
+    for name in names:
+        path = os.path.join(spool_dir, name)
+        try:
+            if os.path.getmtime(path) < cutoff.timestamp():
+                stale[path] = name.split('.', 1)[0]
+        except OSError:
+            continue
+    active = {
+        str(session_id) for session_id in AudioUploadSession.objects.filter(
+            id__in=[session_id for session_id in set(stale.values()) if _is_uuid(session_id)],
+            status__in=UNFINISHED_STATUSES,
+        ).values_list('id', flat=True)
+    }
+    for path, session_id in stale.items():
+        if session_id not in active:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    if count:
+        logger.info("Expired %s abandoned upload session(s)", count)
+    return count
+
+
+def _is_uuid(value):
+    try:
+        uuid.UUID(value)
+    except ValueError:
+        return False
+    return True
@@ -6,4 +6,10 @@ app_name = 'ai_services'
 urlpatterns = [
     path('upload-audio/', views.upload_and_process_audio, name='upload_and_process_audio'),
     path('status/<int:note_id>/', views.processing_status, name='processing_status'),
+    path('events/', views.note_events, name='note_events'),
+    path('providers/', views.provider_status, name='provider_status'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('upload-sessions/', views.create_upload_session, name='create_upload_session'),
+    path('upload-sessions/<uuid:upload_id>/', views.upload_session_detail, name='upload_session_detail'),
+    path('upload-sessions/<uuid:upload_id>/finalize/', views.finalize_upload_session, name='finalize_upload_session'),
 ]
@@ -1,14 +1,36 @@
+import asyncio
+import hmac
+import json
 import os
+import re
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes, parser_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.shortcuts import get_object_or_404
 from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
+from authentication.jwt_utils import get_user_from_token
 from notes.models import Note
-from .services import process_audio_to_note
+from .blobs import attach_audio
+from .events import FINAL_STATUSES, broker, note_event, watcher, with_event_fields
+from .governor import governor_snapshots
+from .metrics import record_bytes, render_metrics, stage_timer
+from .jobs import enqueue_audio_processing, latest_job_for_note
+from .models import AudioUploadSession
+from .serializers import UploadSessionCreateSerializer, UploadSessionSerializer
+from .uploads import (
+    HashingFileUploadHandler,
+    UploadRangeError,
+    append_upload_chunk,
+    complete_upload_session,
+    start_upload_session,
+)
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
 
 
 @api_view(['POST'])
@@ -16,11 +38,20 @@ from .services import process_audio_to_note
 @parser_classes([MultiPartParser, FormParser])
 def upload_and_process_audio(request):
     """
-    Upload audio file and process it to create a note
+    Upload audio file and queue it for processing into a note
     """
+    # Stream the upload to disk, hashing it as it arrives
+    upload_handler = HashingFileUploadHandler(request._request)
+    request._request.upload_handlers = [upload_handler]
+    
     audio_file = request.FILES.get('audio_file')
     note_id = request.data.get('note_id')
     
+    if upload_handler.rejected:
+        return Response({
+            'error': f'Audio file exceeds the {settings.AUDIO_UPLOAD_MAX_BYTES} byte limit'
+        }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    
     if not audio_file:
         return Response({
             'error': 'No audio file provided'
@@ -35,23 +66,32 @@ def upload_and_process_audio(request):
     note = get_object_or_404(Note, id=note_id, user=request.user)
     
     try:
-        # Save audio file
-        file_name = f"audio_{note_id}_{audio_file.name}"
-        file_path = default_storage.save(f"audio/{file_name}", ContentFile(audio_file.read()))
-        full_file_path = default_storage.path(file_path)
+        # Save audio file unless an identical recording is already stored
+        with stage_timer('upload'):
+            blob = attach_audio(
+                note,
+                audio_file.content_hash,
+                audio_file.size,
+                audio_file.name,
+                lambda name: default_storage.save(name, audio_file)
+            )
+        record_bytes('upload', audio_file.size)
         
-        # Process audio to note
-        processed_note = process_audio_to_note(full_file_path, note_id)
+        # Queue transcription and AI processing
+        job = enqueue_audio_processing(note, default_storage.path(blob.file_path))
         
         return Response({
             'note_id': note_id,
-            'message': 'Audio processed successfully',
-            'processing_status': processed_note.processing_status
-        }, status=status.HTTP_200_OK)
+            'job_id': job.id,
+            'content_hash': blob.content_hash,
+            'size': blob.size,
+            'message': 'Audio uploaded, processing queued',
+            'processing_status': note.processing_status
+        }, status=status.HTTP_202_ACCEPTED)
     
     except Exception as e:
         return Response({
-            'error': f'Audio processing failed: {str(e)}'
+            'error': f'Audio upload failed: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
@@ -62,10 +102,238 @@ def processing_status(request, note_id):
     Get processing status of a note
     """
     note = get_object_or_404(Note, id=note_id, user=request.user)
+    job = latest_job_for_note(note)
     
     return Response({
         'note_id': note_id,
         'processing_status': note.processing_status,
         'is_processed': note.is_processed,
-        'has_content': note.has_content
+        'has_content': note.has_content,
+        'job': {
+            'id': job.id,
+            'status': job.status,
+            'priority': job.priority,
+            'attempts': job.attempts,
+            'last_error': job.last_error
+        } if job else None
     }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def provider_status(request):
+    """
+    Rate limit, concurrency and circuit breaker state of this process's provider governors
+    """
+    return Response({
+        'pid': os.getpid(),
+        'providers': governor_snapshots()
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def create_upload_session(request):
+    """
+    Start a resumable audio upload for a note
+    """
+    serializer = UploadSessionCreateSerializer(data=request.data)
+    if serializer.is_valid():
+        note = get_object_or_404(Note, id=serializer.validated_data['note_id'], user=request.user)
+        session = start_upload_session(
+            request.user,
+            note,
+            serializer.validated_data['file_name'],
+            serializer.validated_data['total_size']
+        )
+        return Response(UploadSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET', 'PUT'])
+@permission_classes([IsAuthenticated])
+def upload_session_detail(request, upload_id):
+    """
+    Report received byte ranges, or append a chunk.
+
+    Chunks are sent as the raw request body with a
+    ``Content-Range: bytes <start>-<end>/<total>`` header (or an ``offset``
+    query parameter).
+    """
+    session = get_object_or_404(AudioUploadSession, id=upload_id, user=request.user)
+    
+    if request.method == 'GET':
+        return Response(UploadSessionSerializer(session).data, status=status.HTTP_200_OK)
+    
+    length = int(request.META.get('CONTENT_LENGTH') or 0)
+    content_range = request.META.get('HTTP_CONTENT_RANGE')
+    if content_range:
+        match = CONTENT_RANGE_RE.match(content_range.strip())
+        if not match or int(match.group(2)) - int(match.group(1)) + 1 != length:
+            return Response({
+                'error': 'Invalid Content-Range header'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        offset = int(match.group(1))
+    else:
+        offset = request.query_params.get('offset')
+        if offset is None or not offset.isdigit():
+            return Response({
+                'error': 'Content-Range header or offset parameter is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        offset = int(offset)
+    
+    if length <= 0:
+        return Response({
+            'error': 'Empty chunk'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if length > settings.AUDIO_UPLOAD_SESSION_CHUNK_BYTES:
+        return Response({
+            'error': f'Chunks may not exceed {settings.AUDIO_UPLOAD_SESSION_CHUNK_BYTES} bytes'
+        }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    
+    try:
+        session = append_upload_chunk(session.id, request.stream, offset, length)
+    except UploadRangeError as e:
+        return Response({
+            'error': str(e),
+            'received_bytes': e.received_bytes
+        }, status=status.HTTP_409_CONFLICT)
+    
+    return Response(UploadSessionSerializer(session).data, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def finalize_upload_session(request, upload_id):
+    """
+    Finish a resumable upload and queue the recording for processing
+    """
+    session = get_object_or_404(AudioUploadSession, id=upload_id, user=request.user)
+    
+    if session.status != 'uploading':
+        return Response({
+            'error': 'Upload has already been finalized'
+        }, status=status.HTTP_409_CONFLICT)
+    if not session.is_complete:
+        return Response({
+            'error': 'Upload is incomplete',
+            'received_bytes': session.received_bytes,
+            'total_size': session.total_size
+        }, status=status.HTTP_409_CONFLICT)
+    
+    try:
+        blob = complete_upload_session(session)
+        job = enqueue_audio_processing(session.note, default_storage.path(blob.file_path))
+        
+        return Response({
+            'note_id': session.note_id,
+            'job_id': job.id,
+            'content_hash': blob.content_hash,
+            'size': session.total_size,
+            'message': 'Audio uploaded, processing queued',
+            'processing_status': session.note.processing_status
+        }, status=status.HTTP_202_ACCEPTED)
+    
+    except UploadRangeError as e:
+        return Response({
+            'error': str(e),
+            'received_bytes': e.received_bytes
+        }, status=status.HTTP_409_CONFLICT)
+    except Exception as e:
+        return Response({
+            'error': f'Audio upload failed: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _stream_token(request):
+    """
+    Access token from the Authorization header, or the ``token`` query
+    parameter for EventSource clients that cannot set headers
+    """
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.lower().startswith('bearer '):
+        return auth_header.split(' ', 1)[1]
+    return request.GET.get('token')
+
+
+def metrics(request):
+    """
+    Pipeline metrics of every process in the Prometheus text format.
+
+    Scrapers authenticate with ``Authorization: Bearer <METRICS_TOKEN>``;
+    admin users can use their access token instead.
+    """
+    token = _stream_token(request)
+    if not token:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    if not (settings.METRICS_TOKEN and hmac.compare_digest(token, settings.METRICS_TOKEN)):
+        user = get_user_from_token(token)
+        if user is None:
+            return JsonResponse({'error': 'Invalid or expired token'}, status=401)
+        if not user.is_staff:
+            return JsonResponse({'error': 'Admin access required'}, status=403)
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _initial_events(user, note_id):
+    """
+    Current state of the requested note, or of the user's notes still in progress
+    """
+    notes = Note.objects.filter(user=user)
+    if note_id:
+        notes = notes.filter(id=note_id)
+    else:
+        notes = notes.exclude(processing_status__in=FINAL_STATUSES + ('pending',))
+    return [note_event(note) for note in with_event_fields(notes)]
+
+
+async def note_events(request):
+    """
+    Server-Sent Events stream of processing updates for the user's notes.
+
+    Optional ``note_id`` limits the stream to one note. Each connection lasts
+    at most ``EVENTS_MAX_STREAM_SECONDS``; EventSource reconnects on its own.
+    """
+    token = _stream_token(request)
+    user = await sync_to_async(get_user_from_token)(token) if token else None
+    if user is None:
+        return JsonResponse({'error': 'Invalid or expired token'}, status=401)
+    
+    note_id = request.GET.get('note_id')
+    if note_id and not note_id.isdigit():
+        return JsonResponse({'error': 'note_id must be an integer'}, status=400)
+    note_id = int(note_id) if note_id else None
+    initial = await sync_to_async(_initial_events)(user, note_id)
+    if note_id and not initial:
+        return JsonResponse({'error': 'Note not found'}, status=404)
+    
+    async def stream():
+        subscription = broker.subscribe(user.id)
+        watcher.ensure_running()
+        queue = subscription[1]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.EVENTS_MAX_STREAM_SECONDS
+        try:
+            yield f"retry: {settings.EVENTS_RETRY_MS}\n\n"
+            for event in initial:
+                yield _sse('status', event)
+            while loop.time() < deadline:
+                try:
+                    event = await asyncio.wait_for(queue.get(), settings.EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                if note_id is None or event['note_id'] == note_id:
+                    yield _sse('status', event)
+        finally:
+            broker.unsubscribe(user.id, subscription)
+    
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['user', '-updated_at', '-id'], name='courses_user_id_3e39e2_idx'),
+        ),
+    ]
@@ -36,6 +36,9 @@ class Course(models.Model):
         db_table = 'courses'
         ordering = ['-updated_at']
         unique_together = ['user', 'title']
+        indexes = [
+            models.Index(fields=['user', '-updated_at', '-id']),
+        ]
         
     def __str__(self):
         return f"{self.title} - {self.user.email}"
@@ -43,4 +46,20 @@ class Course(models.Model):
     @property
     def notes_count(self):
         """Return the number of notes in this course"""
+        if hasattr(self, '_notes_count'):
+            return self._notes_count
         return self.notes.count()
+
+
+def with_notes_count(courses):
+    """
+    Fill in ``notes_count`` for a page of courses with one grouped query
+    """
+    courses = list(courses)
+    totals = dict(
+        Course.objects.filter(id__in=[course.id for course in courses])
+        .annotate(total=models.Count('notes')).values_list('id', 'total')
+    )
+    for course in courses:
+        course._notes_count = totals.get(course.id, 0)
+    return courses
@@ -6,4 +6,5 @@ app_name = 'courses'
 urlpatterns = [
     path('', views.course_list, name='course_list'),
     path('<int:course_id>/', views.course_detail, name='course_detail'),
+    path('<int:course_id>/reprocess/', views.reprocess_course, name='reprocess_course'),
 ]
@@ -3,7 +3,9 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from .models import Course
+from ai_services.batches import active_batch, batch_progress, resume_batch, start_batch
+from utils.pagination import KeysetPagination
+from .models import Course, with_notes_count
 from .serializers import CourseSerializer, CourseListSerializer
 
 
@@ -15,11 +17,10 @@ def course_list(request):
     """
     if request.method == 'GET':
         courses = Course.objects.filter(user=request.user)
-        serializer = CourseListSerializer(courses, many=True)
-        return Response({
-            'courses': serializer.data,
-            'count': courses.count()
-        }, status=status.HTTP_200_OK)
+        paginator = KeysetPagination(request)
+        page = paginator.paginate_queryset(courses)
+        serializer = CourseListSerializer(with_notes_count(page), many=True)
+        return Response(paginator.get_response_data('courses', serializer.data), status=status.HTTP_200_OK)
     
     elif request.method == 'POST':
         serializer = CourseSerializer(data=request.data, context={'request': request})
@@ -64,3 +65,60 @@ def course_detail(request, course_id):
         return Response({
             'message': 'Course deleted successfully'
         }, status=status.HTTP_204_NO_CONTENT)
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def reprocess_course(request, course_id):
+    """
+    Regenerate AI content for every eligible note in a course.
+
+    GET reports progress of the latest batch. POST queues a new batch
+    (optional ``max_concurrency``), or with ``resume`` picks the latest one
+    back up, retrying its failed notes.
+    """
+    course = get_object_or_404(Course, id=course_id, user=request.user)
+    
+    if request.method == 'GET':
+        batch = course.reprocess_batches.first()
+        if batch is None:
+            return Response({
+                'error': 'This course has not been reprocessed'
+            }, status=status.HTTP_404_NOT_FOUND)
+        return Response({'batch': batch_progress(batch)}, status=status.HTTP_200_OK)
+    
+    if request.data.get('resume'):
+        batch = course.reprocess_batches.first()
+        if batch is None:
+            return Response({
+                'error': 'There is no batch to resume'
+            }, status=status.HTTP_404_NOT_FOUND)
+        batch = resume_batch(batch)
+        return Response({
+            'batch': batch_progress(batch),
+            'message': 'Reprocessing resumed'
+        }, status=status.HTTP_202_ACCEPTED)
+    
+    running = active_batch(course)
+    if running is not None and batch_progress(running)['status'] == 'running':
+        return Response({
+            'error': 'This course is already being reprocessed',
+            'batch': batch_progress(running)
+        }, status=status.HTTP_409_CONFLICT)
+    
+    max_concurrency = request.data.get('max_concurrency')
+    if max_concurrency is not None:
+        try:
+            max_concurrency = int(max_concurrency)
+        except (TypeError, ValueError):
+            max_concurrency = 0
+        if max_concurrency < 1:
+            return Response({
+                'error': 'max_concurrency must be a positive integer'
+            }, status=status.HTTP_400_BAD_REQUEST)
+    
+    batch = start_batch(course, request.user, max_concurrency)
+    return Response({
+        'batch': batch_progress(batch),
+        'message': 'Reprocessing queued'
+    }, status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from notes import semantic
+from notes.models import Note
+from notes.search import rebuild_index, use_fts5
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the note full-text search index from every note'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--embeddings',
+            action='store_true',
+            help='Also re-embed every processed note for semantic search'
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_index()
+        backend = 'FTS5' if use_fts5() else 'Python postings'
+        self.stdout.write(f"Indexed {count} notes ({backend} index)")
+
+        if options['embeddings']:
+            chunks = 0
+            notes = Note.objects.exclude(processing_status__in=['transcribing', 'processing']).order_by('id')
+            for note in notes.iterator():
+                chunks += semantic.index_note(note)
+            self.stdout.write(f"Embedded {chunks} chunks with {semantic.get_embedder().name}")
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='note',
+            name='processing_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('queued', 'Queued'), ('transcribing', 'Transcribing'), ('processing', 'AI Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', help_text='Current processing status', max_length=20),
+        ),
+    ]
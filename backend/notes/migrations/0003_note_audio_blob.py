@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0004_audio_blob'),
+        ('notes', '0002_alter_note_processing_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='audio_blob',
+            field=models.ForeignKey(blank=True, help_text='Deduplicated recording backing audio_file_path', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notes', to='ai_services.audioblob'),
+        ),
+    ]
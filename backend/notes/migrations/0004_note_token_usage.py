@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0003_note_audio_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='completion_tokens',
+            field=models.PositiveIntegerField(default=0, help_text='Output tokens used by the last AI processing run'),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='prompt_tokens',
+            field=models.PositiveIntegerField(default=0, help_text='Input tokens used by the last AI processing run'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0001_initial'),
+        ('notes', '0004_note_token_usage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteSearchDocument',
+            fields=[
+                ('note', models.OneToOneField(help_text='Indexed note', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='notes.note')),
+                ('length', models.FloatField(help_text='Field-weighted number of indexed terms')),
+                ('course', models.ForeignKey(help_text='Course of the note', on_delete=django.db.models.deletion.CASCADE, related_name='note_search_documents', to='courses.course')),
+                ('user', models.ForeignKey(help_text='Note owner', on_delete=django.db.models.deletion.CASCADE, related_name='note_search_documents', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'note_search_documents',
+            },
+        ),
+        migrations.CreateModel(
+            name='NoteSearchPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(help_text='Normalized term', max_length=64)),
+                ('frequency', models.FloatField(help_text='Occurrences weighted by the field they occur in')),
+                ('document', models.ForeignKey(help_text='Indexed note', on_delete=django.db.models.deletion.CASCADE, related_name='postings', to='notes.notesearchdocument')),
+                ('user', models.ForeignKey(help_text="Note owner, so a user's postings for a term come from one index range", on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'note_search_postings',
+                'indexes': [models.Index(fields=['user', 'term'], name='note_search_user_id_b29aed_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations, OperationalError
+
+FTS_TABLE = 'notes_fts'
+
+
+def create_fts_table(apps, schema_editor):
+    # FTS5 is SQLite-only and optional in SQLite builds; without it search
+    # falls back to the postings tables from 0005
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            "user_id UNINDEXED, course_id UNINDEXED, title, key_points, detailed_notes, raw_content, "
+            "tokenize = 'porter unicode61')"
+        )
+    except OperationalError:
+        return
+
+    Note = apps.get_model('notes', 'Note')
+    rows = []
+    for note in Note.objects.order_by('id').iterator():
+        key_points = note.key_points if isinstance(note.key_points, list) else []
+        rows.append((
+            note.id, note.user_id, note.course_id, note.title or '', '\n'.join(str(point) for point in key_points),
+            note.detailed_notes or '', note.raw_content or ''
+        ))
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, user_id, course_id, title, key_points, detailed_notes, raw_content) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            rows
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
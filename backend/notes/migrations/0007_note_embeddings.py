@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0006_notes_fts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteEmbedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chunk', models.PositiveIntegerField(help_text='Position of the chunk within the note')),
+                ('text', models.TextField(help_text='Chunk text, returned as the matching passage')),
+                ('embedder', models.CharField(help_text='Embedder and dimension that produced the vector', max_length=100)),
+                ('vector', models.BinaryField(help_text='Unit-length little-endian float32 vector')),
+                ('note', models.ForeignKey(help_text='Embedded note', on_delete=django.db.models.deletion.CASCADE, related_name='embeddings', to='notes.note')),
+                ('user', models.ForeignKey(help_text="Note owner, so a user's vectors load from one index range", on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'note_embeddings',
+                'ordering': ['note', 'chunk'],
+                'indexes': [models.Index(fields=['user', 'embedder'], name='note_embedd_user_id_80c627_idx')],
+            },
+        ),
+    ]
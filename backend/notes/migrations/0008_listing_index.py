@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_services', '0009_speech_activity'),
+        ('courses', '0002_listing_index'),
+        ('notes', '0007_note_embeddings'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['user', '-updated_at', '-id'], name='notes_user_id_c2ab9a_idx'),
+        ),
+    ]
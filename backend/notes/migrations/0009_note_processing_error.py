@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0008_listing_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='processing_error',
+            field=models.TextField(blank=True, default='', help_text='Why the last processing run failed'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0009_note_processing_error'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='note',
+            name='completion_tokens',
+            field=models.PositiveIntegerField(default=0, help_text='Output tokens used to generate the current AI content, also when it came from the cache'),
+        ),
+        migrations.AlterField(
+            model_name='note',
+            name='prompt_tokens',
+            field=models.PositiveIntegerField(default=0, help_text='Input tokens used to generate the current AI content, also when it came from the cache'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+from django.db import migrations, OperationalError
+
+FTS_TABLE = 'notes_fts'
+
+
+def _key_points(note):
+    key_points = note.key_points if isinstance(note.key_points, list) else []
+    return '\n'.join(str(point) for point in key_points)
+
+
+def _rebuild(apps, schema_editor, columns, row):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    try:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({columns}, tokenize = 'porter unicode61')"
+        )
+    except OperationalError:
+        return
+
+    Note = apps.get_model('notes', 'Note')
+    rows = [row(note) for note in Note.objects.order_by('id').iterator()]
+    names = ['rowid'] + [column.split()[0] for column in columns.split(', ')]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} ({', '.join(names)}) VALUES ({', '.join(['%s'] * len(names))})",
+            rows
+        )
+
+
+def add_owner_column(apps, schema_editor):
+    # user_id and course_id were UNINDEXED, so filtering on them scanned every
+    # user's matches; owner holds "u<user_id> c<course_id>" tokens that MATCH
+    # can intersect with the search terms through the index
+    _rebuild(
+        apps, schema_editor, 'owner, title, key_points, detailed_notes, raw_content',
+        lambda note: (
+            note.id, f"u{note.user_id} c{note.course_id}", note.title or '', _key_points(note),
+            note.detailed_notes or '', note.raw_content or ''
+        )
+    )
+
+
+def restore_id_columns(apps, schema_editor):
+    _rebuild(
+        apps, schema_editor,
+        'user_id UNINDEXED, course_id UNINDEXED, title, key_points, detailed_notes, raw_content',
+        lambda note: (
+            note.id, note.user_id, note.course_id, note.title or '', _key_points(note),
+            note.detailed_notes or '', note.raw_content or ''
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0010_token_usage_help_text'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_owner_column, restore_id_columns),
+    ]
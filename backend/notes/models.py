@@ -48,12 +48,31 @@ class Note(models.Model):
         blank=True,
         help_text='Path to original audio file'
     )
+    audio_blob = models.ForeignKey(
+        'ai_services.AudioBlob',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='notes',
+        help_text='Deduplicated recording backing audio_file_path'
+    )
+    
+    # Token usage of the most recent AI processing run
+    prompt_tokens = models.PositiveIntegerField(
+        default=0,
+        help_text='Input tokens used to generate the current AI content, also when it came from the cache'
+    )
+    completion_tokens = models.PositiveIntegerField(
+        default=0,
+        help_text='Output tokens used to generate the current AI content, also when it came from the cache'
+    )
     
     # Processing status
     processing_status = models.CharField(
         max_length=20,
         choices=[
             ('pending', 'Pending'),
+            ('queued', 'Queued'),
             ('transcribing', 'Transcribing'),
             ('processing', 'AI Processing'),
             ('completed', 'Completed'),
@@ -62,6 +81,11 @@ class Note(models.Model):
         default='pending',
         help_text='Current processing status'
     )
+    processing_error = models.TextField(
+        blank=True,
+        default='',
+        help_text='Why the last processing run failed'
+    )
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -69,6 +93,9 @@ class Note(models.Model):
     class Meta:
         db_table = 'notes'
         ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['user', '-updated_at', '-id']),
+        ]
         
     def __str__(self):
         return f"{self.title} - {self.course.title}"
@@ -76,9 +103,98 @@ class Note(models.Model):
     @property
     def is_processed(self):
         """Check if note has been fully processed by AI"""
+        # Listings annotate the content check so the large text fields can stay unloaded
+        if 'has_ai_content' in self.__dict__:
+            return self.processing_status == 'completed' and self.has_ai_content
         return self.processing_status == 'completed' and bool(self.key_points or self.detailed_notes)
     
     @property
     def has_content(self):
         """Check if note has any content"""
+        if 'has_any_content' in self.__dict__:
+            return self.has_any_content
         return bool(self.raw_content or self.key_points or self.detailed_notes)
+
+
+class NoteSearchDocument(models.Model):
+    """
+    A note in the pure-Python full-text index, used when SQLite FTS5 is unavailable
+    """
+    note = models.OneToOneField(
+        Note,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_document',
+        help_text='Indexed note'
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='note_search_documents',
+        help_text='Note owner'
+    )
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.CASCADE,
+        related_name='note_search_documents',
+        help_text='Course of the note'
+    )
+    length = models.FloatField(help_text='Field-weighted number of indexed terms')
+
+    class Meta:
+        db_table = 'note_search_documents'
+
+
+class NoteSearchPosting(models.Model):
+    """
+    Field-weighted frequency of one term in one indexed note
+    """
+    document = models.ForeignKey(
+        NoteSearchDocument,
+        on_delete=models.CASCADE,
+        related_name='postings',
+        help_text='Indexed note'
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        help_text='Note owner, so a user\'s postings for a term come from one index range'
+    )
+    term = models.CharField(max_length=64, help_text='Normalized term')
+    frequency = models.FloatField(help_text='Occurrences weighted by the field they occur in')
+
+    class Meta:
+        db_table = 'note_search_postings'
+        indexes = [
+            models.Index(fields=['user', 'term']),
+        ]
+
+
+class NoteEmbedding(models.Model):
+    """
+    Embedding vector of one chunk of a note, for semantic search
+    """
+    note = models.ForeignKey(
+        Note,
+        on_delete=models.CASCADE,
+        related_name='embeddings',
+        help_text='Embedded note'
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        help_text='Note owner, so a user\'s vectors load from one index range'
+    )
+    chunk = models.PositiveIntegerField(help_text='Position of the chunk within the note')
+    text = models.TextField(help_text='Chunk text, returned as the matching passage')
+    embedder = models.CharField(max_length=100, help_text='Embedder and dimension that produced the vector')
+    vector = models.BinaryField(help_text='Unit-length little-endian float32 vector')
+
+    class Meta:
+        db_table = 'note_embeddings'
+        ordering = ['note', 'chunk']
+        indexes = [
+            models.Index(fields=['user', 'embedder']),
+        ]
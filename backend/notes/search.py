@@ -0,0 +1,318 @@
+import logging
+import math
+import re
+from collections import Counter, namedtuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Avg, Count
+
+from .models import Note, NoteSearchDocument, NoteSearchPosting
+
+logger = logging.getLogger(__name__)
+
+# Indexed note fields and their BM25 weight; a match in the title counts most
+FIELD_WEIGHTS = {
+    'title': 10.0,
+    'key_points': 5.0,
+    'detailed_notes': 2.0,
+    'raw_content': 1.0,
+}
+INDEXED_FIELDS = tuple(FIELD_WEIGHTS)
+
+# Fields a snippet is taken from, in order of preference
+SNIPPET_FIELDS = ('detailed_notes', 'raw_content', 'key_points', 'title')
+SNIPPET_START = '<mark>'
+SNIPPET_END = '</mark>'
+SNIPPET_ELLIPSIS = '…'
+SNIPPET_WORDS = 16
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+FTS_TABLE = 'notes_fts'
+
+TOKEN_RE = re.compile(r'\w+')
+STOPWORDS = frozenset(
+    'a an and are as at be but by for from has have in is it its of on or that the this to was were '
+    'will with'.split()
+)
+
+SearchResults = namedtuple('SearchResults', ['hits', 'count'])
+SearchHit = namedtuple('SearchHit', ['note_id', 'score', 'snippet'])
+
+
+def note_fields(note):
+    """
+    Text of each indexed field of a note
+    """
+    key_points = note.key_points if isinstance(note.key_points, list) else []
+    return {
+        'title': note.title or '',
+        'key_points': '\n'.join(str(point) for point in key_points),
+        'detailed_notes': note.detailed_notes or '',
+        'raw_content': note.raw_content or '',
+    }
+
+
+# Whether each database file has the FTS5 table, looked up once per process
+_fts5_tables = {}
+
+
+def fts5_available():
+    """
+    Whether the default database is SQLite with the FTS5 index table
+    """
+    if connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _fts5_tables:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            _fts5_tables[name] = cursor.fetchone() is not None
+    return _fts5_tables[name]
+
+
+def use_fts5():
+    backend = settings.NOTES_SEARCH_BACKEND
+    if backend == 'python':
+        return False
+    available = fts5_available()
+    if backend == 'fts5' and not available:
+        logger.warning("NOTES_SEARCH_BACKEND is fts5 but the FTS5 index is missing; using the Python index")
+    return available
+
+
+def search_notes(user, query, course_id=None, limit=None):
+    """
+    Notes of ``user`` containing every term of ``query``, best BM25 match first,
+    each with a snippet of matching text
+    """
+    limit = limit or settings.NOTES_SEARCH_MAX_RESULTS
+    if use_fts5():
+        return _fts_search(user.id, query, course_id, limit)
+    return _python_search(user.id, query, course_id, limit)
+
+
+def index_note(note):
+    """
+    Add or refresh a note in the search index
+    """
+    if use_fts5():
+        _fts_index(note)
+    else:
+        _python_index(note)
+
+
+def remove_note(note_id):
+    """
+    Drop a deleted note from the search index
+    """
+    if use_fts5():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [note_id])
+    # Python index rows go with the note through ON DELETE CASCADE
+
+
+def rebuild_index():
+    """
+    Index every note from scratch; returns the number indexed
+    """
+    count = 0
+    with transaction.atomic():
+        if use_fts5():
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        else:
+            NoteSearchDocument.objects.all().delete()
+        for note in Note.objects.order_by('id').iterator():
+            index_note(note)
+            count += 1
+    return count
+
+
+# SQLite FTS5 backend
+
+def _fts_owner(user_id, course_id=None):
+    """
+    Tokens of the indexed owner column, so MATCH can scope a search to one
+    user (and course) without scanning other users' rows
+    """
+    tokens = [f"u{user_id}"]
+    if course_id:
+        tokens.append(f"c{course_id}")
+    return ' '.join(tokens)
+
+
+def _fts_index(note):
+    fields = note_fields(note)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [note.id])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, owner, title, key_points, detailed_notes, raw_content) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            [note.id, _fts_owner(note.user_id, note.course_id), fields['title'], fields['key_points'],
+             fields['detailed_notes'], fields['raw_content']]
+        )
+
+
+def _fts_match(query):
+    """
+    FTS5 query requiring every word of ``query``, each quoted so user input
+    is never parsed as query syntax
+    """
+    terms = TOKEN_RE.findall(query.lower())
+    if not terms:
+        return ''
+    # Column filter keeps search words from matching the owner tokens
+    return '{%s} : (%s)' % (
+        ' '.join(INDEXED_FIELDS), ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+    )
+
+
+def _fts_search(user_id, query, course_id, limit):
+    match = _fts_match(query)
+    if not match:
+        return SearchResults([], 0)
+    owner = ' AND '.join(f'owner : "{token}"' for token in _fts_owner(user_id, course_id).split())
+    scoped = f"{owner} AND {match}"
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [scoped])
+        count = cursor.fetchone()[0]
+        # bm25() weights follow the column order; the owner column is not text
+        cursor.execute(
+            f"SELECT rowid, bm25({FTS_TABLE}, 0, %s, %s, %s, %s) AS rank FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s ORDER BY rank LIMIT %s",
+            [*FIELD_WEIGHTS.values(), scoped, limit]
+        )
+        ranked = cursor.fetchall()
+        if not ranked:
+            return SearchResults([], count)
+
+        # Snippets only for the page of results, one per text column
+        columns = {field: index for index, field in enumerate(
+            ('owner', 'title', 'key_points', 'detailed_notes', 'raw_content')
+        )}
+        snippet_sql = ', '.join(
+            f"snippet({FTS_TABLE}, {columns[field]}, %s, %s, %s, {SNIPPET_WORDS})" for field in SNIPPET_FIELDS
+        )
+        placeholders = ', '.join(['%s'] * len(ranked))
+        cursor.execute(
+            f"SELECT rowid, {snippet_sql} FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid IN ({placeholders})",
+            [SNIPPET_START, SNIPPET_END, SNIPPET_ELLIPSIS] * len(SNIPPET_FIELDS)
+            + [match] + [note_id for note_id, _ in ranked]
+        )
+        snippets = {
+            row[0]: next((snippet for snippet in row[1:] if SNIPPET_START in snippet), '')
+            for row in cursor.fetchall()
+        }
+
+    # FTS5 reports better matches as more negative ranks
+    return SearchResults(
+        [SearchHit(note_id, -rank, snippets.get(note_id, '')) for note_id, rank in ranked],
+        count
+    )
+
+
+# Pure-Python backend: postings stored in ordinary tables, scored in Python
+
+def _stem(token):
+    for suffix in ('ing', 'ed', 'es', 's'):
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text):
+    """
+    Lowercased, lightly stemmed terms of ``text``
+    """
+    return [_stem(token) for token in TOKEN_RE.findall(text.lower()) if len(token) <= 64]
+
+
+def _python_index(note):
+    frequencies = Counter()
+    for field, text in note_fields(note).items():
+        for term in tokenize(text):
+            if term not in STOPWORDS:
+                frequencies[term] += FIELD_WEIGHTS[field]
+
+    with transaction.atomic():
+        NoteSearchDocument.objects.filter(note_id=note.id).delete()
+        document = NoteSearchDocument.objects.create(
+            note_id=note.id, user_id=note.user_id, course_id=note.course_id,
+            length=sum(frequencies.values())
+        )
+        NoteSearchPosting.objects.bulk_create(
+            NoteSearchPosting(document=document, user_id=note.user_id, term=term, frequency=frequency)
+            for term, frequency in frequencies.items()
+        )
+
+
+def _python_search(user_id, query, course_id, limit):
+    terms = set(tokenize(query)) - STOPWORDS or set(tokenize(query))
+    if not terms:
+        return SearchResults([], 0)
+
+    documents = NoteSearchDocument.objects.filter(user_id=user_id)
+    postings = NoteSearchPosting.objects.filter(user_id=user_id, term__in=terms)
+    if course_id:
+        documents = documents.filter(course_id=course_id)
+        postings = postings.filter(document__course_id=course_id)
+
+    matches = {}
+    for note_id, term, frequency in postings.values_list('document_id', 'term', 'frequency'):
+        matches.setdefault(note_id, {})[term] = frequency
+    candidates = [note_id for note_id, found in matches.items() if len(found) == len(terms)]
+    if not candidates:
+        return SearchResults([], 0)
+
+    stats = documents.aggregate(total=Count('pk'), average_length=Avg('length'))
+    document_frequency = Counter(term for found in matches.values() for term in found)
+    lengths = dict(documents.filter(note_id__in=candidates).values_list('note_id', 'length'))
+    average_length = stats['average_length'] or 1.0
+
+    def score(note_id):
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths.get(note_id, 0) / average_length)
+        total = 0.0
+        for term, frequency in matches[note_id].items():
+            df = document_frequency[term]
+            idf = math.log(1 + (stats['total'] - df + 0.5) / (df + 0.5))
+            total += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return total
+
+    ranked = sorted(((score(note_id), note_id) for note_id in candidates), reverse=True)[:limit]
+    notes = Note.objects.filter(id__in=[note_id for _, note_id in ranked]).only('id', *INDEXED_FIELDS)
+    snippets = {note.id: _snippet(note_fields(note), terms) for note in notes}
+    return SearchResults(
+        [SearchHit(note_id, value, snippets.get(note_id, '')) for value, note_id in ranked],
+        len(candidates)
+    )
+
+
+def _snippet(fields, terms):
+    """
+    Words around the first matching term, with matches highlighted
+    """
+    for field in SNIPPET_FIELDS:
+        words = list(TOKEN_RE.finditer(fields[field]))
+        hits = [index for index, word in enumerate(words) if _stem(word.group().lower()) in terms]
+        if not hits:
+            continue
+        start = max(hits[0] - SNIPPET_WORDS // 4, 0)
+        end = min(start + SNIPPET_WORDS, len(words))
+        text = fields[field]
+        parts, cursor = [], words[start].start()
+        for index in range(start, end):
+            word = words[index]
+            if index in hits:
+                parts.append(text[cursor:word.start()])
+                parts.append(f"{SNIPPET_START}{word.group()}{SNIPPET_END}")
+                cursor = word.end()
+        parts.append(text[cursor:words[end - 1].end()])
+        snippet = ''.join(parts)
+        prefix = SNIPPET_ELLIPSIS if start > 0 else ''
+        suffix = SNIPPET_ELLIPSIS if end < len(words) else ''
+        return f"{prefix}{snippet}{suffix}"
+    return ''
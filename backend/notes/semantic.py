@@ -0,0 +1,296 @@
+import logging
+import math
+import threading
+import zlib
+from collections import Counter, OrderedDict, namedtuple
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.module_loading import import_string
+
+from ai_services.chunking import split_into_chunks
+from .models import NoteEmbedding
+from .search import STOPWORDS, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Chunk hits below this cosine similarity are treated as unrelated
+MIN_SCORE = 0.05
+# Spherical k-means iterations when training the IVF centroids
+IVF_TRAIN_ITERATIONS = 8
+
+SemanticHit = namedtuple('SemanticHit', ['note_id', 'score', 'passage'])
+
+
+class HashingEmbedder:
+    """
+    Local, stateless embedder: hashed stemmed words, word pairs and character
+    4-grams, so inflections and partial words land near each other.
+
+    Needs no training, so any note can be embedded on its own. It does not
+    know synonyms; use a provider embedder for that.
+    """
+    FEATURE_WEIGHTS = {'word': 1.0, 'pair': 0.5, 'gram': 0.25}
+
+    def __init__(self, dim=None):
+        self.dim = dim or settings.NOTES_EMBEDDING_DIM
+        self.name = f"hashing-v1:{self.dim}"
+
+    def _features(self, text):
+        words = [term for term in tokenize(text) if term not in STOPWORDS]
+        features = Counter(('word', word) for word in words)
+        features.update(('pair', f"{a} {b}") for a, b in zip(words, words[1:]))
+        for word in words:
+            padded = f"#{word}#"
+            features.update(('gram', padded[i:i + 4]) for i in range(len(padded) - 3))
+        return features
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for (kind, feature), count in self._features(text).items():
+                digest = zlib.crc32(f"{kind}:{feature}".encode())
+                sign = 1.0 if digest & 0x80000000 else -1.0
+                vectors[row, digest % self.dim] += sign * self.FEATURE_WEIGHTS[kind] * (1 + math.log(count))
+        return _normalize(vectors)
+
+
+class OpenAIEmbedder:
+    """
+    Provider embeddings through the shared OpenAI client and governor
+    """
+
+    def __init__(self, model=None):
+        self.model = model or settings.NOTES_EMBEDDING_MODEL
+        self.name = f"openai:{self.model}"
+
+    def embed(self, texts):
+        from ai_services.clients import get_openai_client
+        from ai_services.governor import get_governor
+
+        response = get_governor('openai').call(get_openai_client().embeddings.create, model=self.model, input=texts)
+        data = sorted(response.data, key=lambda item: item.index)
+        return _normalize(np.array([item.embedding for item in data], dtype=np.float32))
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """
+    Embedder built from ``settings.NOTES_EMBEDDER``, shared by this process
+    """
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None or _embedder.__class__ is not import_string(settings.NOTES_EMBEDDER):
+            _embedder = import_string(settings.NOTES_EMBEDDER)()
+        return _embedder
+
+
+def note_chunks(note):
+    """
+    Passages of a note to embed: the AI notes once processed, otherwise the transcript
+    """
+    key_points = note.key_points if isinstance(note.key_points, list) else []
+    parts = ['\n'.join(f"- {point}" for point in key_points), note.detailed_notes or '']
+    text = '\n\n'.join(part for part in parts if part.strip()) or note.raw_content or ''
+    if not text.strip():
+        return []
+    return split_into_chunks(text, settings.NOTES_EMBEDDING_CHUNK_TOKENS)
+
+
+def index_note(note):
+    """
+    Replace the stored vectors of a note with fresh ones
+    """
+    embedder = get_embedder()
+    chunks = note_chunks(note)
+    # The title goes into every chunk's vector but not its stored passage
+    vectors = embedder.embed([f"{note.title}\n{chunk}" for chunk in chunks]) if chunks else []
+    with transaction.atomic():
+        NoteEmbedding.objects.filter(note_id=note.id).delete()
+        NoteEmbedding.objects.bulk_create(
+            NoteEmbedding(
+                note_id=note.id, user_id=note.user_id, chunk=position, text=chunk, embedder=embedder.name,
+                vector=vector.astype('<f4').tobytes()
+            )
+            for position, (chunk, vector) in enumerate(zip(chunks, vectors))
+        )
+    return len(chunks)
+
+
+class VectorIndex:
+    """
+    Unit vectors of one user's note chunks in a single float32 matrix.
+
+    Small matrices are searched exhaustively. From NOTES_SEMANTIC_IVF_MIN_VECTORS
+    rows, an inverted file of k-means cells is built and a query only scores
+    the rows of its NOTES_SEMANTIC_IVF_PROBES nearest cells.
+    """
+
+    def __init__(self, ids, note_ids, course_ids, vectors, centroids=None):
+        self.ids = ids
+        self.note_ids = note_ids
+        self.course_ids = course_ids
+        self.vectors = vectors
+        self.centroids = None
+        self.cells = None
+        self.trained_size = 0
+        if len(vectors) >= settings.NOTES_SEMANTIC_IVF_MIN_VECTORS:
+            self._build_ivf(centroids)
+
+    def _build_ivf(self, centroids):
+        if centroids is None or centroids.shape[1] != self.vectors.shape[1]:
+            centroids = self._train(max(int(math.sqrt(len(self.vectors))), 1))
+            self.trained_size = len(self.vectors)
+        self.centroids = centroids
+        assignment = np.argmax(self.vectors @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind='stable')
+        bounds = np.searchsorted(assignment[order], np.arange(len(centroids) + 1))
+        self.cells = [order[bounds[cell]:bounds[cell + 1]] for cell in range(len(centroids))]
+
+    def _train(self, count):
+        rng = np.random.default_rng(0)
+        centroids = self.vectors[rng.choice(len(self.vectors), size=count, replace=False)].copy()
+        for _ in range(IVF_TRAIN_ITERATIONS):
+            assignment = np.argmax(self.vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, self.vectors)
+            empty = ~sums.any(axis=1)
+            sums[empty] = centroids[empty]
+            centroids = _normalize(sums)
+        return centroids
+
+    def candidates(self, query):
+        if self.centroids is None:
+            return None
+        probes = min(settings.NOTES_SEMANTIC_IVF_PROBES, len(self.centroids))
+        nearest = np.argpartition(-(self.centroids @ query), probes - 1)[:probes]
+        return np.concatenate([self.cells[cell] for cell in nearest])
+
+    def search(self, query, limit, course_id=None, exclude_note=None):
+        """
+        Best ``(row, score)`` per note, at most ``limit`` notes
+        """
+        rows = self.candidates(query)
+        if rows is None:
+            rows = np.arange(len(self.vectors))
+        if course_id is not None:
+            rows = rows[self.course_ids[rows] == course_id]
+        if exclude_note is not None:
+            rows = rows[self.note_ids[rows] != exclude_note]
+        if not len(rows):
+            return []
+
+        scores = self.vectors[rows] @ query
+        order = np.argsort(-scores, kind='stable')
+        best, seen = [], set()
+        for position in order:
+            score = float(scores[position])
+            if score < MIN_SCORE:
+                break
+            note_id = int(self.note_ids[rows[position]])
+            if note_id in seen:
+                continue
+            seen.add(note_id)
+            best.append((int(rows[position]), score))
+            if len(best) == limit:
+                break
+        return best
+
+    def note_vector(self, note_id):
+        rows = self.vectors[self.note_ids == note_id]
+        if not len(rows):
+            return None
+        return _normalize(rows.mean(axis=0, keepdims=True))[0]
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def load_index(user_id, embedder_name):
+    """
+    The user's VectorIndex, rebuilt only when their stored vectors changed
+    """
+    embeddings = NoteEmbedding.objects.filter(user_id=user_id, embedder=embedder_name)
+    stats = embeddings.aggregate(count=Count('id'), last=Max('id'))
+    stamp = (embedder_name, stats['count'], stats['last'])
+
+    with _indexes_lock:
+        cached = _indexes.get(user_id)
+        if cached is not None:
+            _indexes.move_to_end(user_id)
+            if cached[0] == stamp:
+                return cached[1]
+
+    rows = list(embeddings.order_by('id').values_list('id', 'note_id', 'note__course_id', 'vector'))
+    if rows:
+        ids, note_ids, course_ids, vectors = zip(*rows)
+        matrix = np.frombuffer(b''.join(bytes(vector) for vector in vectors), dtype='<f4')
+        matrix = matrix.reshape(len(rows), -1).astype(np.float32, copy=False)
+    else:
+        ids, note_ids, course_ids, matrix = (), (), (), np.zeros((0, 1), dtype=np.float32)
+
+    # Keep trained centroids until the matrix has doubled; new rows are only assigned to cells
+    previous = cached[1] if cached is not None else None
+    centroids = None
+    if previous is not None and previous.centroids is not None and len(matrix) < 2 * previous.trained_size:
+        centroids = previous.centroids
+    index = VectorIndex(
+        np.array(ids, dtype=np.int64), np.array(note_ids, dtype=np.int64),
+        np.array(course_ids, dtype=np.int64), matrix, centroids
+    )
+    if centroids is not None:
+        index.trained_size = previous.trained_size
+
+    with _indexes_lock:
+        _indexes[user_id] = (stamp, index)
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > settings.NOTES_SEMANTIC_CACHE_USERS:
+            _indexes.popitem(last=False)
+    return index
+
+
+def _hits(index, matches):
+    passages = dict(NoteEmbedding.objects.filter(id__in=[int(index.ids[row]) for row, _ in matches])
+                    .values_list('id', 'text'))
+    return [
+        SemanticHit(int(index.note_ids[row]), score, passages.get(int(index.ids[row]), ''))
+        for row, score in matches
+    ]
+
+
+def semantic_search(user, query, course_id=None, limit=None):
+    """
+    Notes of ``user`` closest in meaning to ``query``, with their best matching passage
+    """
+    embedder = get_embedder()
+    index = load_index(user.id, embedder.name)
+    if not len(index.ids):
+        return []
+    vector = embedder.embed([query])[0]
+    matches = index.search(vector, limit or settings.NOTES_SEARCH_MAX_RESULTS, course_id=course_id)
+    return _hits(index, matches)
+
+
+def related_notes(note, limit=None):
+    """
+    The owner's other notes closest to ``note``, or None when it has no vectors yet
+    """
+    embedder = get_embedder()
+    index = load_index(note.user_id, embedder.name)
+    vector = index.note_vector(note.id)
+    if vector is None:
+        return None
+    matches = index.search(vector, limit or settings.NOTES_SEARCH_MAX_RESULTS, exclude_note=note.id)
+    return _hits(index, matches)
@@ -1,9 +1,23 @@
+from django.conf import settings
+from django.db.models import BooleanField, ExpressionWrapper, Q
 from rest_framework import serializers
 from .models import Note
 from courses.models import Course
 
 
-class NoteSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Serializer that outputs only ``fields`` when given, for ``?fields=`` requests
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class NoteSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Full serializer for Note model
     """
@@ -17,11 +31,15 @@ class NoteSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'title', 'course', 'course_title', 'user',
             'raw_content', 'key_points', 'detailed_notes',
-            'audio_file_path', 'processing_status',
+            'audio_file_path', 'processing_status', 'processing_error',
+            'prompt_tokens', 'completion_tokens',
             'is_processed', 'has_content',
             'created_at', 'updated_at'
         )
-        read_only_fields = ('id', 'created_at', 'updated_at', 'is_processed', 'has_content')
+        read_only_fields = (
+            'id', 'processing_error', 'prompt_tokens', 'completion_tokens',
+            'created_at', 'updated_at', 'is_processed', 'has_content'
+        )
     
     def validate_course(self, value):
         """
@@ -74,3 +92,50 @@ class SearchNoteSerializer(serializers.Serializer):
     """
     query = serializers.CharField(max_length=200, required=True)
     course_id = serializers.IntegerField(required=False)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=settings.NOTES_SEARCH_MAX_RESULTS)
+
+
+# Columns behind the computed note fields; the content checks are answered by
+# the database so the text columns they look at are not loaded
+COMPUTED_NOTE_FIELDS = {
+    'course_title': ('course', 'course__title'),
+    'is_processed': ('processing_status',),
+    'has_content': (),
+}
+NOTE_CONTENT_FLAGS = {
+    'is_processed': ('has_ai_content', ~Q(key_points=[]) | ~Q(detailed_notes='')),
+    'has_content': ('has_any_content', ~Q(raw_content='') | ~Q(key_points=[]) | ~Q(detailed_notes='')),
+}
+
+
+def readable_note_fields():
+    return [name for name, field in NoteSerializer().fields.items() if not field.write_only]
+
+
+def requested_note_fields(request):
+    """
+    Field names from ``?fields=``, or None when the parameter is absent
+    """
+    value = request.query_params.get('fields', '').strip()
+    if not value:
+        return None
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = sorted(set(fields) - set(readable_note_fields()))
+    if unknown:
+        raise serializers.ValidationError({'fields': f"Unknown fields: {', '.join(unknown)}"})
+    return fields
+
+
+def only_note_fields(queryset, fields):
+    """
+    Load just the columns (and course join) the given serializer fields read
+    """
+    columns, annotations = {'id', 'updated_at'}, {}
+    for name in fields:
+        columns.update(COMPUTED_NOTE_FIELDS.get(name, (name,)))
+        if name in NOTE_CONTENT_FLAGS:
+            alias, condition = NOTE_CONTENT_FLAGS[name]
+            annotations[alias] = ExpressionWrapper(condition, output_field=BooleanField())
+    if 'course__title' in columns:
+        queryset = queryset.select_related('course')
+    return queryset.only(*columns).annotate(**annotations)
@@ -0,0 +1,24 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import search
+from .models import Note
+
+# Notes mid-pipeline are saved repeatedly with partial text; they are indexed
+# once processing finishes or fails
+UNINDEXED_STATUSES = ('transcribing', 'processing')
+INDEX_FIELDS = {'title', 'course', 'raw_content', 'key_points', 'detailed_notes', 'processing_status'}
+
+
+@receiver(post_save, sender=Note)
+def index_saved_note(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or instance.processing_status in UNINDEXED_STATUSES:
+        return
+    if update_fields is not None and not INDEX_FIELDS.intersection(update_fields):
+        return
+    search.index_note(instance)
+
+
+@receiver(post_delete, sender=Note)
+def remove_deleted_note(sender, instance, **kwargs):
+    search.remove_note(instance.id)
@@ -1,3 +1,265 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from ai_services.jobs import claim_job, complete_job, run_job
+from courses.models import Course
+from utils.pagination import KeysetPagination
+from . import search, semantic
+from .models import Note
+from .serializers import only_note_fields
+
+
+class NoteSearchTests(TestCase):
+    """
+    Run against the FTS5 index; PythonNoteSearchTests repeats them on the postings index
+    """
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+        self.other = User.objects.create_user(username='bob', email='bob@example.com', password='pw')
+        self.course = Course.objects.create(user=self.user, title='Biology')
+        self.cell = self._note(
+            'Cell membranes', raw_content='The lecture covered lipids and how membranes control transport.'
+        )
+        self.genetics = self._note(
+            'Genetics', raw_content='Mendel crossed peas. A short aside mentioned membranes once.',
+            key_points=['Dominant and recessive alleles']
+        )
+        for topic in ('Evolution', 'Ecology', 'Anatomy', 'Botany'):
+            self._note(topic, raw_content=f'Introduction to {topic.lower()}.')
+        other_course = Course.objects.create(user=self.other, title='Biology')
+        Note.objects.create(user=self.other, course=other_course, title='Membranes', raw_content='membranes')
+
+    def _note(self, title, **fields):
+        return Note.objects.create(user=self.user, course=self.course, title=title, **fields)
+
+    def test_title_matches_rank_first_with_snippets(self):
+        results = search.search_notes(self.user, 'membranes')
+
+        self.assertEqual(results.count, 2)
+        self.assertEqual([hit.note_id for hit in results.hits], [self.cell.id, self.genetics.id])
+        self.assertGreater(results.hits[0].score, results.hits[1].score)
+        self.assertIn('<mark>membranes</mark>', results.hits[0].snippet)
+
+    def test_key_points_are_searchable_and_terms_are_anded(self):
+        self.assertEqual([hit.note_id for hit in search.search_notes(self.user, 'recessive').hits], [self.genetics.id])
+        self.assertEqual(search.search_notes(self.user, 'membranes lipids').count, 1)
+
+    def test_searches_stay_within_the_user_and_course(self):
+        other_course = Course.objects.create(user=self.user, title='Chemistry')
+        Note.objects.create(user=self.user, course=other_course, title='Membranes in batteries')
+
+        self.assertEqual(search.search_notes(self.user, 'membranes').count, 3)
+        self.assertEqual(search.search_notes(self.user, 'membranes', course_id=self.course.id).count, 2)
+        self.assertEqual(search.search_notes(self.user, f'u{self.user.id}').count, 0)
+
+    def test_index_follows_edits_and_deletes(self):
+        self.cell.title = 'Osmosis'
+        self.cell.raw_content = 'Water crosses by osmosis.'
+        self.cell.save()
+        self.assertEqual([hit.note_id for hit in search.search_notes(self.user, 'membranes').hits], [self.genetics.id])
+
+        self.genetics.delete()
+        self.assertEqual(search.search_notes(self.user, 'membranes').count, 0)
+
+    def test_notes_are_indexed_once_processing_finishes(self):
+        note = self._note('Lecture 3', processing_status='processing')
+        note.detailed_notes = 'Photosynthesis happens in chloroplasts.'
+        note.save(update_fields=['detailed_notes', 'updated_at'])
+        self.assertEqual(search.search_notes(self.user, 'chloroplasts').count, 0)
+
+        note.processing_status = 'completed'
+        note.save()
+        self.assertEqual(search.search_notes(self.user, 'chloroplasts').count, 1)
+
+
+@override_settings(NOTES_SEARCH_BACKEND='python')
+class PythonNoteSearchTests(NoteSearchTests):
+    pass
+
+
+class SemanticSearchTests(TestCase):
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+        course = Course.objects.create(user=self.user, title='Biology')
+        notes = {
+            'respiration': ('Cellular respiration', ['Mitochondria produce ATP'],
+                            'Glycolysis feeds the Krebs cycle; oxidative phosphorylation in mitochondria yields ATP.'),
+            'photosynthesis': ('Photosynthesis', ['Chloroplasts capture light'],
+                               'Light reactions in chloroplasts make ATP and NADPH for the Calvin cycle.'),
+            'history': ('French revolution', ['The Estates-General met in 1789'],
+                        'Debt and bread prices led to the storming of the Bastille.'),
+        }
+        self.notes = {}
+        for key, (title, key_points, detailed) in notes.items():
+            self.notes[key] = Note.objects.create(
+                user=self.user, course=course, title=title, key_points=key_points, detailed_notes=detailed,
+                processing_status='completed'
+            )
+            semantic.index_note(self.notes[key])
+
+    def test_search_matches_inflections_and_returns_passages(self):
+        hits = semantic.semantic_search(self.user, 'mitochondrial respiration')
+
+        self.assertEqual(hits[0].note_id, self.notes['respiration'].id)
+        self.assertIn('Mitochondria', hits[0].passage)
+        self.assertNotIn(self.notes['history'].id, [hit.note_id for hit in hits])
+
+    def test_related_notes_exclude_the_note_and_follow_reindexing(self):
+        related = semantic.related_notes(self.notes['respiration'])
+        self.assertEqual(related[0].note_id, self.notes['photosynthesis'].id)
+        self.assertNotIn(self.notes['respiration'].id, [hit.note_id for hit in related])
+
+        history = self.notes['history']
+        history.detailed_notes = 'Mitochondria and the Krebs cycle produce ATP during respiration.'
+        semantic.index_note(history)
+        self.assertEqual(semantic.related_notes(self.notes['respiration'])[0].note_id, history.id)
+
+    def test_hand_edits_are_embedded_by_a_queued_job(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        history = self.notes['history']
+        for text in ('Mitochondria make ATP.', 'Mitochondria and the Krebs cycle produce ATP during respiration.'):
+            response = client.put(f'/api/notes/{history.id}/', {'detailed_notes': text}, format='json')
+            self.assertEqual(response.status_code, 200)
+
+        history.refresh_from_db()
+        self.assertEqual(history.processing_status, 'completed')
+        self.assertNotEqual(semantic.related_notes(self.notes['respiration'])[0].note_id, history.id)
+
+        job = claim_job('worker-1')
+        self.assertEqual(job.job_type, 'index_note')
+        run_job(job)
+        self.assertTrue(complete_job(job))
+        self.assertIsNone(claim_job('worker-1'))
+        self.assertEqual(semantic.related_notes(self.notes['respiration'])[0].note_id, history.id)
+
+
+    def test_moving_a_note_to_another_course_reindexes_it(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        history = self.notes['history']
+        course = self.notes['respiration'].course
+        self.assertEqual(semantic.semantic_search(self.user, 'Bastille', course_id=course.id)[0].note_id, history.id)
+
+        other = Course.objects.create(user=self.user, title='History')
+        response = client.put(f'/api/notes/{history.id}/', {'course': other.id}, format='json')
+        self.assertEqual(response.status_code, 200)
+        run_job(claim_job('worker-1'))
+
+        self.assertNotIn(
+            history.id, [hit.note_id for hit in semantic.semantic_search(self.user, 'Bastille', course_id=course.id)]
+        )
+        self.assertEqual(semantic.semantic_search(self.user, 'Bastille', course_id=other.id)[0].note_id, history.id)
+
+class VectorIndexTests(SimpleTestCase):
+
+    @override_settings(NOTES_SEMANTIC_IVF_MIN_VECTORS=100, NOTES_SEMANTIC_IVF_PROBES=2)
+    def test_ivf_search_finds_the_exhaustive_nearest_neighbour(self):
+        rng = np.random.default_rng(1)
+        centres = semantic._normalize(rng.normal(size=(10, 32)).astype(np.float32))
+        vectors = semantic._normalize(
+            np.repeat(centres, 50, axis=0) + rng.normal(scale=0.1, size=(500, 32)).astype(np.float32)
+        )
+        ids = np.arange(500, dtype=np.int64)
+        index = semantic.VectorIndex(ids, ids, np.zeros(500, dtype=np.int64), vectors)
+        self.assertIsNotNone(index.centroids)
+
+        for query in vectors[::50]:
+            exhaustive = int(np.argmax(vectors @ query))
+            self.assertEqual(index.search(query, 1)[0][0], exhaustive)
+            self.assertLess(len(index.candidates(query)), 500)
+
+
+class NoteListPaginationTests(TestCase):
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+        course = Course.objects.create(user=self.user, title='Biology')
+        self.notes = [
+            Note.objects.create(user=self.user, course=course, title=f'Lecture {index}') for index in range(7)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _pages(self, **params):
+        pages, cursor = [], None
+        while True:
+            query = dict(params, cursor=cursor) if cursor else params
+            body = self.client.get('/api/notes/', query).json()
+            pages.append(body)
+            cursor = body['next_cursor']
+            if not cursor:
+                return pages
+
+    def test_pages_walk_every_note_newest_first(self):
+        pages = self._pages(page_size=3)
+
+        ids = [note['id'] for page in pages for note in page['notes']]
+        self.assertEqual(ids, [note.id for note in reversed(self.notes)])
+        self.assertEqual([len(page['notes']) for page in pages], [3, 3, 1])
+        self.assertEqual(pages[0]['count'], 7)
+        self.assertFalse(pages[-1]['has_more'])
+
+    def test_edits_between_pages_do_not_repeat_notes(self):
+        first = self.client.get('/api/notes/', {'page_size': 3, 'count': 'false'}).json()
+        self.assertNotIn('count', first)
+
+        edited = Note.objects.get(id=first['notes'][0]['id'])
+        edited.title = 'Lecture 6 (revised)'
+        edited.save()
+        rest = self.client.get('/api/notes/', {'page_size': 10, 'cursor': first['next_cursor']}).json()
+
+        ids = [note['id'] for note in first['notes'] + rest['notes']]
+        self.assertEqual(sorted(ids), sorted(note.id for note in self.notes))
+
+    def test_listings_are_paged_by_default_and_reject_bad_cursors(self):
+        body = self.client.get('/api/notes/').json()
+
+        self.assertEqual(set(body), {'notes', 'count', 'next_cursor', 'has_more'})
+        self.assertEqual(body['count'], 7)
+        self.assertEqual(len(body['notes']), 7)
+        with mock.patch.object(KeysetPagination, 'max_page_size', 5):
+            self.assertEqual(len(self.client.get('/api/notes/', {'page_size': 1000}).json()['notes']), 5)
+        self.assertEqual(self.client.get('/api/notes/', {'cursor': 'not-a-cursor'}).status_code, 400)
+
+
+class NoteSparseFieldsTests(TestCase):
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+        course = Course.objects.create(user=self.user, title='Biology')
+        self.note = Note.objects.create(
+            user=self.user, course=course, title='Lecture', raw_content='transcript ' * 1000,
+            key_points=['Cells'], processing_status='completed'
+        )
+        Note.objects.create(user=self.user, course=course, title='Empty', processing_status='completed')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_listing_returns_and_loads_only_requested_fields(self):
+        with self.assertNumQueries(1):
+            body = self.client.get('/api/notes/', {'fields': 'id,course_title,is_processed', 'count': 'false'}).json()
+
+        self.assertEqual(body['notes'], [
+            {'id': self.note.id + 1, 'course_title': 'Biology', 'is_processed': False},
+            {'id': self.note.id, 'course_title': 'Biology', 'is_processed': True},
+        ])
+        loaded = only_note_fields(Note.objects.all(), ['id', 'course_title', 'is_processed']).first()
+        self.assertTrue({'raw_content', 'key_points', 'detailed_notes'} <= loaded.get_deferred_fields())
+
+    def test_detail_accepts_any_note_field_and_rejects_unknown_ones(self):
+        body = self.client.get(f'/api/notes/{self.note.id}/', {'fields': 'title,key_points,has_content'}).json()
+        self.assertEqual(body, {'title': 'Lecture', 'key_points': ['Cells'], 'has_content': True})
+
+        response = self.client.get('/api/notes/', {'fields': 'title,secret'})
+        self.assertEqual(response.status_code, 400)
@@ -7,5 +7,7 @@ urlpatterns = [
     path('', views.note_list, name='note_list'),
     path('<int:note_id>/', views.note_detail, name='note_detail'),
     path('<int:note_id>/reprocess/', views.reprocess_note, name='reprocess_note'),
+    path('<int:note_id>/related/', views.related_notes, name='related_notes'),
     path('search/', views.search_notes, name='search_notes'),
+    path('semantic-search/', views.semantic_search_notes, name='semantic_search_notes'),
 ]
@@ -1,18 +1,23 @@
+from functools import partial
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from django.conf import settings
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
 from .models import Note
+from . import search, semantic
 from courses.models import Course
 from .serializers import (
     NoteSerializer,
     NoteListSerializer,
     NoteCreateSerializer,
-    SearchNoteSerializer
+    SearchNoteSerializer,
+    only_note_fields,
+    requested_note_fields
 )
-from ai_services.services import process_note_with_ai
+from ai_services.jobs import enqueue_note_indexing, enqueue_note_processing
+from utils.pagination import KeysetPagination
 
 
 @api_view(['GET', 'POST'])
@@ -29,24 +34,25 @@ def note_list(request):
         if course_id:
             notes = notes.filter(course_id=course_id)
         
-        serializer = NoteListSerializer(notes, many=True)
-        return Response({
-            'notes': serializer.data,
-            'count': notes.count()
-        }, status=status.HTTP_200_OK)
+        notes, fields = _note_fields(request, notes)
+        paginator = KeysetPagination(request)
+        page = paginator.paginate_queryset(notes)
+        serializer = _note_serializer(fields)(page, many=True)
+        return Response(paginator.get_response_data('notes', serializer.data), status=status.HTTP_200_OK)
     
     elif request.method == 'POST':
         serializer = NoteCreateSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             note = serializer.save()
             
-            # Trigger AI processing if raw_content is provided
+            # Queue AI processing if raw_content is provided
             if note.raw_content:
-                try:
-                    process_note_with_ai(note.id)
-                except Exception as e:
-                    # Log error but don't fail the creation
-                    print(f"AI processing failed for note {note.id}: {str(e)}")
+                job = enqueue_note_processing(note)
+                return Response({
+                    'note': NoteSerializer(note).data,
+                    'job_id': job.id,
+                    'message': 'Note created successfully, AI processing queued'
+                }, status=status.HTTP_202_ACCEPTED)
             
             return Response({
                 'note': NoteSerializer(note).data,
@@ -61,14 +67,17 @@ def note_detail(request, note_id):
     """
     Retrieve, update, or delete a specific note
     """
-    note = get_object_or_404(Note, id=note_id, user=request.user)
-    
     if request.method == 'GET':
-        serializer = NoteSerializer(note)
+        notes, fields = _note_fields(request, Note.objects.all(), default=NoteSerializer)
+        note = get_object_or_404(notes, id=note_id, user=request.user)
+        serializer = NoteSerializer(note, fields=fields)
         return Response(serializer.data, status=status.HTTP_200_OK)
     
-    elif request.method == 'PUT':
+    note = get_object_or_404(Note, id=note_id, user=request.user)
+    
+    if request.method == 'PUT':
         old_raw_content = note.raw_content
+        old_text = (note.title, note.key_points, note.detailed_notes, note.course_id)
         serializer = NoteSerializer(
             note, 
             data=request.data, 
@@ -78,12 +87,20 @@ def note_detail(request, note_id):
         if serializer.is_valid():
             note = serializer.save()
             
-            # Re-process with AI if raw_content changed
+            # Queue re-processing with AI if raw_content changed
             if note.raw_content != old_raw_content and note.raw_content:
-                try:
-                    process_note_with_ai(note.id)
-                except Exception as e:
-                    print(f"AI processing failed for note {note.id}: {str(e)}")
+                job = enqueue_note_processing(note)
+                return Response({
+                    'note': NoteSerializer(note).data,
+                    'job_id': job.id,
+                    'message': 'Note updated successfully, AI processing queued'
+                }, status=status.HTTP_202_ACCEPTED)
+            
+            # Processing refreshes the vectors itself; hand edits queue it so
+            # embedding never holds up the response. Moves to another course
+            # re-index too, since the cached vector index keys on the course
+            if (note.title, note.key_points, note.detailed_notes, note.course_id) != old_text and note.is_processed:
+                enqueue_note_indexing(note)
             
             return Response({
                 'note': serializer.data,
@@ -102,7 +119,7 @@ def note_detail(request, note_id):
 @permission_classes([IsAuthenticated])
 def reprocess_note(request, note_id):
     """
-    Manually trigger AI reprocessing for a note and return the updated note
+    Queue AI reprocessing for a note and return the queued note
     """
     note = get_object_or_404(Note, id=note_id, user=request.user)
     
@@ -111,21 +128,13 @@ def reprocess_note(request, note_id):
             'error': 'Cannot reprocess note without raw content'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    try:
-        # Process the note and get the updated note object
-        updated_note = process_note_with_ai(note.id)
-        
-        # Return the updated note data
-        from notes.serializers import NoteSerializer
-        serializer = NoteSerializer(updated_note)
-        return Response({
-            'message': 'Note reprocessed successfully',
-            'note': serializer.data
-        }, status=status.HTTP_200_OK)
-    except Exception as e:
-        return Response({
-            'error': f'AI processing failed: {str(e)}'
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    job = enqueue_note_processing(note, priority='reprocess')
+    serializer = NoteSerializer(note)
+    return Response({
+        'message': 'Note reprocessing queued',
+        'job_id': job.id,
+        'note': serializer.data
+    }, status=status.HTTP_202_ACCEPTED)
 
 
 @api_view(['POST'])
@@ -139,31 +148,106 @@ def search_notes(request):
         query = serializer.validated_data['query']
         course_id = serializer.validated_data.get('course_id')
         
-        # Build search query
-        notes = Note.objects.filter(user=request.user)
-        
-        if course_id:
-            notes = notes.filter(course_id=course_id)
-        
-        # Search across all text fields
-        search_query = Q(title__icontains=query) | \
-                      Q(raw_content__icontains=query) | \
-                      Q(detailed_notes__icontains=query)
-        
-        # Search in key_points array (this might need adjustment based on MongoDB setup)
-        try:
-            notes = notes.filter(search_query)
-        except Exception:
-            # Fallback to simpler search if complex query fails
-            notes = notes.filter(
-                Q(title__icontains=query) | Q(raw_content__icontains=query)
-            )
+        # Ranked by BM25 over title, key points, detailed notes and transcript
+        results = search.search_notes(
+            request.user, query, course_id=course_id, limit=serializer.validated_data.get('limit')
+        )
+        ranked = _ranked_notes(request, results.hits, 'snippet', user=request.user)
         
-        serializer = NoteListSerializer(notes, many=True)
         return Response({
-            'notes': serializer.data,
-            'count': notes.count(),
+            'notes': ranked,
+            'count': results.count,
+            'query': query
+        }, status=status.HTTP_200_OK)
+    
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+def _note_fields(request, notes, default=NoteListSerializer):
+    """
+    Restrict a note queryset to the ``?fields=`` sparse fieldset, or to what
+    ``default`` outputs; returns it with the requested field names
+    """
+    fields = requested_note_fields(request)
+    return only_note_fields(notes, fields or default.Meta.fields), fields
+
+
+def _note_serializer(fields):
+    """
+    Listing serializer for a sparse fieldset: any note field may be requested
+    """
+    if fields is None:
+        return NoteListSerializer
+    return partial(NoteSerializer, fields=fields)
+
+
+def _ranked_notes(request, hits, text_field, **extra_filters):
+    """
+    List data of the notes behind search hits, in hit order, with each hit's
+    score and matching text
+    """
+    notes, fields = _note_fields(request, Note.objects.filter(id__in=[hit.note_id for hit in hits], **extra_filters))
+    serializer_class = _note_serializer(fields)
+    notes_by_id = {note.id: note for note in notes}
+    ranked = []
+    for hit in hits:
+        note = notes_by_id.get(hit.note_id)
+        if note is None:
+            continue
+        data = serializer_class(note).data
+        data['score'] = hit.score
+        data[text_field] = getattr(hit, text_field)
+        ranked.append(data)
+    return ranked
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def semantic_search_notes(request):
+    """
+    Search notes by meaning rather than exact words
+    """
+    serializer = SearchNoteSerializer(data=request.data)
+    if serializer.is_valid():
+        query = serializer.validated_data['query']
+        course_id = serializer.validated_data.get('course_id')
+        hits = semantic.semantic_search(
+            request.user, query, course_id=course_id, limit=serializer.validated_data.get('limit')
+        )
+        # The course is re-checked in case a note moved since it was embedded
+        filters = {'course_id': course_id} if course_id else {}
+        ranked = _ranked_notes(request, hits, 'passage', user=request.user, **filters)
+        return Response({
+            'notes': ranked,
+            'count': len(ranked),
             'query': query
         }, status=status.HTTP_200_OK)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def related_notes(request, note_id):
+    """
+    Other notes of the user closest in meaning to a note
+    """
+    note = get_object_or_404(Note, id=note_id, user=request.user)
+    
+    try:
+        limit = min(int(request.query_params.get('limit', 10)), settings.NOTES_SEARCH_MAX_RESULTS)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    hits = semantic.related_notes(note, limit=max(limit, 1))
+    if hits is None:
+        return Response({
+            'error': 'Note has not been indexed yet'
+        }, status=status.HTTP_409_CONFLICT)
+    
+    ranked = _ranked_notes(request, hits, 'passage', user=request.user)
+    return Response({
+        'note_id': note.id,
+        'notes': ranked,
+        'count': len(ranked)
+    }, status=status.HTTP_200_OK)
@@ -182,14 +182,159 @@ AUTH_USER_MODEL = 'authentication.User'
 # AI Services Configuration
 OPENAI_API_KEY = get_openai_api_key(project_id=config('GCP_SECRET_ID', default=''))
 
+OPENAI_MODEL = config('OPENAI_MODEL', default='gpt-3.5-turbo')
+OPENAI_TEMPERATURE = config('OPENAI_TEMPERATURE', default=0.3, cast=float)
+# Connection pool for the shared OpenAI client
+OPENAI_MAX_CONNECTIONS = config('OPENAI_MAX_CONNECTIONS', default=20, cast=int)
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = config('OPENAI_MAX_KEEPALIVE_CONNECTIONS', default=10, cast=int)
+OPENAI_KEEPALIVE_EXPIRY = config('OPENAI_KEEPALIVE_EXPIRY', default=60.0, cast=float)
+OPENAI_TIMEOUT = config('OPENAI_TIMEOUT', default=120.0, cast=float)
+# Provider call governors: requests per second, burst size and the ceiling of the
+# adaptive (AIMD) concurrency limit, per provider and per process
+OPENAI_RATE_LIMIT_RPS = config('OPENAI_RATE_LIMIT_RPS', default=50.0, cast=float)
+OPENAI_RATE_LIMIT_BURST = config('OPENAI_RATE_LIMIT_BURST', default=50, cast=int)
+OPENAI_MAX_CONCURRENCY = config('OPENAI_MAX_CONCURRENCY', default=16, cast=int)
+SPEECH_RATE_LIMIT_RPS = config('SPEECH_RATE_LIMIT_RPS', default=10.0, cast=float)
+SPEECH_RATE_LIMIT_BURST = config('SPEECH_RATE_LIMIT_BURST', default=10, cast=int)
+SPEECH_MAX_CONCURRENCY = config('SPEECH_MAX_CONCURRENCY', default=8, cast=int)
+# Retries of rate-limited and transient provider errors, with jittered exponential backoff
+PROVIDER_RETRY_ATTEMPTS = config('PROVIDER_RETRY_ATTEMPTS', default=4, cast=int)
+PROVIDER_RETRY_BASE_SECONDS = config('PROVIDER_RETRY_BASE_SECONDS', default=1.0, cast=float)
+PROVIDER_RETRY_MAX_SECONDS = config('PROVIDER_RETRY_MAX_SECONDS', default=30.0, cast=float)
+# Consecutive failures that open a provider's circuit, and how long it stays open
+PROVIDER_BREAKER_THRESHOLD = config('PROVIDER_BREAKER_THRESHOLD', default=5, cast=int)
+PROVIDER_BREAKER_RESET_SECONDS = config('PROVIDER_BREAKER_RESET_SECONDS', default=60.0, cast=float)
+# How key points and detailed notes are requested: sequential, parallel or fused
+AI_GENERATION_MODE = config('AI_GENERATION_MODE', default='parallel')
+# Transcripts longer than AI_CHUNK_TOKENS are summarized in chunks, AI_MAP_CONCURRENCY at a time
+AI_CHUNK_TOKENS = config('AI_CHUNK_TOKENS', default=3000, cast=int)
+AI_MAP_CONCURRENCY = config('AI_MAP_CONCURRENCY', default=4, cast=int)
+# Notes longer than AI_CHUNK_TOKENS are summarized as content-defined segments of about
+# AI_SEGMENT_TOKENS (never more than a chunk) so edits only re-summarize the segments
+# they touch; 0 turns this off and long notes use plain chunks
+AI_SEGMENT_TOKENS = config('AI_SEGMENT_TOKENS', default=2000, cast=int)
+# Stream the final detailed notes completion, saving the partial text at most every
+# AI_STREAM_CHECKPOINT_SECONDS so clients can read it before generation finishes
+AI_STREAM_DETAILED_NOTES = config('AI_STREAM_DETAILED_NOTES', default=True, cast=bool)
+AI_STREAM_CHECKPOINT_SECONDS = config('AI_STREAM_CHECKPOINT_SECONDS', default=0.5, cast=float)
+# Prompt plus completion tokens allowed per request; larger inputs are trimmed to fit
+AI_REQUEST_TOKEN_BUDGET = config('AI_REQUEST_TOKEN_BUDGET', default=12000, cast=int)
+# Cache of generated notes keyed by content hash, prompt version, model and temperature
+AI_CACHE_ENABLED = config('AI_CACHE_ENABLED', default=True, cast=bool)
+AI_CACHE_MAX_ENTRIES = config('AI_CACHE_MAX_ENTRIES', default=5000, cast=int)
+AI_CACHE_TTL_SECONDS = config('AI_CACHE_TTL_SECONDS', default=60 * 60 * 24 * 30, cast=int)
+# Server-Sent Events stream of note processing updates: how often each serving process
+# checks for changes made by workers, heartbeat and reconnect timings, per-stream buffer
+EVENTS_POLL_INTERVAL = config('EVENTS_POLL_INTERVAL', default=1.0, cast=float)
+EVENTS_HEARTBEAT_SECONDS = config('EVENTS_HEARTBEAT_SECONDS', default=15.0, cast=float)
+EVENTS_MAX_STREAM_SECONDS = config('EVENTS_MAX_STREAM_SECONDS', default=300.0, cast=float)
+EVENTS_RETRY_MS = config('EVENTS_RETRY_MS', default=2000, cast=int)
+EVENTS_QUEUE_SIZE = config('EVENTS_QUEUE_SIZE', default=100, cast=int)
+# Pipeline metrics at /api/ai/metrics/. With several server or worker processes set
+# METRICS_DIR to a directory on the same host they share; each writes its totals there,
+# a scrape sums them and folds the files of exited processes into one
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+METRICS_DIR = config('METRICS_DIR', default='')
+METRICS_FLUSH_SECONDS = config('METRICS_FLUSH_SECONDS', default=5.0, cast=float)
+
 GOOGLE_CLOUD_SPEECH_CREDENTIALS_PATH = config('GOOGLE_CLOUD_SPEECH_CREDENTIALS_PATH', default='')
+
+# Factories for the provider clients. Point these at ai_services.fakes.build_fake_llm_client
+# and ai_services.fakes.build_fake_speech_client to run the pipeline offline
+AI_LLM_BACKEND = config('AI_LLM_BACKEND', default='ai_services.clients.build_openai_client')
+AI_SPEECH_BACKEND = config('AI_SPEECH_BACKEND', default='ai_services.clients.build_speech_client')
+# Behaviour of the offline fakes: median latency (log-normal with FAKE_PROVIDER_LATENCY_SIGMA),
+# injected error rate, output sizes and random seed
+FAKE_PROVIDER_LATENCY_SIGMA = config('FAKE_PROVIDER_LATENCY_SIGMA', default=0.3, cast=float)
+FAKE_PROVIDER_ERROR_RATE = config('FAKE_PROVIDER_ERROR_RATE', default=0.0, cast=float)
+FAKE_PROVIDER_SEED = config('FAKE_PROVIDER_SEED', default=0, cast=int)
+FAKE_LLM_LATENCY_SECONDS = config('FAKE_LLM_LATENCY_SECONDS', default=0.5, cast=float)
+FAKE_LLM_SECONDS_PER_TOKEN = config('FAKE_LLM_SECONDS_PER_TOKEN', default=0.002, cast=float)
+FAKE_LLM_OUTPUT_TOKENS = config('FAKE_LLM_OUTPUT_TOKENS', default=400, cast=int)
+FAKE_SPEECH_LATENCY_SECONDS = config('FAKE_SPEECH_LATENCY_SECONDS', default=0.3, cast=float)
+FAKE_SPEECH_SECONDS_PER_AUDIO_SECOND = config('FAKE_SPEECH_SECONDS_PER_AUDIO_SECOND', default=0.01, cast=float)
+FAKE_SPEECH_WORDS_PER_SECOND = config('FAKE_SPEECH_WORDS_PER_SECOND', default=2.5, cast=float)
+# Speech recognition API: sync, streaming, long_running, or auto to pick by file size
+SPEECH_TRANSCRIPTION_MODE = config('SPEECH_TRANSCRIPTION_MODE', default='auto')
+# Detect each recording's format and re-encode uncompressed, high-rate or unsupported
+# audio to 16 kHz mono FLAC (needs ffmpeg) before sending it for recognition
+SPEECH_PREPROCESS_AUDIO = config('SPEECH_PREPROCESS_AUDIO', default=True, cast=bool)
+# Cut spans without speech (energy and zero-crossing voice activity detection) before
+# recognition when at least SPEECH_VAD_MIN_SAVING of the recording is silence
+SPEECH_VAD_ENABLED = config('SPEECH_VAD_ENABLED', default=True, cast=bool)
+SPEECH_VAD_PADDING_SECONDS = config('SPEECH_VAD_PADDING_SECONDS', default=0.3, cast=float)
+SPEECH_VAD_MIN_SILENCE_SECONDS = config('SPEECH_VAD_MIN_SILENCE_SECONDS', default=1.0, cast=float)
+SPEECH_VAD_MIN_SAVING = config('SPEECH_VAD_MIN_SAVING', default=0.05, cast=float)
+# Bitrate of audio the app re-encodes itself (speech-only recordings, parallel segments)
+SPEECH_OPUS_BITRATE = config('SPEECH_OPUS_BITRATE', default='24k')
+# Longest audio sent to synchronous recognition (limit 60 s) and to one stream (limit
+# about 5 min), with a safety margin; longer recordings use long-running recognition
+SPEECH_SYNC_MAX_SECONDS = config('SPEECH_SYNC_MAX_SECONDS', default=55.0, cast=float)
+SPEECH_STREAMING_MAX_SECONDS = config('SPEECH_STREAMING_MAX_SECONDS', default=290.0, cast=float)
+# Size limits used instead when a recording's duration cannot be determined
+SPEECH_SYNC_MAX_BYTES = config('SPEECH_SYNC_MAX_BYTES', default=480 * 1024, cast=int)
+SPEECH_STREAMING_MAX_BYTES = config('SPEECH_STREAMING_MAX_BYTES', default=2 * 1024 * 1024, cast=int)
+# Largest local file sent inline to long-running recognition (the API rejects more than
+# 10 MB); long recordings are transcribed in segments instead whenever they can be decoded
+SPEECH_INLINE_MAX_BYTES = config('SPEECH_INLINE_MAX_BYTES', default=10 * 1024 * 1024, cast=int)
+SPEECH_STREAM_CHUNK_BYTES = config('SPEECH_STREAM_CHUNK_BYTES', default=16 * 1024, cast=int)
+SPEECH_LONG_RUNNING_TIMEOUT = config('SPEECH_LONG_RUNNING_TIMEOUT', default=3600, cast=int)
+SPEECH_GRPC_KEEPALIVE_MS = config('SPEECH_GRPC_KEEPALIVE_MS', default=30000, cast=int)
+# Long recordings are cut at quiet points and transcribed on a process pool
+SPEECH_PARALLEL_WORKERS = config('SPEECH_PARALLEL_WORKERS', default=4, cast=int)
+SPEECH_PARALLEL_START_METHOD = config('SPEECH_PARALLEL_START_METHOD', default='spawn')
+SPEECH_SEGMENT_SECONDS = config('SPEECH_SEGMENT_SECONDS', default=50.0, cast=float)
+SPEECH_SEGMENT_SEARCH_SECONDS = config('SPEECH_SEGMENT_SEARCH_SECONDS', default=10.0, cast=float)
+SPEECH_SEGMENT_OVERLAP_SECONDS = config('SPEECH_SEGMENT_OVERLAP_SECONDS', default=0.5, cast=float)
+FFMPEG_BINARY = config('FFMPEG_BINARY', default='ffmpeg')
 # Google Cloud Configuration
 GOOGLE_CLOUD_PROJECT = config('GOOGLE_CLOUD_PROJECT', default='')
 
+# Background AI job queue
+AI_JOB_LEASE_SECONDS = config('AI_JOB_LEASE_SECONDS', default=900, cast=int)
+AI_JOB_MAX_ATTEMPTS = config('AI_JOB_MAX_ATTEMPTS', default=3, cast=int)
+AI_JOB_RETRY_BACKOFF_SECONDS = config('AI_JOB_RETRY_BACKOFF_SECONDS', default=30, cast=int)
+AI_WORKER_CONCURRENCY = config('AI_WORKER_CONCURRENCY', default=2, cast=int)
+AI_WORKER_POLL_INTERVAL = config('AI_WORKER_POLL_INTERVAL', default=2.0, cast=float)
+# Weighted-fair sharing of workers between interactive jobs, user-triggered reprocessing and
+# bulk batches, measured over the claims of the last AI_PRIORITY_WINDOW_SECONDS
+AI_PRIORITY_WEIGHT_INTERACTIVE = config('AI_PRIORITY_WEIGHT_INTERACTIVE', default=8, cast=int)
+AI_PRIORITY_WEIGHT_REPROCESS = config('AI_PRIORITY_WEIGHT_REPROCESS', default=3, cast=int)
+AI_PRIORITY_WEIGHT_BATCH = config('AI_PRIORITY_WEIGHT_BATCH', default=1, cast=int)
+AI_PRIORITY_WINDOW_SECONDS = config('AI_PRIORITY_WINDOW_SECONDS', default=300, cast=int)
+# Jobs of one user that may run at the same time (a soft limit on SQLite, which has no row locks)
+AI_USER_MAX_CONCURRENCY = config('AI_USER_MAX_CONCURRENCY', default=4, cast=int)
+# Default number of jobs of one course reprocess batch that may run at the same time
+AI_REPROCESS_CONCURRENCY = config('AI_REPROCESS_CONCURRENCY', default=4, cast=int)
+
 # Media files configuration
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Audio uploads are streamed to disk in chunks and rejected above this size
+AUDIO_UPLOAD_MAX_BYTES = config('AUDIO_UPLOAD_MAX_BYTES', default=500 * 1024 * 1024, cast=int)
+AUDIO_UPLOAD_CHUNK_BYTES = config('AUDIO_UPLOAD_CHUNK_BYTES', default=64 * 1024, cast=int)
+# Resumable uploads append chunks of up to AUDIO_UPLOAD_SESSION_CHUNK_BYTES to a spool file
+AUDIO_UPLOAD_SESSION_CHUNK_BYTES = config('AUDIO_UPLOAD_SESSION_CHUNK_BYTES', default=8 * 1024 * 1024, cast=int)
+AUDIO_UPLOAD_SPOOL_DIR = config('AUDIO_UPLOAD_SPOOL_DIR', default=str(MEDIA_ROOT / 'upload_spool'))
+# Unfinished sessions idle this long are deleted together with their spool files
+AUDIO_UPLOAD_SESSION_EXPIRY_SECONDS = config('AUDIO_UPLOAD_SESSION_EXPIRY_SECONDS', default=24 * 3600, cast=int)
+
+# Note search: 'auto' uses the SQLite FTS5 index when the database has one and the
+# Python postings index otherwise; 'python' always uses the postings index
+NOTES_SEARCH_BACKEND = config('NOTES_SEARCH_BACKEND', default='auto')
+NOTES_SEARCH_MAX_RESULTS = config('NOTES_SEARCH_MAX_RESULTS', default=50, cast=int)
+# Semantic search embeds note chunks with NOTES_EMBEDDER: the local hashing embedder
+# (NOTES_EMBEDDING_DIM wide) or notes.semantic.OpenAIEmbedder with NOTES_EMBEDDING_MODEL
+NOTES_EMBEDDER = config('NOTES_EMBEDDER', default='notes.semantic.HashingEmbedder')
+NOTES_EMBEDDING_DIM = config('NOTES_EMBEDDING_DIM', default=256, cast=int)
+NOTES_EMBEDDING_MODEL = config('NOTES_EMBEDDING_MODEL', default='text-embedding-3-small')
+NOTES_EMBEDDING_CHUNK_TOKENS = config('NOTES_EMBEDDING_CHUNK_TOKENS', default=256, cast=int)
+# Users with this many vectors are searched through an IVF index probing the nearest cells
+NOTES_SEMANTIC_IVF_MIN_VECTORS = config('NOTES_SEMANTIC_IVF_MIN_VECTORS', default=5000, cast=int)
+NOTES_SEMANTIC_IVF_PROBES = config('NOTES_SEMANTIC_IVF_PROBES', default=8, cast=int)
+NOTES_SEMANTIC_CACHE_USERS = config('NOTES_SEMANTIC_CACHE_USERS', default=64, cast=int)
+
 # Logging configuration
 LOGGING = {
     'version': 1,
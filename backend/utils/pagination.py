@@ -0,0 +1,87 @@
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ParseError
+from rest_framework.pagination import BasePagination
+from rest_framework.settings import api_settings
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over ``(updated_at, id)``, newest first.
+
+    The cursor holds the last row's sort key, so a page is one index range
+    read however deep it is. Rows edited while a client pages move ahead of
+    its cursor instead of shifting later pages, so nothing repeats.
+
+    Every listing is paged, ``page_size`` defaulting to the REST framework
+    PAGE_SIZE and capped at ``max_page_size``. The total is a second query
+    over the whole listing; clients that don't need it skip it with ``count=false``.
+    """
+    ordering = ('-updated_at', '-id')
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, request):
+        self.request = request
+        self.next_cursor = None
+        self.count = None
+
+    def get_page_size(self):
+        try:
+            size = int(self.request.query_params.get('page_size', api_settings.PAGE_SIZE))
+        except ValueError:
+            size = api_settings.PAGE_SIZE
+        return min(max(size, 1), self.max_page_size)
+
+    def wants_count(self):
+        return self.request.query_params.get('count', 'true').lower() not in ('false', '0', 'no')
+
+    def decode_cursor(self, cursor):
+        try:
+            updated_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            updated_at = parse_datetime(updated_at)
+            row_id = int(row_id)
+        except (binascii.Error, TypeError, ValueError):
+            raise ParseError(self.invalid_cursor_message)
+        if updated_at is None:
+            raise ParseError(self.invalid_cursor_message)
+        return updated_at, row_id
+
+    @staticmethod
+    def encode_cursor(row):
+        position = json.dumps([row.updated_at.isoformat(), row.id])
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    def paginate_queryset(self, queryset, request=None, view=None):
+        if self.wants_count():
+            self.count = queryset.count()
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = self.request.query_params.get('cursor')
+        if cursor:
+            updated_at, row_id = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, id__lt=row_id))
+
+        page_size = self.get_page_size()
+        rows = list(queryset[:page_size + 1])
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            self.next_cursor = self.encode_cursor(rows[-1])
+        return rows
+
+    def get_response_data(self, key, data):
+        """
+        Response body: the listing under ``key`` plus the cursor for the next page
+        """
+        body = {
+            key: data,
+            'next_cursor': self.next_cursor,
+            'has_more': self.next_cursor is not None,
+        }
+        if self.count is not None:
+            body['count'] = self.count
+        return body
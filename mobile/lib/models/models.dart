@@ -168,3 +168,16 @@ class AuthTokens {
     );
   }
 }
+
+// One page of a listing; nextCursor fetches the page after it
+class PagedList<T> {
+  final List<T> items;
+  final String? nextCursor;
+
+  PagedList({
+    required this.items,
+    this.nextCursor,
+  });
+
+  bool get hasMore => nextCursor != null;
+}
@@ -8,11 +8,14 @@ class CourseProvider extends ChangeNotifier {
   
   List<Course> _courses = [];
   bool _isLoading = false;
+  bool _isLoadingMore = false;
   String? _error;
+  String? _nextCursor;
 
   // Getters
   List<Course> get courses => _courses;
   bool get isLoading => _isLoading;
+  bool get hasMore => _nextCursor != null;
   String? get error => _error;
 
   void clearError() {
@@ -24,7 +27,9 @@ class CourseProvider extends ChangeNotifier {
     _setLoading(true);
     
     try {
-      _courses = await _apiService.getCourses();
+      final page = await _apiService.getCourses();
+      _courses = page.items;
+      _nextCursor = page.nextCursor;
       _error = null;
     } catch (e) {
       _error = _extractErrorMessage(e);
@@ -33,6 +38,28 @@ class CourseProvider extends ChangeNotifier {
     _setLoading(false);
   }
 
+  // Fetch the next page once the list is scrolled to its end
+  Future<void> loadMoreCourses() async {
+    final cursor = _nextCursor;
+    if (cursor == null || _isLoading || _isLoadingMore) return;
+    _isLoadingMore = true;
+    
+    try {
+      final page = await _apiService.getCourses(cursor: cursor);
+      // Drop the page if the list was reloaded meanwhile
+      if (cursor == _nextCursor) {
+        _courses.addAll(page.items);
+        _nextCursor = page.nextCursor;
+      }
+      _error = null;
+    } catch (e) {
+      _error = _extractErrorMessage(e);
+    }
+    
+    _isLoadingMore = false;
+    notifyListeners();
+  }
+
   Future<bool> createCourse({
     required String title,
     required String description,
@@ -9,11 +9,15 @@ class NoteProvider extends ChangeNotifier {
   
   List<Note> _notes = [];
   bool _isLoading = false;
+  bool _isLoadingMore = false;
   String? _error;
+  int? _courseId;
+  String? _nextCursor;
 
   // Getters
   List<Note> get notes => _notes;
   bool get isLoading => _isLoading;
+  bool get hasMore => _nextCursor != null;
   String? get error => _error;
 
   void clearError() {
@@ -23,9 +27,12 @@ class NoteProvider extends ChangeNotifier {
 
   Future<void> loadNotes({int? courseId}) async {
     _setLoading(true);
+    _courseId = courseId;
     
     try {
-      _notes = await _apiService.getNotes(courseId: courseId);
+      final page = await _apiService.getNotes(courseId: courseId);
+      _notes = page.items;
+      _nextCursor = page.nextCursor;
       // Debug: show filter and list size
       if (kDebugMode) {
         print('NoteProvider.loadNotes -> courseId: ' + (courseId?.toString() ?? 'ALL') + ', notes: ' + _notes.length.toString());
@@ -38,6 +45,28 @@ class NoteProvider extends ChangeNotifier {
     _setLoading(false);
   }
 
+  // Fetch the next page once the list is scrolled to its end
+  Future<void> loadMoreNotes() async {
+    final cursor = _nextCursor;
+    if (cursor == null || _isLoading || _isLoadingMore) return;
+    _isLoadingMore = true;
+    
+    try {
+      final page = await _apiService.getNotes(courseId: _courseId, cursor: cursor);
+      // Drop the page if the list was reloaded meanwhile
+      if (cursor == _nextCursor) {
+        _notes.addAll(page.items);
+        _nextCursor = page.nextCursor;
+      }
+      _error = null;
+    } catch (e) {
+      _error = _extractErrorMessage(e);
+    }
+    
+    _isLoadingMore = false;
+    notifyListeners();
+  }
+
   Future<Note?> createNote({
     required String title,
     required int courseId,
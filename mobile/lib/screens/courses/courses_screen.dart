@@ -117,8 +117,16 @@ class CoursesScreen extends StatelessWidget {
             onRefresh: courseProvider.loadCourses,
             child: ListView.builder(
               padding: const EdgeInsets.all(16),
-              itemCount: courseProvider.courses.length,
+              itemCount: courseProvider.courses.length + (courseProvider.hasMore ? 1 : 0),
               itemBuilder: (context, index) {
+                if (index == courseProvider.courses.length) {
+                  // Reaching the end of what is loaded fetches the next page
+                  WidgetsBinding.instance.addPostFrameCallback((_) => courseProvider.loadMoreCourses());
+                  return const Padding(
+                    padding: EdgeInsets.all(16),
+                    child: Center(child: CircularProgressIndicator()),
+                  );
+                }
                 final course = courseProvider.courses[index];
                 return _CourseCard(course: course);
               },
@@ -126,8 +126,16 @@ class _CourseNotesScreenState extends State<CourseNotesScreen> {
             onRefresh: () => noteProvider.loadNotes(courseId: widget.course.id),
             child: ListView.builder(
               padding: const EdgeInsets.all(16),
-              itemCount: courseNotes.length,
+              itemCount: courseNotes.length + (noteProvider.hasMore ? 1 : 0),
               itemBuilder: (context, index) {
+                if (index == courseNotes.length) {
+                  // Reaching the end of what is loaded fetches the next page
+                  WidgetsBinding.instance.addPostFrameCallback((_) => noteProvider.loadMoreNotes());
+                  return const Padding(
+                    padding: EdgeInsets.all(16),
+                    child: Center(child: CircularProgressIndicator()),
+                  );
+                }
                 final note = courseNotes[index];
                 return _NoteCard(note: note);
               },
@@ -144,8 +144,16 @@ class _NotesScreenState extends State<NotesScreen> {
             onRefresh: () => noteProvider.loadNotes(courseId: _selectedCourseId),
             child: ListView.builder(
               padding: const EdgeInsets.all(16),
-              itemCount: noteProvider.notes.length,
+              itemCount: noteProvider.notes.length + (noteProvider.hasMore ? 1 : 0),
               itemBuilder: (context, index) {
+                if (index == noteProvider.notes.length) {
+                  // Reaching the end of what is loaded fetches the next page
+                  WidgetsBinding.instance.addPostFrameCallback((_) => noteProvider.loadMoreNotes());
+                  return const Padding(
+                    padding: EdgeInsets.all(16),
+                    child: Center(child: CircularProgressIndicator()),
+                  );
+                }
                 final note = noteProvider.notes[index];
                 return _NoteCard(note: note);
               },
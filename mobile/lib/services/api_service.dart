@@ -158,11 +158,16 @@ class ApiService {
   }
 
   // Course APIs
-  Future<List<Course>> getCourses() async {
-    final response = await _dio.get('/courses/');
-    return (response.data['courses'] as List)
-        .map((json) => Course.fromJson(json))
-        .toList();
+  // Listings are paged; pass the previous page's nextCursor to get the next one
+  Future<PagedList<Course>> getCourses({String? cursor}) async {
+    final response = await _dio.get('/courses/', queryParameters: {
+      'count': 'false',
+      if (cursor != null) 'cursor': cursor,
+    });
+    return PagedList(
+      items: (response.data['courses'] as List).map((json) => Course.fromJson(json)).toList(),
+      nextCursor: response.data['next_cursor'],
+    );
   }
 
   Future<Course> createCourse({
@@ -188,22 +193,16 @@ class ApiService {
   }
 
   // Note APIs
-  Future<List<Note>> getNotes({int? courseId}) async {
-    String url = '/notes/';
-    if (courseId != null) {
-      url += '?course_id=$courseId';
-    }
-    
-    final response = await _dio.get(url);
-    // Debug: log which endpoint was called and how many notes returned
-    try {
-      print('ApiService.getNotes -> URL: ' + url + ' status: ' + (response.statusCode?.toString() ?? 'null'));
-      final count = (response.data['notes'] as List).length;
-      print('ApiService.getNotes -> items: ' + count.toString());
-    } catch (_) {}
-    return (response.data['notes'] as List)
-        .map((json) => Note.fromJson(json))
-        .toList();
+  Future<PagedList<Note>> getNotes({int? courseId, String? cursor}) async {
+    final response = await _dio.get('/notes/', queryParameters: {
+      'count': 'false',
+      if (courseId != null) 'course_id': courseId,
+      if (cursor != null) 'cursor': cursor,
+    });
+    return PagedList(
+      items: (response.data['notes'] as List).map((json) => Note.fromJson(json)).toList(),
+      nextCursor: response.data['next_cursor'],
+    );
   }
  Future<Note> getNote(int noteId) async {                                               
    final response = await _dio.get('/notes/$noteId/');                                  